@@ -5,9 +5,22 @@ Fast, resumable downloads from HuggingFace using aria2c
 
 from .aria2c_hf_downloader import NODE_CLASS_MAPPINGS as ARIA2C_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as ARIA2C_DISPLAY_MAPPINGS
 from .hf_downloader_fallback import NODE_CLASS_MAPPINGS as FALLBACK_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as FALLBACK_DISPLAY_MAPPINGS
+from .hf_snapshot_downloader import NODE_CLASS_MAPPINGS as SNAPSHOT_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as SNAPSHOT_DISPLAY_MAPPINGS
+from .hf_safetensors_selector import NODE_CLASS_MAPPINGS as SAFETENSORS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as SAFETENSORS_DISPLAY_MAPPINGS
+from .hf_downloader_auto import NODE_CLASS_MAPPINGS as AUTO_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as AUTO_DISPLAY_MAPPINGS
 
-# Combine both node types
-NODE_CLASS_MAPPINGS = {**ARIA2C_MAPPINGS, **FALLBACK_MAPPINGS}
-NODE_DISPLAY_NAME_MAPPINGS = {**ARIA2C_DISPLAY_MAPPINGS, **FALLBACK_DISPLAY_MAPPINGS}
+# Combine all node types
+NODE_CLASS_MAPPINGS = {**ARIA2C_MAPPINGS, **FALLBACK_MAPPINGS, **AUTO_MAPPINGS, **SNAPSHOT_MAPPINGS,
+                       **SAFETENSORS_MAPPINGS}
+NODE_DISPLAY_NAME_MAPPINGS = {**ARIA2C_DISPLAY_MAPPINGS, **FALLBACK_DISPLAY_MAPPINGS, **AUTO_DISPLAY_MAPPINGS,
+                              **SNAPSHOT_DISPLAY_MAPPINGS, **SAFETENSORS_DISPLAY_MAPPINGS}
+
+# Start downloads as soon as a prompt is queued instead of when the graph reaches them
+from .prompt_prefetch import register as _register_prompt_prefetch
+_register_prompt_prefetch()
+
+# Pick up downloads a crash or restart interrupted (see download_journal.py)
+from .download_journal import register as _resume_interrupted_downloads
+_resume_interrupted_downloads()
 
 __all__ = ['NODE_CLASS_MAPPINGS', 'NODE_DISPLAY_NAME_MAPPINGS']
@@ -0,0 +1,239 @@
+"""
+JSON-RPC client for aria2c and a persistent, process-wide aria2c daemon
+One long-lived `aria2c --enable-rpc` shares its scheduler and connection pool
+across every download instead of paying process + TLS startup per file.
+HF_DOWNLOADER_ARIA2_RPC_URL (and HF_DOWNLOADER_ARIA2_RPC_SECRET) use an
+aria2c RPC endpoint that is already running instead of starting one.
+"""
+
+import os
+import json
+import time
+import atexit
+import socket
+import secrets
+import itertools
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+
+LOG_PREFIX = "[Aria2c HF Downloader]"
+
+STATUS_KEYS = ["gid", "status", "totalLength", "completedLength", "downloadSpeed",
+               "connections", "errorCode", "errorMessage", "files"]
+
+
+class Aria2RpcError(Exception):
+    """
+    Raised for JSON-RPC errors and failed aria2 downloads
+    """
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class Aria2RpcClient:
+    """
+    Minimal aria2 JSON-RPC client over HTTP (no third-party dependencies).
+    Point it at any endpoint speaking aria2's protocol, including a fake
+    server for testing.
+    """
+
+    def __init__(self, url, secret=None, timeout=10):
+        self.url = url
+        self.secret = secret
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+
+    def call(self, method, *params):
+        if self.secret:
+            params = (f"token:{self.secret}",) + params
+        payload = json.dumps({
+            "jsonrpc": "2.0",
+            "id": str(next(self._ids)),
+            "method": method,
+            "params": list(params),
+        }).encode("utf-8")
+        req = urllib.request.Request(self.url, data=payload, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                reply = json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            # aria2 answers RPC errors with a 4xx status and a JSON body
+            try:
+                reply = json.loads(e.read().decode("utf-8"))
+            except ValueError:
+                raise Aria2RpcError(f"aria2 RPC HTTP error {e.code}")
+
+        if reply.get("error"):
+            error = reply["error"]
+            raise Aria2RpcError(error.get("message", "aria2 RPC error"), error.get("code"))
+        return reply.get("result")
+
+    def get_version(self):
+        return self.call("aria2.getVersion")
+
+    def add_uri(self, uris, options=None):
+        """
+        Queue a download. uris are mirrors of the same file. Returns the GID.
+        """
+        return self.call("aria2.addUri", list(uris), options or {})
+
+    def tell_status(self, gid, keys=None):
+        return self.call("aria2.tellStatus", gid, keys or STATUS_KEYS)
+
+    def remove(self, gid):
+        return self.call("aria2.forceRemove", gid)
+
+    def remove_result(self, gid):
+        return self.call("aria2.removeDownloadResult", gid)
+
+    def change_option(self, gid, options):
+        return self.call("aria2.changeOption", gid, options)
+
+    def change_global_option(self, options):
+        return self.call("aria2.changeGlobalOption", options)
+
+    def shutdown(self):
+        return self.call("aria2.shutdown")
+
+    def wait(self, gid, poll_interval=1.0, on_status=None):
+        """
+        Poll tellStatus until the download finishes. Returns the final status
+        dict, or raises Aria2RpcError if aria2 reports an error.
+        """
+        while True:
+            status = self.tell_status(gid)
+            if on_status:
+                on_status(status)
+            state = status.get("status")
+            if state == "complete":
+                self._forget(gid)
+                return status
+            if state in ("error", "removed"):
+                self._forget(gid)
+                raise Aria2RpcError(
+                    f"aria2 download {state}: {status.get('errorMessage') or 'unknown error'}",
+                    status.get("errorCode"),
+                )
+            time.sleep(poll_interval)
+
+    def _forget(self, gid):
+        # Keep the daemon's result list from growing forever
+        try:
+            self.remove_result(gid)
+        except (Aria2RpcError, OSError):
+            pass
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Aria2Daemon:
+    """
+    A long-lived aria2c process listening for RPC on a random local port.
+    Shut down automatically when the Python process (ComfyUI) exits.
+    """
+
+    def __init__(self, aria2c_path, max_concurrent_downloads=5):
+        self.aria2c_path = aria2c_path
+        self.max_concurrent_downloads = max_concurrent_downloads
+        self.process = None
+        self.client = None
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, startup_timeout=10):
+        port = _free_port()
+        secret = secrets.token_hex(16)
+        cmd = [
+            self.aria2c_path,
+            "--enable-rpc=true",
+            "--rpc-listen-all=false",
+            f"--rpc-listen-port={port}",
+            f"--rpc-secret={secret}",
+            f"--max-concurrent-downloads={self.max_concurrent_downloads}",
+            "--continue=true",
+            # Keep .aria2 control files current and don't outlive a crashed ComfyUI
+            "--auto-save-interval=10",
+            f"--stop-with-process={os.getpid()}",
+            "--console-log-level=warn",
+            "--quiet=true",
+        ]
+        # Don't let Ctrl+C in the ComfyUI console kill the daemon before atexit runs
+        kwargs = {}
+        if os.name == "nt":
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        self.process = subprocess.Popen(
+            cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **kwargs
+        )
+        self.client = Aria2RpcClient(f"http://127.0.0.1:{port}/jsonrpc", secret=secret)
+
+        deadline = time.time() + startup_timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise Aria2RpcError(f"aria2c RPC daemon exited with code {self.process.returncode}")
+            try:
+                version = self.client.get_version()
+                print(f"{LOG_PREFIX} Started aria2c {version.get('version', '')} RPC daemon on port {port}")
+                return self.client
+            except (OSError, Aria2RpcError):
+                time.sleep(0.1)
+
+        self.stop()
+        raise Aria2RpcError("aria2c RPC daemon did not start in time")
+
+    def stop(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            try:
+                self.client.shutdown()
+                self.process.wait(timeout=5)
+            except (OSError, Aria2RpcError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+        self.client = None
+
+
+_daemon = None
+_daemon_lock = threading.Lock()
+
+
+def external_rpc_url():
+    """
+    URL of an already running aria2c RPC endpoint to use, or ""
+    """
+    return os.environ.get("HF_DOWNLOADER_ARIA2_RPC_URL", "").strip()
+
+
+def get_daemon_client(aria2c_path):
+    """
+    RPC client for the shared aria2c daemon, starting (or restarting) it on demand
+    """
+    global _daemon
+    url = external_rpc_url()
+    if url:
+        return Aria2RpcClient(url, secret=os.environ.get("HF_DOWNLOADER_ARIA2_RPC_SECRET") or None)
+    with _daemon_lock:
+        if _daemon is None:
+            _daemon = Aria2Daemon(aria2c_path)
+            atexit.register(shutdown_daemon)
+        if not _daemon.is_running():
+            _daemon.start()
+        return _daemon.client
+
+
+def shutdown_daemon():
+    with _daemon_lock:
+        if _daemon is not None:
+            _daemon.stop()
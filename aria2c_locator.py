@@ -0,0 +1,241 @@
+"""
+Lazy, cached discovery of the aria2c executable
+Discovery (bin/ globbing, chmod, `aria2c --version`) runs on first use and
+its result is persisted so later ComfyUI starts skip it until the binary
+changes. A missing aria2c is looked for again after MISSING_RECHECK seconds,
+so one installed while ComfyUI runs is picked up without a restart
+"""
+
+import os
+import glob
+import time
+import shutil
+import platform
+import threading
+import subprocess
+from collections import namedtuple
+from .download_state import state_path, load_json, save_json_atomic
+
+CACHE_FILE = "aria2c.json"
+# Seconds before looking again for an aria2c that was not found
+MISSING_RECHECK = 60
+
+Aria2cInfo = namedtuple("Aria2cInfo", ["path", "version", "features"])
+
+_info = None
+_resolved = False
+_missing_since = 0.0
+_lock = threading.Lock()
+
+
+def locate_aria2c():
+    """
+    Find aria2c executable in PATH or local bin folder
+    Returns the path to aria2c or None if not found
+    """
+    # First, check for bundled aria2c in node's bin folder
+    node_dir = os.path.dirname(os.path.abspath(__file__))
+    bin_dir = os.path.join(node_dir, "bin")
+    
+    # Detect platform and choose appropriate folder pattern
+    system = platform.system().lower()
+    arch = platform.machine().lower()
+    
+    # Search for aria2c in versioned folders
+    if system == 'windows' or os.name == 'nt':
+        # Look for Windows build folders (32bit or 64bit)
+        if '64' in arch or 'amd64' in arch or 'x86_64' in arch:
+            pattern = os.path.join(bin_dir, "aria2-*-win-64bit-build*", "aria2c.exe")
+        else:
+            pattern = os.path.join(bin_dir, "aria2-*-win-32bit-build*", "aria2c.exe")
+        
+        matches = glob.glob(pattern)
+        if matches:
+            bundled_aria2c = matches[0]  # Use first match
+            print(f"[Aria2c HF Downloader] Using bundled aria2c: {bundled_aria2c}")
+            return bundled_aria2c
+        
+        # Fallback to direct exe
+        bundled_aria2c = os.path.join(bin_dir, "aria2c.exe")
+        if os.path.exists(bundled_aria2c):
+            print(f"[Aria2c HF Downloader] Using bundled aria2c: {bundled_aria2c}")
+            return bundled_aria2c
+            
+    elif system == 'darwin':  # macOS
+        # Look for macOS build folders
+        pattern = os.path.join(bin_dir, "aria2-*-osx-*", "aria2c")
+        matches = glob.glob(pattern)
+        if not matches:
+            pattern = os.path.join(bin_dir, "aria2-*-darwin-*", "aria2c")
+            matches = glob.glob(pattern)
+        if matches:
+            bundled_aria2c = matches[0]
+            try:
+                os.chmod(bundled_aria2c, 0o755)
+                # Verify it's executable
+                if not os.access(bundled_aria2c, os.X_OK):
+                    print(f"[Aria2c HF Downloader] Warning: Could not make {bundled_aria2c} executable")
+                    return None
+                print(f"[Aria2c HF Downloader] Using bundled aria2c: {bundled_aria2c}")
+                return bundled_aria2c
+            except OSError as e:
+                print(f"[Aria2c HF Downloader] Error setting permissions: {e}")
+                return None
+        
+        # Fallback
+        for name in ["aria2c-mac", "aria2c"]:
+            bundled_aria2c = os.path.join(bin_dir, name)
+            if os.path.exists(bundled_aria2c):
+                try:
+                    os.chmod(bundled_aria2c, 0o755)
+                    if not os.access(bundled_aria2c, os.X_OK):
+                        print(f"[Aria2c HF Downloader] Warning: Could not make {bundled_aria2c} executable")
+                        continue
+                    print(f"[Aria2c HF Downloader] Using bundled aria2c: {bundled_aria2c}")
+                    return bundled_aria2c
+                except OSError as e:
+                    print(f"[Aria2c HF Downloader] Error setting permissions: {e}")
+                    continue
+                
+    else:  # Linux
+        # Look for Linux build folders (including android builds which work on linux)
+        pattern = os.path.join(bin_dir, "aria2-*-linux-*", "aria2c")
+        matches = glob.glob(pattern)
+        if not matches:
+            # Try android builds as they also work on Linux
+            pattern = os.path.join(bin_dir, "aria2-*-android-*", "aria2c")
+            matches = glob.glob(pattern)
+        if matches:
+            bundled_aria2c = matches[0]
+            try:
+                os.chmod(bundled_aria2c, 0o755)
+                # Verify it's executable
+                if not os.access(bundled_aria2c, os.X_OK):
+                    print(f"[Aria2c HF Downloader] Warning: Could not make {bundled_aria2c} executable")
+                    return None
+                print(f"[Aria2c HF Downloader] Using bundled aria2c: {bundled_aria2c}")
+                return bundled_aria2c
+            except OSError as e:
+                print(f"[Aria2c HF Downloader] Error setting permissions: {e}")
+                return None
+        
+        # Fallback
+        for name in ["aria2c-linux", "aria2c"]:
+            bundled_aria2c = os.path.join(bin_dir, name)
+            if os.path.exists(bundled_aria2c):
+                try:
+                    os.chmod(bundled_aria2c, 0o755)
+                    if not os.access(bundled_aria2c, os.X_OK):
+                        print(f"[Aria2c HF Downloader] Warning: Could not make {bundled_aria2c} executable")
+                        continue
+                    print(f"[Aria2c HF Downloader] Using bundled aria2c: {bundled_aria2c}")
+                    return bundled_aria2c
+                except OSError as e:
+                    print(f"[Aria2c HF Downloader] Error setting permissions: {e}")
+                    continue
+    
+    # Try system PATH
+    try:
+        result = subprocess.run(
+            ["aria2c", "--version"],
+            capture_output=True,
+            text=True,
+            timeout=5
+        )
+        if result.returncode == 0:
+            print("[Aria2c HF Downloader] Using system aria2c from PATH")
+            return "aria2c"
+    except (FileNotFoundError, subprocess.TimeoutExpired, Exception):
+        pass
+    
+    return None
+
+
+def _resolve_executable(path):
+    """
+    Absolute path of the binary (PATH lookups resolved) so its mtime can be checked
+    """
+    resolved = shutil.which(path) if os.path.basename(path) == path else path
+    return os.path.realpath(resolved) if resolved else None
+
+
+def _fingerprint(path):
+    resolved = _resolve_executable(path)
+    if not resolved:
+        return None
+    try:
+        stat = os.stat(resolved)
+    except OSError:
+        return None
+    return {'resolved': resolved, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def probe_version(path):
+    """
+    Run `aria2c --version` once. Returns (version, features).
+    """
+    try:
+        result = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.TimeoutExpired):
+        return "", []
+    version = ""
+    features = []
+    for line in result.stdout.splitlines():
+        if line.startswith("aria2 version"):
+            version = line.split()[-1]
+        elif line.startswith("Enabled Features:"):
+            features = [f.strip() for f in line.split(":", 1)[1].split(",") if f.strip()]
+    return version, features
+
+
+def _load_cached():
+    cached = load_json(state_path(CACHE_FILE), None)
+    if not cached or not cached.get('path'):
+        return None
+    # Invalidate when the binary was replaced, upgraded or removed
+    if _fingerprint(cached['path']) != cached.get('fingerprint'):
+        return None
+    return Aria2cInfo(cached['path'], cached.get('version', ""), cached.get('features', []))
+
+
+def _discover():
+    path = locate_aria2c()
+    if not path:
+        return None
+    version, features = probe_version(path)
+    info = Aria2cInfo(path, version, features)
+    try:
+        save_json_atomic(state_path(CACHE_FILE), {
+            'path': path,
+            'version': version,
+            'features': features,
+            'fingerprint': _fingerprint(path),
+            'discovered': time.time(),
+        })
+    except OSError as e:
+        print(f"[Aria2c HF Downloader] Note: Could not cache aria2c location: {e}")
+    return info
+
+
+def get_aria2c(refresh=False):
+    """
+    Aria2cInfo for the aria2c to use, or None if it is not installed.
+    A found aria2c is kept for the process; a missing one is looked for
+    again after MISSING_RECHECK seconds. Pass refresh=True to look now.
+    """
+    global _info, _resolved, _missing_since
+    with _lock:
+        if _resolved and _info is None and time.monotonic() - _missing_since >= MISSING_RECHECK:
+            _resolved = False
+        if refresh or not _resolved:
+            _info = None if refresh else _load_cached()
+            if _info is None:
+                _info = _discover()
+            _resolved = True
+            _missing_since = time.monotonic()
+        return _info
+
+
+def get_aria2c_path():
+    info = get_aria2c()
+    return info.path if info else None
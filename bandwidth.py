@@ -0,0 +1,235 @@
+"""
+Process-wide bandwidth scheduler
+A global rate cap shared by every transfer (token bucket per transfer,
+sized by a priority-weighted share of the cap) and a cap on how many
+transfers run at once, admitted in priority order.
+
+HF_DOWNLOADER_MAX_RATE sets the cap (bytes/s, K/M/G suffixes, 0 = unlimited);
+HF_DOWNLOADER_MAX_TRANSFERS limits concurrent transfers (0 = no limit).
+"""
+
+import os
+import re
+import time
+import threading
+import itertools
+from contextlib import contextmanager
+
+# Lower number = more urgent
+PRIORITY_BLOCKING = 0   # a prompt is waiting on this file
+PRIORITY_NORMAL = 5
+PRIORITY_PREFETCH = 10  # started ahead of time, nobody waits yet
+
+# Bucket depth in seconds of the transfer's rate (bounds bursts)
+BURST_SECONDS = 0.25
+MIN_BURST = 64 * 1024
+
+_RATE_RE = re.compile(r'^\s*([\d.]+)\s*([KMG]?)i?B?\s*$', re.IGNORECASE)
+_local = threading.local()
+
+
+def parse_rate(value):
+    """
+    "20M" -> 20 MiB/s, "500K" -> 500 KiB/s, plain numbers are bytes/s. 0 if unset or invalid.
+    """
+    match = _RATE_RE.match(str(value or ""))
+    if not match:
+        return 0
+    return int(float(match.group(1)) * {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}[match.group(2).upper()])
+
+
+def priority_weight(priority):
+    return 1.0 / (1 + max(0, priority))
+
+
+class TransferSlot:
+    """
+    One admitted transfer. Engines call throttle(n) after reading n bytes;
+    it sleeps just long enough to keep the transfer within its share.
+    """
+
+    def __init__(self, key, priority):
+        self.key = key
+        self.priority = priority
+        self.rate = 0
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._notify_lock = threading.Lock()
+        self._pushing = False
+        self._push_again = False
+
+    def throttle(self, n):
+        rate = self.rate
+        if not rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            burst = max(MIN_BURST, rate * BURST_SECONDS)
+            self._tokens = min(burst, self._tokens + (now - self._last) * rate) - n
+            self._last = now
+            deficit = -self._tokens
+        if deficit > 0:
+            time.sleep(deficit / rate)
+
+    def on_rate_change(self, callback):
+        """
+        Call callback(rate) whenever this transfer's share changes (e.g. to push it to aria2c)
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _set_rate(self, rate):
+        """
+        Called with the scheduler lock held; True when listeners need telling
+        """
+        if rate == self.rate:
+            return False
+        self.rate = rate
+        return bool(self._listeners)
+
+    def _notify(self):
+        # Outside the scheduler lock, as listeners may make RPC calls. One
+        # push at a time per slot: a change made meanwhile is left to the
+        # thread already pushing, which sends the latest rate again when
+        # done. Nobody waits on a slow call and no stale limit is left behind
+        with self._notify_lock:
+            if self._pushing:
+                self._push_again = True
+                return
+            self._pushing = True
+        while True:
+            rate = self.rate
+            for callback in list(self._listeners):
+                try:
+                    callback(rate)
+                except Exception as e:
+                    print(f"[HF Downloader] Warning: could not apply rate limit: {e}")
+            with self._notify_lock:
+                if not self._push_again:
+                    self._pushing = False
+                    return
+                self._push_again = False
+
+
+class BandwidthScheduler:
+    """
+    Admits transfers by priority (FIFO within a priority) up to
+    max_transfers and splits the global rate between the running ones in
+    proportion to priority_weight.
+    """
+
+    def __init__(self, rate=0, max_transfers=0):
+        self.rate = rate
+        self.max_transfers = max_transfers
+        self._cond = threading.Condition()
+        self._active = []
+        self._waiting = {}
+        self._order = itertools.count()
+
+    def acquire(self, key, priority=PRIORITY_NORMAL):
+        ticket = next(self._order)
+        with self._cond:
+            self._waiting[ticket] = [priority, key]
+            try:
+                while not self._admissible(ticket):
+                    self._cond.wait()
+            finally:
+                priority = self._waiting.pop(ticket)[0]
+            slot = TransferSlot(key, priority)
+            self._active.append(slot)
+            changed = self._rebalance_locked()
+            self._cond.notify_all()
+        self._notify_changed(changed)
+        return slot
+
+    def _admissible(self, ticket):
+        if self.max_transfers and len(self._active) >= self.max_transfers:
+            return False
+        best = min(self._waiting, key=lambda t: (self._waiting[t][0], t))
+        return best == ticket
+
+    def release(self, slot):
+        with self._cond:
+            if slot in self._active:
+                self._active.remove(slot)
+            changed = self._rebalance_locked()
+            self._cond.notify_all()
+        self._notify_changed(changed)
+
+    def promote(self, key, priority):
+        """
+        Raise the priority of a queued or running transfer (e.g. a prefetch a prompt now waits on)
+        """
+        with self._cond:
+            for waiting in self._waiting.values():
+                if waiting[1] == key and priority < waiting[0]:
+                    waiting[0] = priority
+            for slot in self._active:
+                if slot.key == key and priority < slot.priority:
+                    slot.priority = priority
+            changed = self._rebalance_locked()
+            self._cond.notify_all()
+        self._notify_changed(changed)
+
+    def set_rate(self, rate):
+        with self._cond:
+            self.rate = rate
+            changed = self._rebalance_locked()
+        self._notify_changed(changed)
+
+    def _rebalance_locked(self):
+        # Returns the slots whose listeners must be told, see TransferSlot._notify
+        total = sum(priority_weight(slot.priority) for slot in self._active)
+        changed = []
+        for slot in self._active:
+            if slot._set_rate(int(self.rate * priority_weight(slot.priority) / total) if self.rate else 0):
+                changed.append(slot)
+        return changed
+
+    @staticmethod
+    def _notify_changed(slots):
+        for slot in slots:
+            slot._notify()
+
+    @contextmanager
+    def transfer(self, key, priority=PRIORITY_NORMAL):
+        """
+        Hold a slot for the duration of a transfer; current_slot() returns it on this thread
+        """
+        slot = self.acquire(key, priority)
+        previous = getattr(_local, 'slot', None)
+        _local.slot = slot
+        try:
+            yield slot
+        finally:
+            _local.slot = previous
+            self.release(slot)
+
+
+def current_slot():
+    """
+    The slot held by the calling thread, if any
+    """
+    return getattr(_local, 'slot', None)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            try:
+                max_transfers = int(os.environ.get("HF_DOWNLOADER_MAX_TRANSFERS", 0))
+            except ValueError:
+                max_transfers = 0
+            _scheduler = BandwidthScheduler(parse_rate(os.environ.get("HF_DOWNLOADER_MAX_RATE")),
+                                            max(0, max_transfers))
+        return _scheduler
@@ -0,0 +1,23 @@
+"""
+Shared helpers for the benchmark scripts
+Loads this node's modules without running its __init__ (which needs ComfyUI)
+"""
+
+import os
+import sys
+import types
+import importlib
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "hf_downloader_bench"
+
+
+def load(name):
+    """
+    Import one of the node's modules (e.g. 'parallel_download') standalone
+    """
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [REPO_ROOT]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.{name}")
@@ -0,0 +1,96 @@
+"""
+Micro-benchmark: keep-alive connection pool and resolved-redirect cache
+Runs the same requests against the local HF-style server (resolve URL ->
+302 -> signed CDN URL) with HF_DOWNLOADER_KEEP_ALIVE=0 (a new connection
+and a redirect hop per request, like plain urlopen) and with pooling.
+The server adds --connect-latency-ms to every new connection (DNS + TCP +
+TLS handshake) and --latency-ms to every response.
+
+    python benchmarks/bench_connection_pool.py --connect-latency-ms 60 --latency-ms 20
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+from _common import load
+from bench_server import ServerConfig, ServerProcess
+
+
+def range_requests(url, count, size=64 * 1024):
+    """
+    Sequential small Range requests on one resolve URL (header reads, probes, retries)
+    """
+    open_url = load("http_pool").open_url
+    for i in range(count):
+        with open_url(url, {'Range': f'bytes={i * size}-{(i + 1) * size - 1}'}) as response:
+            response.read()
+
+
+def repeated_downloads(url, count, connections, tmp):
+    """
+    The same file downloaded count times with the parallel range engine
+    """
+    parallel_download = load("parallel_download")
+    for i in range(count):
+        output_file = os.path.join(tmp, f"model-{i}.safetensors")
+        parallel_download.ParallelRangeDownloader(url, {}, connections=connections).download(output_file)
+        os.remove(output_file)
+
+
+def measure(name, keep_alive, fn, *args):
+    http_pool = load("http_pool")
+    os.environ["HF_DOWNLOADER_KEEP_ALIVE"] = "1" if keep_alive else "0"
+    http_pool.get_pool().clear()
+    http_pool.get_redirect_cache().clear()
+    before = http_pool.stats()
+    start = time.perf_counter()
+    fn(*args)
+    wall = time.perf_counter() - start
+    after = http_pool.stats()
+    result = {"name": name, "wall_s": round(wall, 3)}
+    if keep_alive:
+        result.update({key: after[key] - before[key] for key in after})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connect-latency-ms", type=float, default=60)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--requests", type=int, default=100, help="sequential Range requests")
+    parser.add_argument("--downloads", type=int, default=5, help="repeated downloads of one file")
+    parser.add_argument("--size-mb", type=int, default=16)
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    config = ServerConfig(latency=args.latency_ms / 1000, connect_latency=args.connect_latency_ms / 1000)
+    size = args.size_mb * 1024 * 1024
+    results = []
+    with ServerProcess(config) as base_url, tempfile.TemporaryDirectory() as tmp:
+        # Connection profiles, rankings and metrics go here, not into the checkout
+        os.environ["HF_DOWNLOADER_STATE_DIR"] = os.path.join(tmp, "state")
+        url = f"{base_url}/org/model/resolve/main/{size}/model.safetensors"
+        for keep_alive in (False, True):
+            label = "pooled" if keep_alive else "no reuse"
+            results.append(measure(f"{args.requests} ranges, {label}", keep_alive,
+                                   range_requests, url, args.requests))
+            results.append(measure(f"{args.downloads} downloads, {label}", keep_alive,
+                                   repeated_downloads, url, args.downloads, args.connections, tmp))
+
+    if args.json:
+        print(json.dumps({"config": vars(args), "results": results}, indent=1))
+        return
+
+    print(f"\n{'case':<28}{'wall s':>10}{'opened':>10}{'reused':>10}{'cached redirects':>18}")
+    for r in results:
+        print(f"{r['name']:<28}{r['wall_s']:>10}{r.get('opened', '-'):>10}{r.get('reused', '-'):>10}"
+              f"{r.get('redirect_hits', '-'):>18}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
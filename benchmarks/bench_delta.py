@@ -0,0 +1,78 @@
+"""
+Micro-benchmark: updating to a new revision, full download vs delta update
+The local server serves two synthetic revisions of one file (v1 and v2 =
+v1 with a few small edits) and a chunk manifest for each. Measures a full
+download of v2 against updating a local v1 copy from the v2 manifest.
+
+    python benchmarks/bench_delta.py --size-mb 512 --edits 8 --bandwidth-mbps 50
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from _common import load
+from bench_server import ServerConfig, ServerProcess, revision_bytes
+
+
+def full_download(url, output_file):
+    parallel_download = load("parallel_download")
+    parallel_download.ParallelRangeDownloader(url, {}, connections=8, verify=False).download(output_file)
+    return os.path.getsize(output_file)
+
+
+def delta_download(url, output_file):
+    delta_update = load("delta_update")
+    metrics = load("download_metrics").DownloadMetrics(url, "delta")
+    if not delta_update.apply_delta(url, output_file, {}, connections=8, metrics=metrics):
+        raise Exception("delta update fell back to a full download")
+    return metrics.total_bytes - metrics.resumed_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--edits", type=int, default=8, help="small edits between v1 and v2")
+    parser.add_argument("--bandwidth-mbps", type=float, default=50, help="per-connection cap, MB/s")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    config = ServerConfig(bandwidth=int(args.bandwidth_mbps * 1024 * 1024), delta_edits=args.edits)
+    results = []
+    with ServerProcess(config) as base_url, tempfile.TemporaryDirectory() as tmp:
+        # Connection profiles, rankings and metrics go here, not into the checkout
+        os.environ["HF_DOWNLOADER_STATE_DIR"] = os.path.join(tmp, "state")
+        url = f"{base_url}/o/r/resolve/v2/delta-{size}/model.safetensors"
+        old_copy = os.path.join(tmp, "v1.safetensors")
+        output_file = os.path.join(tmp, "model.safetensors")
+        with open(old_copy, 'wb') as f:
+            f.write(revision_bytes(size, "v1", config.seed, args.edits))
+        expected = revision_bytes(size, "v2", config.seed, args.edits)
+
+        for name, fn in (("full download", full_download), ("delta update", delta_download)):
+            shutil.copyfile(old_copy, output_file)
+            start = time.perf_counter()
+            fetched = fn(url, output_file)
+            wall = time.perf_counter() - start
+            with open(output_file, 'rb') as f:
+                if f.read() != expected:
+                    raise Exception(f"{name} produced the wrong content")
+            results.append({"name": name, "wall_s": round(wall, 3),
+                            "fetched_mb": round(fetched / (1024 * 1024), 1)})
+
+    if args.json:
+        print(json.dumps({"size_mb": args.size_mb, "edits": args.edits, "results": results}, indent=1))
+        return
+
+    print(f"\n{'case':<18}{'wall s':>10}{'fetched MB':>12}")
+    for r in results:
+        print(f"{r['name']:<18}{r['wall_s']:>10}{r['fetched_mb']:>12}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
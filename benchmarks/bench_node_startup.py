@@ -0,0 +1,70 @@
+"""
+Startup benchmark: cost of aria2c discovery for the Aria2c node
+Before: every node instantiation ran the full discovery (bin/ globbing,
+chmod, `aria2c --version`). After: nothing at instantiation, one lookup on
+first use, served from the persisted cache on later ComfyUI starts.
+
+    python benchmarks/bench_node_startup.py --instances 20
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+from _common import load
+
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instances", type=int, default=20,
+                        help="node instantiations to simulate (workflow loads / executions)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as state:
+        os.environ["HF_DOWNLOADER_STATE_DIR"] = state
+        locator = load("aria2c_locator")
+
+        # Old behaviour: full discovery in every __init__
+        legacy_ms = timed(locator.locate_aria2c, args.instances)
+
+        # New, first ever start: one discovery, then written to the cache file
+        locator._resolved = False
+        cold_ms = timed(locator.get_aria2c)
+
+        # New, later ComfyUI start: cache file hit, then in-process memo
+        locator._resolved = False
+        warm_ms = timed(locator.get_aria2c)
+        memo_ms = timed(locator.get_aria2c, args.instances)
+
+        info = locator.get_aria2c()
+
+    results = {
+        "aria2c": info._asdict() if info else None,
+        "instances": args.instances,
+        "legacy_total_ms": round(legacy_ms, 3),
+        "new_first_start_ms": round(cold_ms, 3),
+        "new_cached_start_ms": round(warm_ms + memo_ms, 3),
+    }
+    if args.json:
+        print(json.dumps(results, indent=1))
+        return
+
+    print(f"\naria2c: {info.path + ' ' + info.version if info else 'not found'}")
+    print(f"{args.instances} instantiations, discovery per __init__ (before): {results['legacy_total_ms']:>9.2f} ms")
+    print(f"first use on a fresh install (after):            {results['new_first_start_ms']:>9.2f} ms")
+    print(f"first use with persisted cache + memo (after):   {results['new_cached_start_ms']:>9.2f} ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Micro-benchmark: fallback downloader read loop, before vs after
+Compares the original read(8192) + per-chunk modulo loop with the current
+readinto / adaptive-buffer engine against a local server (in another process).
+
+    python benchmarks/bench_read_loop.py --size-mb 1024
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import urllib.request
+
+from _common import load
+from bench_server import ServerProcess
+
+
+def legacy_loop(url, output_file):
+    """
+    The read loop the fallback node shipped with originally
+    """
+    req = urllib.request.Request(url)
+    with urllib.request.urlopen(req) as response:
+        total_size = int(response.headers.get('content-length', 0))
+        with open(output_file, 'wb') as f:
+            downloaded = 0
+            chunk_size = 8192
+            while True:
+                chunk = response.read(chunk_size)
+                if not chunk:
+                    break
+                f.write(chunk)
+                downloaded += len(chunk)
+                if downloaded % (10 * 1024 * 1024) < chunk_size:
+                    progress = (downloaded / total_size) * 100
+
+
+def engine_loop(url, output_file, connections):
+    parallel_download = load("parallel_download")
+    downloader = parallel_download.ParallelRangeDownloader(url, {}, connections=connections, verify=False)
+    downloader.download(output_file)
+
+
+def measure(name, fn, *args):
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    fn(*args)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    return {"name": name, "wall_s": round(wall, 3), "cpu_s": round(cpu, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    results = []
+    with ServerProcess() as base_url, tempfile.TemporaryDirectory() as tmp:
+        # Connection profiles, rankings and metrics go here, not into the checkout
+        os.environ["HF_DOWNLOADER_STATE_DIR"] = os.path.join(tmp, "state")
+        url = f"{base_url}/{size}/model.safetensors"
+        output_file = os.path.join(tmp, "model.safetensors")
+        cases = [
+            ("legacy read(8192)", legacy_loop, url, output_file),
+            ("readinto, 1 connection", engine_loop, url, output_file, 1),
+            ("readinto, 8 connections", engine_loop, url, output_file, 8),
+        ]
+        for case in cases:
+            runs = [measure(*case) for _ in range(args.repeat)]
+            best = min(runs, key=lambda r: r["wall_s"])
+            best["mb_per_s"] = round(args.size_mb / best["wall_s"], 1)
+            best["cpu_per_gb_s"] = round(best["cpu_s"] / (args.size_mb / 1024), 3)
+            results.append(best)
+            os.remove(output_file)
+
+    if args.json:
+        print(json.dumps({"size_mb": args.size_mb, "results": results}, indent=1))
+        return
+
+    print(f"\n{'case':<28}{'MB/s':>10}{'wall s':>10}{'CPU s':>10}{'CPU s/GB':>10}")
+    for r in results:
+        print(f"{r['name']:<28}{r['mb_per_s']:>10}{r['wall_s']:>10}{r['cpu_s']:>10}{r['cpu_per_gb_s']:>10}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,415 @@
+"""
+Local Range-capable HTTP server serving synthetic files for benchmarks
+Runs in its own process so client CPU measurements are not polluted.
+
+Routes (<size> is the file size in bytes):
+  /<size>/<name>                          file data, Range supported
+  /<owner>/<repo>/resolve/<rev>/<size>/<name>
+                                          HF-style 302 to the CDN route, with
+                                          X-Linked-Size / X-Linked-ETag
+  /cdn/<size>/<name>?Expires=<epoch>      "CDN" file data, Range supported;
+                                          403 once the signed URL expired
+  /<owner>/<repo>/resolve/<rev>/delta-<size>/<name>
+                                          a file with revisions: v1 is <size>
+                                          random bytes, every other <rev> is v1
+                                          with `delta_edits` small seeded edits
+                                          (replace/insert/delete); same redirect
+                                          and headers as above
+  .../delta-<size>/<name>.cdc.json        chunk manifest of that revision
+                                          (for delta updates)
+  /api/<type>s/<owner>/<repo>/tree/<rev>?recursive=true
+                                          HF tree API listing of REPO_FILES,
+                                          `tree_page_size` entries per page
+                                          with a Link rel="next" header; repos
+                                          named "traversal" also list a
+                                          ../outside.json entry, repos named
+                                          "broken" a missing.json that 404s
+  /[<type>s/]<owner>/<repo>/resolve/<rev>/<repo file>
+                                          small files directly (ETag = git blob
+                                          id), LFS files as the redirect above
+
+Behaviour is configured with ServerConfig: bearer token check on resolve and tree,
+per-connection bandwidth cap, added latency (per request and per new
+connection), signed URL lifetime and failure injection. HTTP/1.1 keep-alive
+is supported.
+"""
+
+import io
+import re
+import json
+import time
+import random
+import hashlib
+import urllib.parse
+import multiprocessing
+from dataclasses import dataclass, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from _common import load
+
+BLOCK_SIZE = 1024 * 1024
+WRITE_SIZE = 256 * 1024
+
+
+@dataclass
+class ServerConfig:
+    # Required "Authorization: Bearer <token>" on resolve URLs (None = open)
+    token: str = None
+    # Per-connection bandwidth cap in bytes/s (0 = unlimited)
+    bandwidth: int = 0
+    # Delay before every response, in seconds
+    latency: float = 0.0
+    # Extra delay on every new connection (DNS + TCP + TLS handshake), in seconds
+    connect_latency: float = 0.0
+    # Lifetime of the signed CDN URLs the resolve redirect hands out, in seconds
+    url_ttl: int = 3600
+    # Probability that a body transfer is cut off half way
+    failure_rate: float = 0.0
+    # Ignore Range headers (always answer 200 with the full body)
+    ranges: bool = True
+    # Send X-Linked-ETag with the SHA-256 of the content on resolve redirects
+    linked_etag: bool = True
+    seed: int = 0
+    # Edits between revision v1 and any other revision of the delta-<size> files
+    delta_edits: int = 8
+    # Entries per page of the tree API listing
+    tree_page_size: int = 3
+
+
+def _block(seed=0):
+    # Deterministic pseudo-random 1 MiB block; files repeat it
+    return random.Random(seed).randbytes(BLOCK_SIZE)
+
+
+def expected_bytes(size, seed=0):
+    """
+    The content the server sends for a file of the given size
+    """
+    block = _block(seed)
+    return (block * (size // BLOCK_SIZE + 1))[:size]
+
+
+BASE_REVISION = "v1"
+
+# Synthetic repo served by the tree and resolve routes (a small diffusers
+# layout): bytes for plain git files, a size for LFS files (expected_bytes)
+REPO_FILES = {
+    "model_index.json": b'{"_class_name": "BenchPipeline"}\n',
+    "scheduler/scheduler_config.json": b'{"num_train_timesteps": 1000}\n',
+    "text_encoder/config.json": b'{"hidden_size": 768}\n',
+    "text_encoder/model.fp16.bin": 2 * BLOCK_SIZE,
+    "unet/config.json": b'{"sample_size": 64}\n',
+    "unet/diffusion_pytorch_model.safetensors": 3 * BLOCK_SIZE + 123,
+    "vae/config.json": b'{"latent_channels": 4}\n',
+    "vae/diffusion_pytorch_model.safetensors": BLOCK_SIZE + 7,
+}
+TRAVERSAL_PATH = "../outside.json"
+# Listed in "broken" repos but not served
+MISSING_PATH = "missing.json"
+
+
+def git_blob_oid(data):
+    """
+    Git blob id of a file's content, as the tree API reports it
+    """
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def repo_file_bytes(path, seed=0):
+    """
+    The content the server sends for a REPO_FILES entry
+    """
+    content = REPO_FILES[path]
+    return content if isinstance(content, bytes) else expected_bytes(content, seed)
+
+
+def revision_bytes(size, revision, seed=0, edits=8):
+    """
+    Content of revision `revision` of a delta-<size> file: random bytes for
+    v1, v1 with seeded small edits for any other revision
+    """
+    # In blocks: randbytes() takes a C int, so one call can't produce 256 MiB or more
+    rng = random.Random(f"{seed}:{size}")
+    data = bytearray()
+    while len(data) < size:
+        data += rng.randbytes(min(BLOCK_SIZE, size - len(data)))
+    if revision == BASE_REVISION:
+        return bytes(data)
+    rng = random.Random(f"{seed}:{size}:{revision}")
+    for _ in range(edits):
+        position = rng.randrange(len(data))
+        length = rng.randint(1, 4096)
+        kind = rng.choice(("replace", "insert", "delete"))
+        if kind == "replace":
+            end = min(len(data), position + length)
+            data[position:end] = rng.randbytes(end - position)
+        elif kind == "insert":
+            data[position:position] = rng.randbytes(length)
+        else:
+            del data[position:position + length]
+    return bytes(data)
+
+
+class SyntheticFileHandler(BaseHTTPRequestHandler):
+    """
+    Serves synthetic files; see the module docstring for routes
+    """
+    protocol_version = "HTTP/1.1"
+    config = ServerConfig()
+    block = _block()
+    _sha_cache = {}
+    _revisions = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        if self.config.connect_latency:
+            time.sleep(self.config.connect_latency)
+
+    def do_HEAD(self):
+        self._dispatch(send_body=False)
+
+    def do_GET(self):
+        self._dispatch(send_body=True)
+
+    def _dispatch(self, send_body):
+        if self.config.latency:
+            time.sleep(self.config.latency)
+
+        path = self.path.split('?')[0]
+        revision = re.match(r'^(?:/[^/]+/[^/]+/resolve|/cdn/delta)/([^/]+)/delta-(\d+)/([^/]+)$', path)
+        if revision:
+            self._dispatch_revision(path.startswith('/cdn/'), revision.group(1), int(revision.group(2)),
+                                    revision.group(3), send_body)
+            return
+
+        resolve = re.match(r'^/[^/]+/[^/]+/resolve/[^/]+/(\d+)/([^/]+)$', path)
+        if resolve:
+            self._redirect(int(resolve.group(1)), resolve.group(2))
+            return
+
+        tree = re.match(r'^/api/(?:models|datasets|spaces)/[^/]+/([^/]+)/tree/[^/]+$', path)
+        if tree:
+            self._tree(tree.group(1), send_body)
+            return
+
+        repo_file = re.match(r'^(?:/datasets|/spaces)?/[^/]+/[^/]+/resolve/[^/]+/(.+)$', path)
+        if repo_file and urllib.parse.unquote(repo_file.group(1)) in REPO_FILES:
+            self._repo_file(urllib.parse.unquote(repo_file.group(1)), send_body)
+            return
+
+        data = re.match(r'^(?:/cdn)?/(\d+)/[^/]+$', path)
+        if data:
+            expires = re.search(r'[?&]Expires=(\d+)', self.path)
+            if expires and int(expires.group(1)) < time.time():
+                self._empty(403)
+                return
+            self._serve(int(data.group(1)), send_body)
+            return
+
+        self._empty(404)
+
+    def _dispatch_revision(self, cdn, revision, size, name, send_body):
+        data, sha256, manifest = self._revision(size, revision)
+        if name.endswith(".cdc.json"):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(manifest)))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(manifest)
+            return
+        if not cdn:
+            if self.config.token and self.headers.get('Authorization') != f'Bearer {self.config.token}':
+                self._empty(401)
+                return
+            headers = [('Location', f'/cdn/delta/{revision}/delta-{size}/{name}'),
+                       ('X-Linked-Size', str(len(data)))]
+            if self.config.linked_etag:
+                headers.append(('X-Linked-ETag', f'"{sha256}"'))
+            self._empty(302, headers)
+            return
+        self._serve(len(data), send_body, data)
+
+    def _revision(self, size, revision):
+        key = (size, revision)
+        if key not in self._revisions:
+            data = revision_bytes(size, revision, self.config.seed, self.config.delta_edits)
+            manifest = load("cdc_chunker").build_manifest(io.BytesIO(data))
+            self._revisions[key] = (data, manifest["sha256"], json.dumps(manifest).encode('utf-8'))
+        return self._revisions[key]
+
+    def _authorized(self):
+        return not self.config.token or self.headers.get('Authorization') == f'Bearer {self.config.token}'
+
+    def _tree(self, repo, send_body):
+        if not self._authorized():
+            self._empty(401)
+            return
+        entries = []
+        for name in sorted({path.rsplit('/', 1)[0] for path in REPO_FILES if '/' in path}):
+            entries.append({"type": "directory", "path": name, "oid": git_blob_oid(name.encode()), "size": 0})
+        for path in sorted(REPO_FILES):
+            content = REPO_FILES[path]
+            if isinstance(content, bytes):
+                entries.append({"type": "file", "path": path, "oid": git_blob_oid(content), "size": len(content)})
+            else:
+                sha256 = self._sha256(content)
+                entries.append({"type": "file", "path": path, "oid": git_blob_oid(sha256.encode()), "size": content,
+                                "lfs": {"oid": sha256, "size": content, "pointerSize": 134}})
+        if repo == "traversal":
+            entries.append({"type": "file", "path": TRAVERSAL_PATH, "oid": git_blob_oid(b"{}"), "size": 2})
+        if repo == "broken":
+            entries.append({"type": "file", "path": MISSING_PATH, "oid": git_blob_oid(b"{}"), "size": 2})
+
+        cursor = re.search(r'[?&]cursor=(\d+)', self.path)
+        start = int(cursor.group(1)) if cursor else 0
+        end = start + max(1, self.config.tree_page_size)
+        body = json.dumps(entries[start:end]).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if end < len(entries):
+            # Absolute, like the Hub's
+            next_url = f"http://{self.headers.get('Host')}{self.path.split('?')[0]}?recursive=true&cursor={end}"
+            self.send_header('Link', f'<{next_url}>; rel="next"')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _repo_file(self, path, send_body):
+        content = REPO_FILES[path]
+        if not isinstance(content, bytes):
+            self._redirect(content, path.rsplit('/', 1)[-1])
+            return
+        if not self._authorized():
+            self._empty(401)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('ETag', f'"{git_blob_oid(content)}"')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(content)
+
+    def _empty(self, status, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _sha256(self, size):
+        if size not in self._sha_cache:
+            sha = hashlib.sha256()
+            remaining = size
+            while remaining:
+                n = min(remaining, BLOCK_SIZE)
+                sha.update(memoryview(self.block)[:n])
+                remaining -= n
+            self._sha_cache[size] = sha.hexdigest()
+        return self._sha_cache[size]
+
+    def _redirect(self, size, name):
+        if self.config.token and self.headers.get('Authorization') != f'Bearer {self.config.token}':
+            self._empty(401)
+            return
+        headers = [('Location', f'/cdn/{size}/{name}?Expires={int(time.time()) + self.config.url_ttl}'),
+                   ('X-Linked-Size', str(size))]
+        if self.config.linked_etag:
+            headers.append(('X-Linked-ETag', f'"{self._sha256(size)}"'))
+        self._empty(302, headers)
+
+    def _serve(self, size, send_body, data=None):
+        start, end, status = 0, size - 1, 200
+        range_header = self.headers.get('Range')
+        match = re.match(r'bytes=(\d+)-(\d*)$', range_header or '')
+        if match and self.config.ranges:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            if start > end:
+                self._empty(416)
+                return
+            status = 206
+
+        self.send_response(status)
+        if self.config.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', f'"synthetic-{size}"' if data is None else f'"{hashlib.md5(data).hexdigest()}"')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        if send_body:
+            self.write_range(start, end, data)
+
+    def write_range(self, start, end, data=None):
+        view = memoryview(self.block if data is None else data)
+        bandwidth = self.config.bandwidth
+        cut_at = None
+        if self.config.failure_rate and random.random() < self.config.failure_rate:
+            cut_at = start + (end - start + 1) // 2
+
+        offset = start
+        began = time.monotonic()
+        try:
+            while offset <= end:
+                if cut_at is not None and offset >= cut_at:
+                    # Simulate a dropped connection
+                    self.close_connection = True
+                    self.connection.shutdown(2)
+                    return
+                block_offset = offset % BLOCK_SIZE if data is None else offset
+                n = min(WRITE_SIZE, len(view) - block_offset, end - offset + 1)
+                if bandwidth:
+                    n = min(n, max(1, bandwidth // 20))
+                self.wfile.write(view[block_offset:block_offset + n])
+                offset += n
+                if bandwidth:
+                    # Pace this connection to the configured rate
+                    ahead = (offset - start) / bandwidth - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+
+
+def make_handler(config):
+    return type("ConfiguredHandler", (SyntheticFileHandler,), {
+        "config": config,
+        "block": _block(config.seed),
+        "_sha_cache": {},
+        "_revisions": {},
+    })
+
+
+def _serve_forever(config_dict, port_queue):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(ServerConfig(**config_dict)))
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+class ServerProcess:
+    """
+    Context manager running the server in a child process.
+    Yields the base URL.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or ServerConfig()
+        self.process = None
+
+    def __enter__(self):
+        port_queue = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=_serve_forever, args=(asdict(self.config), port_queue), daemon=True
+        )
+        self.process.start()
+        port = port_queue.get(timeout=10)
+        return f"http://127.0.0.1:{port}"
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.join()
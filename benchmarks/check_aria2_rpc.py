@@ -0,0 +1,158 @@
+"""
+End-to-end check of the aria2c RPC engine against a stand-in JSON-RPC server
+(fake_aria2_rpc.py, no aria2c needed) and the local file server. Drives the
+Auto node with engine 'aria2c-rpc' through a complete download (addUri
+options, tellStatus polling, changeOption when the bandwidth share changes,
+SHA-256 check), a failed one (error status from a 404), a cancelled one
+(forceRemove) and a rejected RPC secret. Exits non-zero on the first failure.
+
+    python benchmarks/check_aria2_rpc.py
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+from _common import load
+from bench_server import ServerConfig, ServerProcess, expected_bytes
+from fake_aria2_rpc import FakeAria2Rpc
+
+BENCH_TOKEN = "hf_benchmark_token"
+MB = 1024 * 1024
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def check(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+    print(f"  ✓ {message}")
+
+
+def start_node(url, save_dir, filename):
+    """
+    Run the Auto node with engine aria2c-rpc on a thread. Returns (thread, outcome dict).
+    """
+    node = load("hf_downloader_auto").HuggingFaceDownloaderAuto()
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = node.download(url, "custom", save_dir, filename, True, engine="aria2c-rpc")
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def active_download(rpc):
+    return next((d for d in list(rpc.downloads.values()) if d.status == "active" and d.completed), None)
+
+
+def check_complete(rpc, base_url, tmp, size, rate):
+    print("complete:")
+    url = f"{base_url}/bench/model/resolve/main/{size}/model.safetensors"
+    thread, outcome = start_node(url, tmp, "model.safetensors")
+    check(wait_for(lambda: active_download(rpc)), "addUri queues the download and it starts")
+    download = active_download(rpc)
+    options = download.options
+    check(options.get("out") == "model.safetensors.part" and os.path.samefile(options.get("dir"), tmp),
+          "it is written to <file>.part in the destination folder")
+    check(f"Authorization: Bearer {BENCH_TOKEN}" in options.get("header", []), "the HF token goes in the header option")
+    check(options.get("max-download-limit") == str(rate), f"its bandwidth share is passed as max-download-limit ({rate})")
+
+    # A new global cap changes the running transfer's share
+    load("bandwidth").get_scheduler().set_rate(rate * 4)
+    check(wait_for(lambda: download.options.get("max-download-limit") == str(rate * 4), timeout=5),
+          "a new bandwidth share is pushed with changeOption")
+
+    thread.join(60)
+    check("result" in outcome, f"the download completes ({outcome.get('error', 'ok')})")
+    output_file = outcome["result"][0]
+    with open(output_file, 'rb') as f:
+        check(f.read() == expected_bytes(size), "the file has the server's content (SHA-256 verified)")
+    methods = rpc.methods()
+    check(methods.count("aria2.tellStatus") >= 2, f"tellStatus is polled until complete ({methods.count('aria2.tellStatus')} polls)")
+    check("aria2.removeDownloadResult" in methods, "the finished result is removed from the daemon")
+    check(not os.path.exists(output_file + ".part"), "no .part left behind")
+
+
+def check_error(rpc, base_url, tmp):
+    print("error:")
+    url = f"{base_url}/bench/model/resolve/main/missing/model.safetensors"
+    thread, outcome = start_node(url, tmp, "missing.safetensors")
+    thread.join(60)
+    error = outcome.get("error")
+    check(error is not None and "code 3" in str(error), f"a 404 ends in the error status and fails the node ({error})")
+    check(not os.path.exists(os.path.join(tmp, "missing.safetensors")), "nothing is published under the final name")
+
+
+def check_cancel(rpc, base_url, tmp, size):
+    print("cancel:")
+    url = f"{base_url}/bench/model/resolve/main/{size}/cancelled.safetensors"
+    thread, outcome = start_node(url, tmp, "cancelled.safetensors")
+    output_file = os.path.join(tmp, "cancelled.safetensors")
+    check(wait_for(lambda: active_download(rpc)), "the download starts")
+    check(load("download_engines").cancel_download(url, output_file), "cancel_download finds it")
+    thread.join(60)
+    check("aria2.forceRemove" in rpc.methods(), "cancelling removes the GID with forceRemove")
+    check("error" in outcome and "cancelled" in str(outcome["error"]).lower(),
+          f"the node reports the cancel ({outcome.get('error')})")
+
+
+def check_secret(rpc):
+    print("secret:")
+    aria2_rpc = load("aria2_rpc")
+    try:
+        aria2_rpc.Aria2RpcClient(rpc.url, secret="wrong").get_version()
+        error = None
+    except aria2_rpc.Aria2RpcError as e:
+        error = e
+    check(error is not None and error.code == 1, f"a wrong secret is rejected with Aria2RpcError ({error})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=8)
+    parser.add_argument("--rate-mbps", type=float, default=4, help="initial global bandwidth cap, MB/s")
+    args = parser.parse_args()
+
+    size = args.size_mb * MB
+    rate = int(args.rate_mbps * MB)
+    with ServerProcess(ServerConfig(token=BENCH_TOKEN)) as base_url, FakeAria2Rpc() as rpc, \
+            tempfile.TemporaryDirectory() as tmp:
+        os.environ["HF_TOKEN"] = BENCH_TOKEN
+        os.environ["HF_DOWNLOADER_ARIA2_RPC_URL"] = rpc.url
+        os.environ["HF_DOWNLOADER_ARIA2_RPC_SECRET"] = rpc.secret
+        os.environ["HF_DOWNLOADER_MAX_RATE"] = str(rate)
+        # Keep the download index and journal out of the checkout
+        os.environ["HF_DOWNLOADER_STATE_DIR"] = os.path.join(tmp, "state")
+        try:
+            check_complete(rpc, base_url, tmp, size, rate)
+            check_error(rpc, base_url, tmp)
+            check_cancel(rpc, base_url, tmp, size)
+            check_secret(rpc)
+        except CheckFailed as e:
+            print(f"  ✗ {e}")
+            sys.exit(1)
+    print("all checks passed")
+
+
+if __name__ == "__main__":
+    main()
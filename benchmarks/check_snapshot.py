@@ -0,0 +1,164 @@
+"""
+End-to-end check of the HF Snapshot Downloader node against the local server
+The server's tree API pages its listing (Link rel="next"), so this covers
+pagination, include/exclude glob filtering, the directory layout on disk,
+skipping files that are already current, refusing listed paths that
+would escape the snapshot folder and failing fast (the other transfers
+stopped) when one file fails. Exits non-zero on the first failure.
+
+    python benchmarks/check_snapshot.py --engines python,aria2c
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+
+from _common import load
+from bench_server import ServerConfig, ServerProcess, REPO_FILES, TRAVERSAL_PATH, MISSING_PATH, repo_file_bytes
+
+# Per-connection cap of the failure check's server: the LFS files take several seconds
+FAILURE_BANDWIDTH = 128 * 1024
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def check(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+    print(f"  ✓ {message}")
+
+
+def run_node(engine, repo_id, include, exclude, save_dir, repo_type="model", max_parallel_files=3):
+    node = load("hf_snapshot_downloader").HuggingFaceSnapshotDownloader()
+    (root,) = node.download(repo_id, "main", include, exclude, "custom", save_dir, "", engine, max_parallel_files, 4,
+                            False, repo_type=repo_type)
+    return root
+
+
+def local_files(root):
+    found = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            found[os.path.relpath(path, root).replace(os.sep, '/')] = path
+    return found
+
+
+def check_listing(base_url, page_size):
+    snapshot = load("hf_snapshot_downloader")
+    http_pool = load("http_pool")
+    print("listing:")
+    with http_pool.open_url(f"{base_url}/api/models/bench/diffusers/tree/main?recursive=true") as response:
+        first_page = json.loads(response.read().decode('utf-8'))
+        link = response.headers.get('Link')
+    check(len(first_page) == page_size and link and 'rel="next"' in link,
+          f"the tree API pages its listing ({page_size} entries, Link rel=\"next\")")
+    files = snapshot.list_repo_files("bench/diffusers")
+    check(sorted(f['path'] for f in files) == sorted(REPO_FILES),
+          f"list_repo_files follows every page ({len(files)} files, directories dropped)")
+    lfs = {f['path'] for f in files if f['sha256']}
+    check(lfs == {path for path, content in REPO_FILES.items() if not isinstance(content, bytes)},
+          "LFS files carry their SHA-256, plain git files only a blob id")
+
+
+def check_engine(engine, tmp):
+    print(f"engine {engine}:")
+    save_dir = os.path.join(tmp, engine)
+    include, exclude = "*.json,unet/*", "scheduler/*"
+    root = run_node(engine, "bench/diffusers", include, exclude, save_dir)
+    expected = {path for path in REPO_FILES
+                if (path.endswith(".json") or path.startswith("unet/")) and not path.startswith("scheduler/")}
+    found = local_files(root)
+    check(set(found) == expected, f"include='{include}' exclude='{exclude}' downloads {len(expected)} files")
+    check(all(open(found[path], 'rb').read() == repo_file_bytes(path) for path in expected),
+          "every file matches the server's content, in the repo's folders")
+
+    mtimes = {path: os.stat(found[path]).st_mtime_ns for path in expected}
+    run_node(engine, "bench/diffusers", include, exclude, save_dir)
+    check(all(os.stat(found[path]).st_mtime_ns == mtimes[path] for path in expected),
+          "a second run skips every file (already current)")
+
+    dataset_root = run_node(engine, "bench/diffusers", "vae/*", "", os.path.join(save_dir, "dataset"),
+                            repo_type="dataset")
+    check(set(local_files(dataset_root)) == {"vae/config.json", "vae/diffusion_pytorch_model.safetensors"},
+          "dataset repos list and resolve under /datasets/")
+
+
+def check_traversal(tmp):
+    print("traversal:")
+    save_dir = os.path.join(tmp, "traversal")
+    try:
+        run_node("python", "bench/traversal", "*", "", save_dir)
+        refused = False
+    except ValueError as e:
+        refused = "unsafe path" in str(e)
+    check(refused, f"a listed '{TRAVERSAL_PATH}' is refused")
+    check(not os.path.exists(os.path.join(save_dir, "outside.json")), "nothing is written outside the snapshot folder")
+
+
+def check_failure(tmp):
+    print("failure:")
+    save_dir = os.path.join(tmp, "broken")
+    started = time.monotonic()
+    try:
+        # Enough parallel files that the missing one starts next to the large ones
+        run_node("python", "bench/broken", "*", "", save_dir, max_parallel_files=len(REPO_FILES))
+        error = None
+    except Exception as e:
+        error = e
+    elapsed = time.monotonic() - started
+    slowest = max(size for size in REPO_FILES.values() if isinstance(size, int)) / 4 / FAILURE_BANDWIDTH
+    check(error is not None and "404" in str(error), f"a listed file that 404s fails the node ({error})")
+    check(elapsed < slowest / 2, f"it fails in {elapsed:.1f}s, without waiting for the other files (~{slowest:.0f}s)")
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and any(t.name.startswith(("hf-snapshot", "hf-range"))
+                                                  for t in threading.enumerate()):
+        time.sleep(0.1)
+    check(not any(t.name.startswith(("hf-snapshot", "hf-range")) for t in threading.enumerate()),
+          "the running transfers are stopped")
+    check(not os.path.exists(os.path.join(save_dir, "unet", "diffusion_pytorch_model.safetensors")),
+          f"the large files are not completed ({MISSING_PATH} failed first)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engines", default="python,aria2c", help="comma-separated: python, aria2c")
+    parser.add_argument("--page-size", type=int, default=3, help="tree API entries per page")
+    args = parser.parse_args()
+
+    engines = [e.strip() for e in args.engines.split(',') if e.strip()]
+    if "aria2c" in engines and not load("aria2c_locator").get_aria2c_path():
+        print("aria2c not found, skipping the aria2c engine")
+        engines.remove("aria2c")
+
+    config = ServerConfig(tree_page_size=args.page_size)
+    with ServerProcess(config) as base_url, tempfile.TemporaryDirectory() as tmp:
+        os.environ["HF_ENDPOINT"] = base_url
+        # Keep the download index and journal out of the checkout
+        os.environ["HF_DOWNLOADER_STATE_DIR"] = os.path.join(tmp, "state")
+        try:
+            check_listing(base_url, args.page_size)
+            for engine in engines:
+                check_engine(engine, tmp)
+            check_traversal(tmp)
+        except CheckFailed as e:
+            print(f"  ✗ {e}")
+            sys.exit(1)
+        with ServerProcess(ServerConfig(tree_page_size=args.page_size, bandwidth=FAILURE_BANDWIDTH)) as slow_url:
+            os.environ["HF_ENDPOINT"] = slow_url
+            try:
+                check_failure(tmp)
+            except CheckFailed as e:
+                print(f"  ✗ {e}")
+                sys.exit(1)
+    print("all checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Minimal stand-in for aria2c's JSON-RPC interface, for checks without aria2c
+Speaks enough of the protocol for Aria2cRpcEngine: getVersion, addUri,
+tellStatus, changeOption, changeGlobalOption, forceRemove,
+removeDownloadResult and shutdown, with the token:<secret> parameter.
+addUri really downloads the first URI (with the `header` option) to
+dir/out on a thread, paced by max-download-limit, so tellStatus polls see
+it go from active to complete, or to error with aria2's exit code (3 for a
+404, 24 for 401/403, 1 otherwise). Every call is recorded in `calls`.
+"""
+
+import os
+import json
+import time
+import threading
+import urllib.request
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHUNK_SIZE = 64 * 1024
+# aria2's exit codes for the HTTP errors it reports most
+HTTP_ERROR_CODES = {404: "3", 401: "24", 403: "24"}
+
+
+class FakeDownload:
+    def __init__(self, gid, uris, options):
+        self.gid = gid
+        self.uris = uris
+        self.options = dict(options)
+        self.status = "active"
+        self.total = 0
+        self.completed = 0
+        self.speed = 0
+        self.error_code = "0"
+        self.error_message = ""
+        self.removed = threading.Event()
+
+    def as_status(self):
+        return {
+            "gid": self.gid,
+            "status": self.status,
+            "totalLength": str(self.total),
+            "completedLength": str(self.completed),
+            "downloadSpeed": str(self.speed),
+            "connections": "1" if self.status == "active" else "0",
+            "errorCode": self.error_code,
+            "errorMessage": self.error_message,
+            "files": [{"path": os.path.join(self.options.get("dir", ""), self.options.get("out", ""))}],
+        }
+
+
+class FakeAria2Rpc:
+    """
+    The stand-in server, on a random local port in a background thread.
+    Use as a context manager; `url` is the JSON-RPC endpoint.
+    """
+
+    def __init__(self, secret="fake-secret"):
+        self.secret = secret
+        self.calls = []
+        self.downloads = {}
+        self.global_options = {}
+        self._lock = threading.Lock()
+        self._next_gid = 1
+        self._server = None
+        self.url = ""
+
+    def __enter__(self):
+        rpc = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                status, reply = rpc.handle(request)
+                body = json.dumps(reply).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json-rpc')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/jsonrpc"
+        return self
+
+    def __exit__(self, *exc):
+        for download in list(self.downloads.values()):
+            download.removed.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def methods(self):
+        with self._lock:
+            return [method for method, _ in self.calls]
+
+    def handle(self, request):
+        method, params = request.get("method", ""), list(request.get("params", []))
+        reply = {"jsonrpc": "2.0", "id": request.get("id")}
+        if self.secret and (not params or params[0] != f"token:{self.secret}"):
+            reply["error"] = {"code": 1, "message": "Unauthorized"}
+            return 400, reply
+        if self.secret:
+            params = params[1:]
+        with self._lock:
+            self.calls.append((method, params))
+        handler = getattr(self, "_" + method.replace("aria2.", ""), None)
+        if handler is None:
+            reply["error"] = {"code": 1, "message": f"No such method: {method}"}
+            return 400, reply
+        try:
+            reply["result"] = handler(*params)
+        except KeyError as e:
+            reply["error"] = {"code": 1, "message": f"GID {e.args[0]} is not found"}
+            return 400, reply
+        return 200, reply
+
+    def _getVersion(self):
+        return {"version": "1.37.0-fake", "enabledFeatures": ["HTTPS"]}
+
+    def _addUri(self, uris, options=None):
+        with self._lock:
+            gid = f"{self._next_gid:016x}"
+            self._next_gid += 1
+            download = self.downloads[gid] = FakeDownload(gid, uris, options or {})
+        threading.Thread(target=self._transfer, args=(download,), daemon=True).start()
+        return gid
+
+    def _tellStatus(self, gid, keys=None):
+        status = self.downloads[gid].as_status()
+        return {key: value for key, value in status.items() if not keys or key in keys}
+
+    def _changeOption(self, gid, options):
+        self.downloads[gid].options.update(options)
+        return "OK"
+
+    def _changeGlobalOption(self, options):
+        self.global_options.update(options)
+        return "OK"
+
+    def _forceRemove(self, gid):
+        download = self.downloads[gid]
+        download.removed.set()
+        download.status = "removed"
+        return gid
+
+    def _removeDownloadResult(self, gid):
+        with self._lock:
+            self.downloads.pop(gid)
+        return "OK"
+
+    def _shutdown(self):
+        return "OK"
+
+    def _rate_limit(self, download):
+        limits = [int(value) for value in (download.options.get("max-download-limit"),
+                                           self.global_options.get("max-overall-download-limit")) if value]
+        limits = [limit for limit in limits if limit > 0]
+        return min(limits) if limits else 0
+
+    def _transfer(self, download):
+        headers = {}
+        for header in download.options.get("header", []):
+            name, _, value = header.partition(":")
+            headers[name.strip()] = value.strip()
+        target = os.path.join(download.options.get("dir", "."), download.options.get("out", "download"))
+        began = time.monotonic()
+        try:
+            with urllib.request.urlopen(urllib.request.Request(download.uris[0], headers=headers),
+                                        timeout=30) as response:
+                download.total = int(response.headers.get('Content-Length', 0))
+                with open(target, 'wb') as f:
+                    while not download.removed.is_set():
+                        chunk = response.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        download.completed += len(chunk)
+                        elapsed = time.monotonic() - began
+                        rate = self._rate_limit(download)
+                        if rate:
+                            ahead = download.completed / rate - elapsed
+                            if ahead > 0:
+                                time.sleep(ahead)
+                        download.speed = int(download.completed / max(time.monotonic() - began, 1e-3))
+            if not download.removed.is_set():
+                download.status = "complete"
+        except urllib.error.HTTPError as e:
+            download.error_code = HTTP_ERROR_CODES.get(e.code, "1")
+            download.error_message = f"HTTP {e.code} {e.reason}"
+            download.status = "error"
+        except OSError as e:
+            download.error_code = "1"
+            download.error_message = str(e)
+            download.status = "error"
+        download.speed = 0
@@ -0,0 +1,219 @@
+"""
+Offline benchmark suite for the downloader nodes
+Runs Aria2cHuggingFaceDownloader and HuggingFaceDownloaderFallback over a grid
+of file sizes and connection counts against the local throttled server
+(HF-style resolve -> CDN redirect, bearer auth, Range support, per-connection
+bandwidth cap, latency and failure injection).
+
+Each case runs in a fresh subprocess so CPU time and peak RSS are per case.
+After each download the file is read back cold (evicted from the page cache
+first, like the first model load after a download) and its extent count is
+reported; compare --file-allocation none,falloc on a real disk (--work-dir,
+not a tmpfs) to see what preallocation buys.
+The nodes import ComfyUI modules, so point --comfyui-root at a ComfyUI checkout:
+
+    python benchmarks/run_suite.py --comfyui-root ~/ComfyUI \\
+        --sizes-mb 64,512 --connections 1,4,8,16 \\
+        --bandwidth-mbps 25 --latency-ms 20 --output bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import re
+import argparse
+import tempfile
+import subprocess
+from dataclasses import asdict
+
+from _common import load
+from bench_server import ServerConfig, ServerProcess
+
+BENCH_TOKEN = "hf_benchmark_token"
+ENGINES = {
+    "fallback": ("hf_downloader_fallback", "HuggingFaceDownloaderFallback"),
+    "aria2c": ("aria2c_hf_downloader", "Aria2cHuggingFaceDownloader"),
+    "aria2c_rpc": ("aria2c_hf_downloader", "Aria2cHuggingFaceDownloader"),
+}
+
+
+def _rusage():
+    """
+    (cpu seconds, peak RSS MB) for this process and its finished children
+    """
+    try:
+        import resource
+    except ImportError:
+        return time.process_time(), None
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = self_usage.ru_utime + self_usage.ru_stime + child_usage.ru_utime + child_usage.ru_stime
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    peak = max(self_usage.ru_maxrss, child_usage.ru_maxrss) / scale
+    return cpu, round(peak, 1)
+
+
+def read_back(path, block=8 * 1024 * 1024):
+    """
+    (MB/s reading path from disk, whether the page cache could be dropped first)
+    """
+    cold = False
+    with open(path, 'rb') as f:
+        if hasattr(os, "posix_fadvise"):
+            # Dirty pages can't be dropped, so write them out first
+            os.fsync(f.fileno())
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            cold = True
+        buffer = bytearray(block)
+        total = 0
+        start = time.perf_counter()
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            total += n
+        elapsed = max(1e-6, time.perf_counter() - start)
+    return round(total / (1024 * 1024) / elapsed, 2), cold
+
+
+def extent_count(path):
+    """
+    Number of on-disk extents (Linux filefrag), None when unavailable
+    """
+    try:
+        output = subprocess.run(["filefrag", path], capture_output=True, text=True).stdout
+    except OSError:
+        return None
+    match = re.search(r'(\d+) extents? found', output)
+    return int(match.group(1)) if match else None
+
+
+def run_case(case):
+    """
+    Child process: download one file with one node and report measurements
+    """
+    if case.get("comfyui_root"):
+        sys.path.insert(0, os.path.abspath(case["comfyui_root"]))
+
+    with tempfile.TemporaryDirectory() as state, tempfile.TemporaryDirectory(dir=case.get("work_dir")) as out:
+        os.environ["HF_DOWNLOADER_STATE_DIR"] = state
+        os.environ["HF_DOWNLOADER_FILE_ALLOCATION"] = case["file_allocation"]
+        module_name, class_name = ENGINES[case["engine"]]
+        node = getattr(load(module_name), class_name)()
+
+        kwargs = dict(url=case["url"], save_path="custom", custom_path=out, filename="",
+                      connections=case["connections"], use_hf_token=True,
+                      hf_token_override=BENCH_TOKEN, verify_sha256=case["verify"], force_refresh=True)
+        if case["engine"] != "fallback":
+            if not node.aria2c_path:
+                return {"status": "skipped", "reason": "aria2c not found"}
+            kwargs["use_rpc_daemon"] = case["engine"] == "aria2c_rpc"
+
+        cpu_start, _ = _rusage()
+        start = time.perf_counter()
+        try:
+            (path,) = node.download(**kwargs)
+        except Exception as e:
+            return {"status": "error", "error": str(e)}
+        wall = time.perf_counter() - start
+        if case["engine"] == "aria2c_rpc":
+            load("aria2_rpc").shutdown_daemon()
+        cpu_end, peak_rss = _rusage()
+
+        size = os.path.getsize(path)
+        read_mb_s, cold = read_back(path)
+        return {
+            "status": "ok" if size == case["size"] else "size_mismatch",
+            "bytes": size,
+            "wall_s": round(wall, 3),
+            "throughput_mb_s": round(size / (1024 * 1024) / wall, 2),
+            "cpu_s": round(cpu_end - cpu_start, 3),
+            "peak_rss_mb": peak_rss,
+            "read_back_mb_s": read_mb_s,
+            "read_back_cold": cold,
+            "extents": extent_count(path),
+        }
+
+
+def _parse_list(value, cast=int):
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comfyui-root", default=os.environ.get("COMFYUI_ROOT"),
+                        help="ComfyUI checkout (provides folder_paths / comfy)")
+    parser.add_argument("--engines", default="fallback,aria2c")
+    parser.add_argument("--sizes-mb", default="64,256")
+    parser.add_argument("--connections", default="1,4,8,16")
+    parser.add_argument("--file-allocation", default="falloc",
+                        help="comma-separated HF_DOWNLOADER_FILE_ALLOCATION methods to compare (none, trunc, prealloc, falloc)")
+    parser.add_argument("--work-dir", help="download into this folder (default: system temp, which may be a tmpfs)")
+    parser.add_argument("--bandwidth-mbps", type=float, default=25.0,
+                        help="per-connection cap in MB/s (0 = unlimited)")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--no-ranges", action="store_true", help="server ignores Range requests")
+    parser.add_argument("--no-verify", action="store_true", help="disable SHA-256 verification")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(json.loads(args.case))))
+        return
+
+    config = ServerConfig(
+        token=BENCH_TOKEN,
+        bandwidth=int(args.bandwidth_mbps * 1024 * 1024),
+        latency=args.latency_ms / 1000,
+        failure_rate=args.failure_rate,
+        ranges=not args.no_ranges,
+    )
+    results = []
+    with ServerProcess(config) as base_url:
+        for engine in _parse_list(args.engines, str):
+            for size_mb in _parse_list(args.sizes_mb):
+                for connections in _parse_list(args.connections):
+                    for allocation in _parse_list(args.file_allocation, str):
+                        size = size_mb * 1024 * 1024
+                        case = {
+                            "engine": engine,
+                            "size": size,
+                            "connections": connections,
+                            "file_allocation": allocation,
+                            "verify": not args.no_verify,
+                            "url": f"{base_url}/bench/model/resolve/main/{size}/model-{size_mb}mb.safetensors",
+                            "comfyui_root": args.comfyui_root,
+                            "work_dir": args.work_dir,
+                        }
+                        proc = subprocess.run(
+                            [sys.executable, os.path.abspath(__file__), "--case", json.dumps(case)],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                        )
+                        try:
+                            measured = json.loads(proc.stdout.strip().splitlines()[-1])
+                        except (ValueError, IndexError):
+                            measured = {"status": "error", "error": (proc.stderr or proc.stdout)[-2000:]}
+                        record = {"engine": engine, "size_mb": size_mb, "connections": connections,
+                                  "file_allocation": allocation, **measured}
+                        results.append(record)
+                        print(f"{engine:<11} {size_mb:>6} MB  x{connections:<3} {allocation:<8} "
+                              f"{record.get('status'):<8} {record.get('throughput_mb_s', '-'):>8} MB/s  "
+                              f"{record.get('wall_s', '-'):>8} s  CPU {record.get('cpu_s', '-'):>7} s  "
+                              f"RSS {record.get('peak_rss_mb', '-')} MB  "
+                              f"read {record.get('read_back_mb_s', '-')} MB/s  "
+                              f"extents {record.get('extents', '-')}", flush=True)
+
+    report = {"server": {k: v for k, v in asdict(config).items() if k != "token"}, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
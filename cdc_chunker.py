@@ -0,0 +1,153 @@
+"""
+Content-defined chunking (gear hash) for delta updates
+Splits a file at positions chosen by its content, so an insertion or
+deletion only changes the chunks around it and every other chunk keeps its
+hash. The hash of a position covers the 32 bytes ending there (a gear hash
+with a 32-bit state), so the same content always cuts at the same place.
+
+numpy is used when available (about ten times faster); the pure Python
+fallback gives identical chunks, only slower.
+
+Mirrors can publish a manifest next to each file:
+
+    python cdc_chunker.py model.safetensors > model.safetensors.cdc.json
+"""
+
+import sys
+import json
+import hashlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ALGORITHM = "gear32-sha256-v1"
+# Chunk sizes: large models make small chunks pointless (bigger manifests, more requests)
+DEFAULT_MIN_SIZE = 64 * 1024
+DEFAULT_MASK_BITS = 18  # average chunk of 2^18 = 256 KiB beyond the minimum
+DEFAULT_MAX_SIZE = 1024 * 1024
+WINDOW = 32
+READ_SIZE = 8 * 1024 * 1024
+
+# Gear table: fixed pseudo-random 32-bit value per byte value
+GEAR = [int.from_bytes(hashlib.sha256(b"gear-cdc" + bytes([i])).digest()[:4], "little") for i in range(256)]
+
+
+def _boundary_mask(mask_bits):
+    # The top bits depend on all WINDOW bytes, the low bits only on the newest ones
+    return ((1 << mask_bits) - 1) << (32 - mask_bits)
+
+
+def _candidates_numpy(block, carry, mask):
+    """
+    End positions (exclusive, relative to block) whose window hash matches
+    mask. carry holds the previous WINDOW - 1 bytes of the file.
+    """
+    data = np.frombuffer(carry + block, dtype=np.uint8)
+    table = np.array(GEAR, dtype=np.uint32)
+    # h[i] = sum_j GEAR[data[i - j]] << j for j < WINDOW, built by doubling the window
+    h = table[data]
+    shifted = np.empty_like(h)
+    width = 1
+    while width < WINDOW:
+        np.left_shift(h[:-width], width, out=shifted[width:])
+        h[width:] += shifted[width:]
+        width *= 2
+    hits = np.flatnonzero((h & np.uint32(mask)) == 0)
+    # Drop positions inside the carry, make them end positions within block
+    return hits[hits >= len(carry)] - len(carry) + 1
+
+
+def _candidates_python(block, state, mask):
+    """
+    Same as _candidates_numpy with a rolling hash; state is [hash] carried across blocks
+    """
+    h = state[0]
+    gear = GEAR
+    hits = []
+    for i, byte in enumerate(block):
+        h = ((h << 1) + gear[byte]) & 0xFFFFFFFF
+        if not h & mask:
+            hits.append(i + 1)
+    state[0] = h
+    return hits
+
+
+def iter_chunks(f, min_size=DEFAULT_MIN_SIZE, mask_bits=DEFAULT_MASK_BITS, max_size=DEFAULT_MAX_SIZE):
+    """
+    Yield (offset, length, sha256 hex) for each chunk of a binary file object
+    """
+    mask = _boundary_mask(mask_bits)
+    carry = b""
+    state = [0]
+    buffer = b""          # file data from buffer_start on, not chunked yet
+    buffer_start = 0
+    candidates = []       # absolute cut positions not passed yet
+    position = 0          # bytes read so far
+    start = 0             # start of the current chunk
+    eof = False
+    while not eof:
+        block = f.read(READ_SIZE)
+        eof = not block
+        if block:
+            if np is not None:
+                hits = _candidates_numpy(block, carry, mask)
+                candidates.extend((hits + position).tolist())
+                carry = (carry + block)[-(WINDOW - 1):]
+            else:
+                candidates.extend(hit + position for hit in _candidates_python(block, state, mask))
+            buffer = buffer[start - buffer_start:] + block
+            buffer_start = start
+            position += len(block)
+
+        # Cut every chunk whose end is already decided by the data seen so far
+        index = 0
+        while start < position and (eof or start + max_size <= position):
+            limit = min(start + max_size, position)
+            cut = limit
+            while index < len(candidates) and candidates[index] < start + min_size:
+                index += 1
+            if index < len(candidates) and candidates[index] <= limit:
+                cut = candidates[index]
+            chunk = buffer[start - buffer_start:cut - buffer_start]
+            yield start, cut - start, hashlib.sha256(chunk).hexdigest()
+            start = cut
+        candidates = candidates[index:]
+
+
+def build_manifest(f, min_size=DEFAULT_MIN_SIZE, mask_bits=DEFAULT_MASK_BITS, max_size=DEFAULT_MAX_SIZE):
+    """
+    Chunk manifest of a binary file object: parameters, size, SHA-256 and
+    [length, sha256] per chunk
+    """
+    chunks = []
+    whole = hashlib.sha256()
+    size = 0
+
+    class _Hashing:
+        # Hash the whole file in the same read pass as the chunking
+        def read(self, n):
+            data = f.read(n)
+            whole.update(data)
+            return data
+
+    for offset, length, digest in iter_chunks(_Hashing(), min_size, mask_bits, max_size):
+        chunks.append([length, digest])
+        size = offset + length
+    return {
+        "algorithm": ALGORITHM,
+        "min_size": min_size,
+        "mask_bits": mask_bits,
+        "max_size": max_size,
+        "size": size,
+        "sha256": whole.hexdigest(),
+        "chunks": chunks,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit(f"usage: {sys.argv[0]} FILE > FILE.cdc.json")
+    with open(sys.argv[1], 'rb') as source:
+        json.dump(build_manifest(source), sys.stdout, separators=(',', ':'))
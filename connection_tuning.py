@@ -0,0 +1,178 @@
+"""
+Adaptive connection count and split size, learned per host
+Keeps a smoothed throughput estimate for each connection count tried
+against a host (persisted in the state folder) and picks the smallest
+count that gets within PLATEAU_GAIN of the best seen. While more
+connections still help it explores the next step up, so each host
+converges on its best setting over a few downloads.
+"""
+
+import time
+import threading
+from .download_state import state_path, load_json, save_json_atomic
+
+LOG_PREFIX = "[HF Downloader]"
+
+PROFILE_FILE = "connection_profiles.json"
+# Each connection should have at least this much to fetch
+MIN_BYTES_PER_CONNECTION = 8 * 1024 * 1024
+# First guess for hosts without history
+INITIAL_CONNECTIONS = 4
+# More connections only count as better when throughput grows by over 10%
+PLATEAU_GAIN = 1.10
+# Weight of the newest sample in the smoothed estimate
+SMOOTHING = 0.5
+# Transfers shorter than this are dominated by setup cost and not recorded
+MIN_SAMPLE_BYTES = 32 * 1024 * 1024
+# aria2c accepts --min-split-size between 1M and 1024M
+MIN_SPLIT_SIZE = 1024 * 1024
+MAX_SPLIT_SIZE = 1024 * 1024 * 1024
+
+
+def split_size_for(size, connections):
+    """
+    Segment size giving each connection a few segments: large files get
+    large segments instead of thousands of 1 MiB ones
+    """
+    if not size:
+        return MIN_SPLIT_SIZE
+    split = size // max(1, connections * 4)
+    # Whole MiB, as aria2c takes it with an M suffix
+    split = (split // MIN_SPLIT_SIZE) * MIN_SPLIT_SIZE
+    return max(MIN_SPLIT_SIZE, min(MAX_SPLIT_SIZE, split))
+
+
+def size_cap(size, max_connections):
+    """
+    Connections worth opening for a file of this size
+    """
+    if not size:
+        return max_connections
+    return max(1, min(max_connections, size // MIN_BYTES_PER_CONNECTION))
+
+
+class ConnectionProfiles:
+    """
+    Per-host throughput by connection count
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _hosts_locked(self):
+        if self._data is None:
+            self._data = load_json(self.path, {})
+            self._data.setdefault('hosts', {})
+        return self._data['hosts']
+
+    def record(self, host, connections, throughput):
+        if not host or connections < 1 or throughput <= 0:
+            return
+        with self._lock:
+            profile = self._hosts_locked().setdefault(host, {'throughput': {}})
+            key = str(connections)
+            previous = profile['throughput'].get(key)
+            profile['throughput'][key] = throughput if previous is None else \
+                previous * (1 - SMOOTHING) + throughput * SMOOTHING
+            profile['updated'] = time.time()
+            try:
+                save_json_atomic(self.path, self._data)
+            except OSError as e:
+                print(f"{LOG_PREFIX} Warning: could not save connection profile: {e}")
+
+    def record_transfer(self, host, connections, transferred, seconds):
+        """
+        Record a finished transfer, ignoring ones too small to say anything
+        """
+        if transferred >= MIN_SAMPLE_BYTES and seconds > 0:
+            self.record(host, connections, transferred / seconds)
+
+    def measured(self, host):
+        with self._lock:
+            profile = self._hosts_locked().get(host) or {}
+            return {int(n): value for n, value in profile.get('throughput', {}).items()}
+
+    def best(self, host, max_connections):
+        """
+        (best connection count, whether to try more) from history, or (None, True)
+        """
+        measured = {n: value for n, value in self.measured(host).items() if n <= max_connections}
+        if not measured:
+            return None, True
+        top = max(measured.values())
+        best = min(n for n, value in measured.items() if value * PLATEAU_GAIN >= top)
+        # Still growing at the largest count tried: worth going further
+        return best, best == max(measured)
+
+    def plan(self, host, size, max_connections):
+        """
+        Connection count to start a download with
+        """
+        cap = size_cap(size, max_connections)
+        best, growing = self.best(host, max_connections)
+        if best is None:
+            return min(INITIAL_CONNECTIONS, cap)
+        if growing and best < max_connections:
+            best = min(max_connections, best * 2)
+        return max(1, min(best, cap))
+
+
+class ConnectionRamp:
+    """
+    Within one download: start at `start` connections and double while each
+    step raises throughput by more than PLATEAU_GAIN, up to `maximum`
+    """
+
+    WINDOW = 2.0
+
+    def __init__(self, start, maximum):
+        self.level = start
+        self.maximum = maximum
+        self.plateaued = start >= maximum
+        self.samples = []
+        self._window_start = time.monotonic()
+        self._window_bytes = None
+        self._previous = None
+
+    def update(self, downloaded, saturated=True):
+        """
+        Feed the running byte count. saturated is False once fewer ranges
+        remain than connections (the tail of the file says nothing about
+        the connection count). Returns the new connection level when it
+        should go up, otherwise None.
+        """
+        now = time.monotonic()
+        if self._window_bytes is None:
+            self._window_start, self._window_bytes = now, downloaded
+            return None
+        elapsed = now - self._window_start
+        if elapsed < self.WINDOW:
+            return None
+        throughput = (downloaded - self._window_bytes) / elapsed
+        self._window_start, self._window_bytes = now, downloaded
+        if not saturated:
+            return None
+        self.samples.append((self.level, throughput))
+        if self.plateaued:
+            return None
+        if self._previous is not None and throughput <= self._previous * PLATEAU_GAIN:
+            self.plateaued = True
+            return None
+        self._previous = throughput
+        self.level = min(self.maximum, self.level * 2)
+        self.plateaued = self.level >= self.maximum
+        return self.level
+
+
+_profiles = None
+_profiles_lock = threading.Lock()
+
+
+def get_profiles():
+    global _profiles
+    with _profiles_lock:
+        if _profiles is None:
+            _profiles = ConnectionProfiles(state_path(PROFILE_FILE))
+        return _profiles
@@ -0,0 +1,223 @@
+"""
+Delta updates between revisions of a large file
+The local (older) copy is split with the same content-defined chunking as
+a chunk manifest of the new revision; chunks whose hashes match are copied
+locally and only the rest is fetched with Range requests. The assembled
+file is verified against the manifest's SHA-256 before it replaces the old
+copy, and any problem falls back to a normal full download.
+
+The manifest is read from the node's `delta_manifest_url` or, by default,
+from `<file URL>.cdc.json` (build one with `python cdc_chunker.py FILE`).
+The new file is assembled in `<file>.delta.part`, so the resumable `.part`
+of an interrupted full download is left alone.
+"""
+
+import os
+import json
+import time
+import http.client
+import urllib.error
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from .cdc_chunker import ALGORITHM, iter_chunks
+from .download_files import preallocate, publish_file, discard
+from .download_verify import sha256_file, remember_digest
+from .bandwidth import current_slot
+from .http_pool import open_url
+
+LOG_PREFIX = "[HF Downloader]"
+
+MANIFEST_SUFFIX = ".cdc.json"
+# Assembly file; separate from the .part a full download resumes from
+DELTA_SUFFIX = ".delta.part"
+COPY_SIZE = 1024 * 1024
+MAX_TRIES = 5
+RETRY_WAIT = 3
+
+
+def manifest_url_for(url, manifest_url=""):
+    """
+    The explicit manifest URL, or the file URL with .cdc.json appended to its path
+    """
+    if manifest_url and manifest_url.strip():
+        return manifest_url.strip()
+    parsed = urllib.parse.urlsplit(url)
+    return urllib.parse.urlunsplit(parsed._replace(path=parsed.path + MANIFEST_SUFFIX))
+
+
+def delta_part_path(path):
+    return path + DELTA_SUFFIX
+
+
+def fetch_manifest(url, headers, timeout=30):
+    """
+    Chunk manifest at url, or None when there is none (404) or it is unusable
+    """
+    try:
+        with open_url(url, headers, timeout=timeout) as response:
+            manifest = json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        if e.code in (401, 403, 404):
+            return None
+        raise
+    except ValueError:
+        return None
+    if manifest.get('algorithm') != ALGORITHM:
+        return None
+    if sum(length for length, _ in manifest.get('chunks', [])) != manifest.get('size'):
+        return None
+    return manifest
+
+
+def local_chunks(path, manifest):
+    """
+    {chunk sha256: (offset, length)} of a local file, chunked with the manifest's parameters
+    """
+    chunks = {}
+    with open(path, 'rb') as f:
+        for offset, length, digest in iter_chunks(f, manifest['min_size'], manifest['mask_bits'],
+                                                  manifest['max_size']):
+            chunks.setdefault(digest, (offset, length))
+    return chunks
+
+
+def plan_delta(manifest, available):
+    """
+    Split the new file into local copies [(source offset, offset, length)]
+    and remote byte ranges [(start, end exclusive)], merging neighbours
+    """
+    copies = []
+    fetches = []
+    offset = 0
+    for length, digest in manifest['chunks']:
+        local = available.get(digest)
+        if local:
+            if copies and copies[-1][1] + copies[-1][2] == offset and copies[-1][0] + copies[-1][2] == local[0]:
+                copies[-1] = (copies[-1][0], copies[-1][1], copies[-1][2] + length)
+            else:
+                copies.append((local[0], offset, length))
+        elif fetches and fetches[-1][1] == offset:
+            fetches[-1] = (fetches[-1][0], offset + length)
+        else:
+            fetches.append((offset, offset + length))
+        offset += length
+    return copies, fetches
+
+
+def _copy_local(source, temp_file, copies):
+    with open(source, 'rb') as src, open(temp_file, 'r+b') as dst:
+        for source_offset, offset, length in copies:
+            src.seek(source_offset)
+            dst.seek(offset)
+            remaining = length
+            while remaining:
+                data = src.read(min(COPY_SIZE, remaining))
+                if not data:
+                    raise OSError("Local copy shrank while reading it")
+                dst.write(data)
+                remaining -= len(data)
+
+
+def _fetch_range(url, headers, temp_file, start, end, size, slot, metrics):
+    range_headers = dict(headers)
+    range_headers['Range'] = f'bytes={start}-{end - 1}'
+    for attempt in range(1, MAX_TRIES + 1):
+        try:
+            with open_url(url, range_headers, timeout=60) as response:
+                total_text = response.headers.get('Content-Range', '').rpartition('/')[2]
+                if response.status != 206 or (total_text.isdigit() and int(total_text) != size):
+                    raise Exception("server did not return the requested range of the new revision")
+                if metrics:
+                    metrics.first_byte()
+                with open(temp_file, 'r+b') as f:
+                    f.seek(start)
+                    remaining = end - start
+                    while remaining:
+                        data = response.read(min(COPY_SIZE, remaining))
+                        if not data:
+                            raise OSError("Connection closed before the end of the range")
+                        f.write(data)
+                        if slot:
+                            slot.throttle(len(data))
+                        remaining -= len(data)
+            return
+        except urllib.error.HTTPError:
+            raise
+        except (urllib.error.URLError, OSError, http.client.HTTPException) as e:
+            if attempt == MAX_TRIES:
+                raise
+            if metrics:
+                metrics.retry()
+            print(f"{LOG_PREFIX} Retrying bytes {start}-{end - 1} ({attempt}/{MAX_TRIES}): {e}")
+            time.sleep(RETRY_WAIT)
+
+
+def apply_delta(url, output_file, headers, manifest_url="", expected_sha256=None, connections=8,
+                metrics=None, log_prefix=LOG_PREFIX):
+    """
+    Update output_file (an older revision) to the file at url by fetching
+    only changed chunks. Returns True when done, False when the caller
+    should download the file in full.
+    """
+    if not os.path.isfile(output_file):
+        return False
+    manifest_source = manifest_url_for(url, manifest_url)
+    try:
+        manifest = fetch_manifest(manifest_source, headers)
+    except Exception as e:
+        print(f"{log_prefix} Could not read chunk manifest ({e}), downloading in full")
+        return False
+    if manifest is None:
+        print(f"{log_prefix} No chunk manifest at {manifest_source}, downloading in full")
+        return False
+    if expected_sha256 and manifest.get('sha256') != expected_sha256:
+        print(f"{log_prefix} Chunk manifest describes a different revision, downloading in full")
+        return False
+
+    started = time.monotonic()
+    copies, fetches = plan_delta(manifest, local_chunks(output_file, manifest))
+    size = manifest['size']
+    reused = sum(length for _, _, length in copies)
+    fetched = size - reused
+    print(f"{log_prefix} Delta update: {reused / (1024*1024):.1f} MB reused from the local copy "
+          f"(indexed in {time.monotonic() - started:.1f}s), {fetched / (1024*1024):.1f} MB to fetch "
+          f"in {len(fetches)} ranges")
+    if not reused:
+        print(f"{log_prefix} Nothing in common with the local copy, downloading in full")
+        return False
+
+    if metrics:
+        metrics.total_bytes = size
+        metrics.resumed_bytes = reused
+        metrics.connections = max(1, min(connections, len(fetches)))
+    temp_file = delta_part_path(output_file)
+    discard(temp_file)
+    try:
+        with open(temp_file, 'wb') as f:
+            preallocate(f, size)
+        _copy_local(output_file, temp_file, copies)
+        slot = current_slot()
+        if fetches:
+            with ThreadPoolExecutor(max_workers=max(1, min(connections, len(fetches))),
+                                    thread_name_prefix="hf-delta") as pool:
+                futures = [pool.submit(_fetch_range, url, headers, temp_file, start, end, size, slot, metrics)
+                           for start, end in fetches]
+                for future in futures:
+                    future.result()
+        if metrics:
+            metrics.transfer_finished()
+
+        # Chunk hashes only say which data to reuse; the whole file must match
+        digest = sha256_file(temp_file)
+        if digest != manifest['sha256']:
+            raise Exception(f"assembled file has SHA-256 {digest}, manifest says {manifest['sha256']}")
+    except Exception as e:
+        discard(temp_file)
+        print(f"{log_prefix} Delta update failed ({e}), downloading in full")
+        return False
+
+    publish_file(temp_file, output_file)
+    remember_digest(output_file, digest)
+    print(f"{log_prefix} ✓ Delta update verified (SHA-256 {digest}), fetched "
+          f"{fetched / (1024*1024):.1f} of {size / (1024*1024):.1f} MB")
+    return True
@@ -0,0 +1,180 @@
+"""
+Persistent index of completed downloads so re-running a workflow does not
+re-download (or even re-HEAD) files that are already on disk
+"""
+
+import os
+import re
+import time
+import threading
+from .download_state import state_path, load_json, save_json_atomic
+from .download_verify import fetch_remote_metadata, sha256_file, remember_digest
+
+INDEX_FILE = "download_index.json"
+# How long a remote HEAD result is trusted (override with HF_DOWNLOADER_HEAD_TTL, seconds)
+DEFAULT_HEAD_TTL = 24 * 60 * 60
+
+_COMMIT_RE = re.compile(r'^[0-9a-f]{40}$')
+
+
+def revision_from_url(url):
+    """
+    Revision (branch, tag or commit) from a .../resolve/<revision>/... URL
+    """
+    match = re.search(r'/(?:resolve|blob)/([^/]+)/', url)
+    return match.group(1) if match else ""
+
+
+def cache_key(url, variant=""):
+    key = f"{url.split('?')[0]}@{revision_from_url(url)}"
+    # A file derived from url (e.g. a tensor subset) is indexed apart from url itself
+    return f"{key}#{variant}" if variant else key
+
+
+def head_ttl(url):
+    # Files at a pinned commit never change
+    if _COMMIT_RE.match(revision_from_url(url)):
+        return float('inf')
+    try:
+        return float(os.environ.get("HF_DOWNLOADER_HEAD_TTL", DEFAULT_HEAD_TTL))
+    except ValueError:
+        return DEFAULT_HEAD_TTL
+
+
+class DownloadIndex:
+    """
+    Maps URL + revision to what was downloaded (etag, size, sha256, path, mtime)
+    and caches remote HEAD metadata with a TTL.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load_locked(self):
+        if self._data is None:
+            data = load_json(self.path, {})
+            data.setdefault('files', {})
+            data.setdefault('remote', {})
+            self._data = data
+        return self._data
+
+    def _save_locked(self):
+        try:
+            save_json_atomic(self.path, self._data)
+        except OSError as e:
+            print(f"[HF Downloader] Warning: Could not save download index: {e}")
+
+    def find_local(self, url, path, variant=""):
+        """
+        Index entry for url if it was downloaded to path and the file is unchanged
+        """
+        with self._lock:
+            entry = self._load_locked()['files'].get(cache_key(url, variant))
+        if not entry or entry.get('path') != os.path.abspath(path):
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size != entry.get('size') or stat.st_mtime_ns != entry.get('mtime_ns'):
+            return None
+        if entry.get('sha256'):
+            remember_digest(path, entry['sha256'])
+        return entry
+
+    def remote_metadata(self, url, headers, force=False):
+        """
+        HEAD metadata for url (sha256, etag, size), served from the index while
+        younger than the TTL. Returns None if the server could not be reached.
+        """
+        key = cache_key(url)
+        if not force:
+            with self._lock:
+                cached = self._load_locked()['remote'].get(key)
+            if cached and time.time() - cached.get('checked', 0) < head_ttl(url):
+                return cached
+
+        metadata = fetch_remote_metadata(url, headers)
+        if metadata is None:
+            return None
+
+        metadata = dict(metadata, checked=time.time())
+        with self._lock:
+            self._load_locked()['remote'][key] = metadata
+            self._save_locked()
+        return metadata
+
+    def record(self, url, path, sha256=None, etag="", remote_size=0, variant=""):
+        """
+        Remember a completed download
+        """
+        stat = os.stat(path)
+        entry = {
+            'path': os.path.abspath(path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': sha256,
+            'etag': etag,
+            'remote_size': remote_size or stat.st_size,
+            'recorded': time.time(),
+        }
+        with self._lock:
+            self._load_locked()['files'][cache_key(url, variant)] = entry
+            self._save_locked()
+        return entry
+
+    def forget(self, url):
+        with self._lock:
+            data = self._load_locked()
+            data['files'].pop(cache_key(url), None)
+            data['remote'].pop(cache_key(url), None)
+            self._save_locked()
+
+
+def _matches_remote(entry, remote):
+    if remote.get('sha256') and entry.get('sha256'):
+        return remote['sha256'] == entry['sha256']
+    if remote.get('etag') and entry.get('etag'):
+        return remote['etag'] == entry['etag']
+    if remote.get('size'):
+        return remote['size'] == entry.get('size')
+    return True
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DownloadIndex(state_path(INDEX_FILE))
+        return _index
+
+
+def find_up_to_date(url, path, headers):
+    """
+    Return the index entry when path already holds the current version of url.
+    Uses the cached HEAD result, so repeated runs inside the TTL make no
+    network requests. Files that are on disk but not indexed yet are adopted
+    when their size and SHA-256 match the remote LFS metadata.
+    """
+    index = get_index()
+    entry = index.find_local(url, path)
+    remote = index.remote_metadata(url, headers)
+
+    if entry:
+        # Offline: trust what we already have
+        if remote is None or _matches_remote(entry, remote):
+            return entry
+        return None
+
+    if remote and remote.get('sha256') and os.path.isfile(path):
+        if remote.get('size') and os.path.getsize(path) != remote['size']:
+            return None
+        if sha256_file(path) == remote['sha256']:
+            return index.record(url, path, sha256=remote['sha256'], etag=remote.get('etag', ''), remote_size=remote.get('size', 0))
+    return None
@@ -0,0 +1,686 @@
+"""
+Pluggable download engines and the pipeline the single-file nodes share
+An engine only moves bytes: aria2c as a one-shot process, aria2c on the
+shared RPC daemon, or the pure Python parallel range engine. Everything
+around the transfer (up-to-date check, LFS metadata, journal, shared
+cache, delta update, mirror ranking, index and metrics) is run_download().
+Every engine reports progress through a ProgressReporter fed to the
+download's metrics, and running downloads can be cancelled by URL and
+destination (cancel_download).
+
+Auto selection: engines that pass a quick capability check are tried once
+per host, then the one with the best measured throughput (moving average,
+kept in .state/engine_ranking.json) is used. HF_DOWNLOADER_ENGINE forces
+an engine for every "auto" download (e.g. python on ComfyUI-Desktop).
+"""
+
+import os
+import time
+import shutil
+import threading
+import subprocess
+from collections import deque, namedtuple
+from .hf_common import get_hf_token, auth_headers, error_message
+from .download_state import state_path, load_json, save_json_atomic
+from .download_verify import sha256_file, check_digest, remember_digest, cached_digest, ChecksumMismatch
+from .download_cache import get_index, find_up_to_date
+from .download_manager import download_key
+from .download_progress import ProgressReporter, parse_readout, progress_from_rpc_status, iter_lines, is_retry_line
+from .download_metrics import DownloadMetrics
+from .download_mirrors import configured_mirrors, mirror_urls, rank_sources, source_host
+from .download_journal import get_journal
+from .download_files import part_path, file_allocation, publish_file, discard
+from .parallel_download import ParallelRangeDownloader, DownloadCancelled
+from .aria2_rpc import get_daemon_client, external_rpc_url, Aria2RpcError
+from .aria2c_locator import get_aria2c, get_aria2c_path
+from .shared_cache import get_shared_cache
+from .delta_update import apply_delta
+from .bandwidth import get_scheduler, current_slot
+from .connection_tuning import get_profiles, split_size_for
+
+LOG_PREFIX = "[HF Downloader]"
+
+RANKING_FILE = "engine_ranking.json"
+# Weight of the newest sample in an engine's smoothed throughput
+SMOOTHING = 0.3
+# Transfers shorter than this are dominated by setup cost and not recorded
+MIN_SAMPLE_BYTES = 16 * 1024 * 1024
+# Measurements older than this are treated as missing, so engines get re-tried
+SAMPLE_TTL = 7 * 24 * 60 * 60
+# Engines auto mode chooses between, in order of preference while untried.
+# The RPC daemon is a long-lived process and stays an explicit choice.
+AUTO_ENGINES = ("aria2c", "python")
+
+# aria2c exit codes a retry won't fix: resource not found, HTTP authorization
+# failed, checksum validation failed
+PERMANENT_ARIA2_CODES = ("3", "24", "32")
+
+# What run_download hands an engine
+TransferRequest = namedtuple("TransferRequest", [
+    "url", "sources", "headers", "token", "connections", "auto_connections",
+    "verify", "expected_sha256", "size", "metrics",
+])
+
+
+class Aria2cFailed(Exception):
+    """
+    aria2c (one-shot or on the RPC daemon) reported a failed download
+    """
+
+    def __init__(self, code):
+        super().__init__(f"aria2c download failed with code {code}. Check console for details.")
+        self.code = code
+        # Read by the journal to decide whether to resume after a restart
+        self.permanent = str(code) in PERMANENT_ARIA2_CODES
+
+
+class DownloadEngine:
+    """
+    Moves one file to a target path (through its .part file), verifies it
+    and publishes it. Subclasses implement transfer(); progress goes through
+    new_reporter() and cancel() may be called from any thread.
+    """
+    name = ""
+    log_prefix = LOG_PREFIX
+
+    def __init__(self):
+        self.reporter = None
+        self._cancelled = threading.Event()
+
+    @classmethod
+    def unavailable_reason(cls, url=""):
+        """
+        Why the engine can't download url here, or "" when it can
+        """
+        return ""
+
+    def headers(self, token):
+        return auth_headers(token)
+
+    def new_reporter(self, metrics):
+        self.reporter = ProgressReporter(self.log_prefix, metrics=metrics)
+        return self.reporter
+
+    def progress(self):
+        """
+        Latest Progress of the running transfer, or None before the first update
+        """
+        return self.reporter.last if self.reporter else None
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def check_cancelled(self):
+        if self._cancelled.is_set():
+            raise DownloadCancelled("Download cancelled")
+
+    def transfer(self, request, target):
+        """
+        Download request to target. Returns the SHA-256 it verified, or None.
+        """
+        raise NotImplementedError
+
+
+class PythonEngine(DownloadEngine):
+    """
+    Parallel HTTP Range requests in threads (parallel_download.py).
+    No subprocess, so it works under ComfyUI-Desktop's strict security mode.
+    """
+    name = "python"
+    log_prefix = "[HF Downloader]"
+
+    def __init__(self):
+        super().__init__()
+        self._downloader = None
+
+    def headers(self, token):
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        }
+        headers.update(auth_headers(token))
+        return headers
+
+    def transfer(self, request, target):
+        self._downloader = ParallelRangeDownloader(
+            request.url, request.headers, connections=request.connections, verify=request.verify,
+            expected_sha256=request.expected_sha256, metrics=request.metrics, sources=request.sources,
+            auto_tune=request.auto_connections, reporter=self.new_reporter(request.metrics))
+        if self._cancelled.is_set():
+            self._downloader.cancel()
+        self._downloader.download(target)
+        if self._downloader.expected_sha256:
+            print(f"{self.log_prefix} ✓ SHA-256 verified: {self._downloader.sha256}")
+        return self._downloader.sha256
+
+    def cancel(self):
+        super().cancel()
+        if self._downloader:
+            self._downloader.cancel()
+
+
+class Aria2cEngine(DownloadEngine):
+    """
+    One aria2c process per download (uris are mirrors of the same file)
+    """
+    name = "aria2c"
+    log_prefix = "[Aria2c HF Downloader]"
+
+    def __init__(self):
+        super().__init__()
+        self._process = None
+
+    @classmethod
+    def unavailable_reason(cls, url=""):
+        info = get_aria2c()
+        if not info:
+            return "aria2c is not installed"
+        # Builds list their protocols; an empty list means the version probe said nothing
+        if url.startswith("https:") and info.features and "HTTPS" not in info.features:
+            return "aria2c was built without HTTPS support"
+        return ""
+
+    def transfer(self, request, target):
+        metrics = request.metrics
+        connections = request.connections
+        # In auto mode `connections` is the upper bound: the count comes from
+        # the host's learned profile and the segment size from the file size
+        host = source_host(request.sources[0])
+        min_split_size = "1M"
+        if request.auto_connections:
+            connections = get_profiles().plan(host, request.size, connections)
+            min_split_size = f"{split_size_for(request.size, connections) // (1024 * 1024)}M"
+            print(f"{self.log_prefix} Auto connections for {host}: {connections} (min split size {min_split_size})")
+        print(f"{self.log_prefix} Connections: {connections}")
+
+        # aria2c writes to a fixed .part name next to target; a leftover
+        # control file means it continues an earlier attempt, a .part
+        # without one can't be trusted and is started over
+        temp_file = part_path(target)
+        resuming = os.path.exists(f"{temp_file}.aria2")
+        if not resuming:
+            discard(temp_file)
+        options = {
+            "dir": os.path.dirname(target),
+            "out": os.path.basename(temp_file),
+            "max-connection-per-server": str(connections),
+            "split": str(connections),
+            "continue": "true",
+            "min-split-size": min_split_size,
+            # Contiguous on ext4/xfs/btrfs/NTFS, so the first model load reads back fast
+            "file-allocation": file_allocation(),
+            "retry-wait": "3",
+            "max-tries": "5",
+            # The .part name is ours: overwrite it rather than writing name.1, name.2, ...
+            "allow-overwrite": "true",
+            "auto-file-renaming": "false",
+        }
+        # This download's share of the global bandwidth cap (see bandwidth.py)
+        slot = current_slot()
+        if slot and slot.rate:
+            options["max-download-limit"] = str(slot.rate)
+
+        self._run(request.sources, options, request.token, metrics, resuming)
+        metrics.transfer_finished()
+        get_profiles().record_transfer(host, connections, *metrics.transfer_stats())
+
+        print(f"{self.log_prefix} ✓ Download completed successfully!")
+        return self._finalize(temp_file, target, request.expected_sha256 if request.verify else None, metrics)
+
+    def _run(self, uris, options, hf_token, metrics, resuming):
+        cmd = [get_aria2c_path()] + [f"--{key}={value}" for key, value in options.items()] + [
+            "--console-log-level=notice",
+            "--summary-interval=5",
+            # Save the .aria2 control file often and exit with ComfyUI, so a
+            # restart resumes from the .part instead of racing an orphan
+            "--auto-save-interval=10",
+            f"--stop-with-process={os.getpid()}",
+        ] + list(uris)  # URLs should be last
+        if hf_token:
+            # Don't store token in cmd list for logging purposes
+            cmd.append(f"--header=Authorization: Bearer {hf_token}")
+
+        # Stream aria2c's output instead of buffering hours of log in memory;
+        # readout lines become live progress, only the last few others are kept
+        self.check_cancelled()
+        process = self._process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT
+        )
+        if self._cancelled.is_set():
+            process.terminate()
+        reporter = self.new_reporter(metrics)
+        tail = deque(maxlen=50)
+        try:
+            for line in iter_lines(process.stdout):
+                progress = parse_readout(line)
+                if progress:
+                    self._observe_resume(metrics, reporter, progress, resuming)
+                    reporter.update(progress)
+                else:
+                    if is_retry_line(line):
+                        metrics.retry()
+                    tail.append(line)
+            returncode = process.wait()
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+        if reporter.last:
+            reporter.log(reporter.last)
+
+        # Terminated by cancel(): aria2c saved its control file, the .part resumes later
+        self.check_cancelled()
+        if returncode != 0:
+            # Get error message but don't include full command (may contain token)
+            error_msg = "\n".join(tail)
+            print(f"{self.log_prefix} ✗ Download failed!")
+            print(f"{self.log_prefix} Error: {error_msg}")
+            raise Aria2cFailed(returncode)
+
+    def _observe_resume(self, metrics, reporter, progress, resuming):
+        # aria2c does not report resumed bytes; the first readout of a
+        # resumed download is the closest approximation
+        if resuming and reporter.last is None:
+            metrics.resumed_bytes = progress.completed
+
+    def _finalize(self, temp_file, target, expected_sha256, metrics):
+        """
+        Verify the file aria2c wrote to temp_file and move it to target.
+        Returns the verified SHA-256, or None.
+        """
+        if not os.path.exists(temp_file):
+            raise Exception(f"aria2c finished but {temp_file} was not written")
+
+        # Clean up .aria2 control files
+        try:
+            aria2_control = f"{temp_file}.aria2"
+            if os.path.exists(aria2_control):
+                os.remove(aria2_control)
+                print(f"{self.log_prefix} Cleaned up control file: {aria2_control}")
+        except Exception as e:
+            print(f"{self.log_prefix} Note: Could not remove control file: {e}")
+
+        # Single hashing pass right after completion; the digest is
+        # cached so later checks of the same file don't re-read it
+        digest = None
+        if expected_sha256:
+            started = time.perf_counter()
+            digest = sha256_file(temp_file)
+            metrics.add_verify_time(time.perf_counter() - started)
+            try:
+                check_digest(target, digest, expected_sha256)
+            except ChecksumMismatch:
+                # Only a whole-file hash is published, so the bad bytes can't
+                # be located: the data is deleted and the next attempt starts over
+                discard(temp_file)
+                print(f"{self.log_prefix} ✗ SHA-256 mismatch, downloaded data deleted")
+                raise
+            print(f"{self.log_prefix} ✓ SHA-256 verified: {digest}")
+
+        # One atomic rename: the final name never shows a partial or unverified file
+        publish_file(temp_file, target)
+        if digest:
+            remember_digest(target, digest)
+        return digest
+
+    def cancel(self):
+        super().cancel()
+        process = self._process
+        if process and process.poll() is None:
+            process.terminate()
+
+
+class Aria2cRpcEngine(Aria2cEngine):
+    """
+    Downloads queued on the shared aria2c RPC daemon (see aria2_rpc.py)
+    """
+    name = "aria2c-rpc"
+
+    def __init__(self):
+        super().__init__()
+        self._client = None
+        self._gid = None
+
+    @classmethod
+    def unavailable_reason(cls, url=""):
+        # An external endpoint (HF_DOWNLOADER_ARIA2_RPC_URL) needs no local aria2c
+        if external_rpc_url():
+            return ""
+        return super().unavailable_reason(url)
+
+    def _run(self, uris, options, hf_token, metrics, resuming):
+        client = get_daemon_client(get_aria2c_path())
+        rpc_options = dict(options)
+        if hf_token:
+            rpc_options["header"] = [f"Authorization: Bearer {hf_token}"]
+
+        scheduler = get_scheduler()
+        if scheduler.rate:
+            client.change_global_option({"max-overall-download-limit": str(scheduler.rate)})
+
+        self.check_cancelled()
+        gid = client.add_uri(uris, rpc_options)
+        self._client, self._gid = client, gid
+        print(f"{self.log_prefix} Queued on aria2c daemon (GID {gid})")
+        if self._cancelled.is_set():
+            self._remove()
+
+        # Follow the scheduler as other downloads start, finish or change priority
+        slot = current_slot()
+
+        def apply_rate(rate):
+            client.change_option(gid, {"max-download-limit": str(rate)})
+
+        if slot:
+            slot.on_rate_change(apply_rate)
+        reporter = self.new_reporter(metrics)
+
+        def on_status(status):
+            progress = progress_from_rpc_status(status)
+            self._observe_resume(metrics, reporter, progress, resuming)
+            reporter.update(progress)
+
+        try:
+            client.wait(gid, on_status=on_status)
+        except Aria2RpcError as e:
+            self.check_cancelled()
+            print(f"{self.log_prefix} ✗ Download failed!")
+            print(f"{self.log_prefix} Error: {e}")
+            raise Aria2cFailed(e.code)
+        finally:
+            if slot:
+                slot.remove_listener(apply_rate)
+
+    def _remove(self):
+        try:
+            self._client.remove(self._gid)
+        except (Aria2RpcError, OSError) as e:
+            print(f"{self.log_prefix} Note: Could not remove GID {self._gid}: {e}")
+
+    def cancel(self):
+        super().cancel()
+        if self._client and self._gid:
+            self._remove()
+
+
+ENGINES = {
+    "aria2c": Aria2cEngine,
+    "aria2c-rpc": Aria2cRpcEngine,
+    "python": PythonEngine,
+}
+
+
+class EngineRanking:
+    """
+    Smoothed throughput of each engine per host
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _hosts_locked(self):
+        if self._data is None:
+            self._data = load_json(self.path, {})
+            self._data.setdefault('hosts', {})
+        return self._data['hosts']
+
+    def record(self, host, engine, throughput):
+        if not host or throughput <= 0:
+            return
+        with self._lock:
+            sample = self._hosts_locked().setdefault(host, {}).get(engine)
+            if sample and time.time() - sample.get('updated', 0) <= SAMPLE_TTL:
+                throughput = sample['throughput'] * (1 - SMOOTHING) + throughput * SMOOTHING
+            self._data['hosts'][host][engine] = {'throughput': throughput, 'updated': time.time()}
+            try:
+                save_json_atomic(self.path, self._data)
+            except OSError as e:
+                print(f"{LOG_PREFIX} Warning: could not save engine ranking: {e}")
+
+    def record_transfer(self, host, engine, transferred, seconds):
+        """
+        Record a finished transfer, ignoring ones too small to say anything
+        """
+        if transferred >= MIN_SAMPLE_BYTES and seconds > 0:
+            self.record(host, engine, transferred / seconds)
+
+    def throughput(self, host, engine):
+        """
+        Bytes/s measured for engine against host, or None when unknown or stale
+        """
+        with self._lock:
+            sample = self._hosts_locked().get(host, {}).get(engine)
+        if not sample or time.time() - sample.get('updated', 0) > SAMPLE_TTL:
+            return None
+        return sample['throughput']
+
+
+_ranking = None
+_ranking_lock = threading.Lock()
+
+
+def get_engine_ranking():
+    global _ranking
+    with _ranking_lock:
+        if _ranking is None:
+            _ranking = EngineRanking(state_path(RANKING_FILE))
+        return _ranking
+
+
+def forced_engine():
+    """
+    Engine named by HF_DOWNLOADER_ENGINE, or "" for automatic selection
+    """
+    name = os.environ.get("HF_DOWNLOADER_ENGINE", "").strip().lower()
+    if name in ("", "auto"):
+        return ""
+    if name not in ENGINES:
+        print(f"{LOG_PREFIX} Warning: unknown HF_DOWNLOADER_ENGINE '{name}', choosing automatically")
+        return ""
+    return name
+
+
+def available_engines(url=""):
+    """
+    {engine name: reason it can't run here ("" when it can)}
+    """
+    return {name: engine_class.unavailable_reason(url) for name, engine_class in ENGINES.items()}
+
+
+def select_engine(url, engine="auto"):
+    """
+    A new engine instance for url: the named one, or in "auto" mode the
+    fastest measured one for the host (untried engines are tried first)
+    """
+    if engine == "auto":
+        engine = forced_engine() or "auto"
+    if engine != "auto":
+        engine_class = ENGINES.get(engine)
+        if engine_class is None:
+            raise ValueError(f"Unknown download engine: {engine}")
+        reason = engine_class.unavailable_reason(url)
+        if reason:
+            raise Exception(f"Download engine '{engine}' is not available: {reason}")
+        return engine_class()
+
+    host = source_host(url)
+    ranking = get_engine_ranking()
+    candidates = []
+    for name in AUTO_ENGINES:
+        reason = ENGINES[name].unavailable_reason(url)
+        if reason:
+            print(f"{LOG_PREFIX} Engine {name} unavailable: {reason}")
+        else:
+            candidates.append(name)
+    measured = {name: ranking.throughput(host, name) for name in candidates}
+    untried = [name for name in candidates if measured[name] is None]
+    if untried:
+        choice = untried[0]
+        why = "not measured yet" if len(candidates) > 1 else "only engine available"
+    else:
+        choice = max(candidates, key=measured.get)
+        why = ", ".join(f"{name} {measured[name] / (1024 * 1024):.1f} MB/s" for name in candidates)
+    print(f"{LOG_PREFIX} Engine for {host}: {choice} ({why})")
+    return ENGINES[choice]()
+
+
+_active = {}
+_active_lock = threading.Lock()
+
+
+def active_downloads():
+    """
+    {download key: (engine name, latest Progress or None)} of running transfers
+    """
+    with _active_lock:
+        running = dict(_active)
+    return {key: (engine.name, engine.progress()) for key, engine in running.items()}
+
+
+def cancel_download(url, destination):
+    """
+    Stop the running download of url to destination, whatever its engine.
+    Partial data is kept, so running it again resumes. Returns False when
+    no such download is running.
+    """
+    with _active_lock:
+        engine = _active.get(download_key(url, destination))
+    if engine is None:
+        return False
+    engine.cancel()
+    return True
+
+
+def _check_disk_space(directory, log_prefix):
+    try:
+        stat = shutil.disk_usage(directory)
+        free_gb = stat.free / (1024**3)
+        if stat.free < 1024 * 1024 * 1024:  # Less than 1GB free
+            print(f"{log_prefix} ⚠ Warning: Low disk space ({free_gb:.2f} GB free)")
+        else:
+            print(f"{log_prefix} Available disk space: {free_gb:.2f} GB")
+    except Exception as e:
+        print(f"{log_prefix} Warning: Could not check disk space: {e}")
+
+
+def run_download(engine, url, output_file, connections=8, use_hf_token=True, hf_token_override="",
+                 verify_sha256=True, force_refresh=False, mirrors="", shared_cache_dir="",
+                 auto_connections=False, delta_update=False, delta_manifest_url=""):
+    """
+    Download url to output_file with engine (runs on a download manager thread).
+    Returns (output_file,).
+    """
+    key = download_key(url, output_file)
+    log_prefix = engine.log_prefix
+    metrics = DownloadMetrics(url, engine=engine.name)
+    with _active_lock:
+        _active[key] = engine
+    try:
+        return _run_download(engine, key, url, output_file, metrics, connections, use_hf_token,
+                             hf_token_override, verify_sha256, force_refresh, mirrors, shared_cache_dir,
+                             auto_connections, delta_update, delta_manifest_url)
+    except DownloadCancelled:
+        print(f"{log_prefix} Download cancelled, partial data kept for resume: {output_file}")
+        metrics.finish("cancelled")
+        # Not picked up again at startup; running the node again still resumes the .part
+        get_journal().finish(key)
+        raise
+    except Exception as e:
+        # Don't log details that might contain the token
+        error_msg = error_message(e)
+        print(f"{log_prefix} ✗ {error_msg}")
+        metrics.finish("error", error=error_msg)
+        raise Exception(error_msg)
+    finally:
+        with _active_lock:
+            if _active.get(key) is engine:
+                del _active[key]
+
+
+def _run_download(engine, key, url, output_file, metrics, connections, use_hf_token, hf_token_override,
+                  verify_sha256, force_refresh, mirrors, shared_cache_dir, auto_connections, delta_update,
+                  delta_manifest_url):
+    log_prefix = engine.log_prefix
+    _check_disk_space(os.path.dirname(output_file), log_prefix)
+
+    token = None
+    if use_hf_token:
+        token = get_hf_token(hf_token_override)
+        if token:
+            print(f"{log_prefix} Using HuggingFace token for authentication")
+        else:
+            print(f"{log_prefix} Warning: HF token requested but not found")
+    headers = engine.headers(token)
+
+    # Skip files that are already downloaded and unchanged upstream
+    # (the remote HEAD is cached, so this is usually free)
+    if not force_refresh and find_up_to_date(url, output_file, headers):
+        print(f"{log_prefix} ✓ Already up to date, skipping download: {output_file}")
+        metrics.finish("up_to_date", size=os.path.getsize(output_file))
+        return (output_file,)
+
+    # Expected SHA-256 from HF's LFS metadata: None when unknown (the
+    # Python engine looks it up itself), "" for files without one
+    index = get_index()
+    metadata = index.remote_metadata(url, headers, force=force_refresh) or {}
+    remote_sha256 = metadata.get('sha256') or None
+    expected_sha256 = None
+    if verify_sha256 and metadata:
+        expected_sha256 = metadata.get('sha256') or ""
+
+    # Shared content-addressed cache (keyed by the LFS SHA-256); blobs are
+    # always verified before other instances can link them
+    cache = get_shared_cache(shared_cache_dir)
+    cache_key = cache.key_for(metadata) if cache and metadata else None
+    if cache_key:
+        expected_sha256 = cache_key
+    if expected_sha256:
+        print(f"{log_prefix} Expected SHA-256: {expected_sha256}")
+    get_journal().update(key, expected_sha256=expected_sha256 or None, size=metadata.get('size', 0))
+
+    # Update an older local copy by fetching only the chunks that changed
+    if delta_update and not cache_key and os.path.isfile(output_file) and apply_delta(
+            url, output_file, headers, delta_manifest_url, remote_sha256, connections, metrics,
+            log_prefix=log_prefix):
+        index.record(url, output_file, sha256=cached_digest(output_file),
+                     etag=metadata.get('etag', ""), remote_size=metadata.get('size', 0))
+        print(f"{log_prefix} ✓ Download complete: {output_file}")
+        metrics.finish("ok", size=os.path.getsize(output_file))
+        return (output_file,)
+
+    # The same file on every configured mirror, fastest first; aria2c pulls
+    # segments from all of them, the Python engine fails over mid-file
+    sources = rank_sources(mirror_urls(url, configured_mirrors(mirrors)), headers, log_prefix=log_prefix)
+
+    print(f"{log_prefix} Starting download ({engine.name} engine)...")
+    print(f"{log_prefix} URL: {url}")
+    if len(sources) > 1:
+        print(f"{log_prefix} Sources: {len(sources)} (including mirrors)")
+    print(f"{log_prefix} Destination: {output_file}")
+
+    request = TransferRequest(url, sources, headers, token, connections, auto_connections,
+                              verify_sha256 or bool(cache_key), expected_sha256, metadata.get('size', 0), metrics)
+    digest = None
+    if cache_key:
+        def transfer(target):
+            engine.transfer(request, target)
+            return target
+        downloaded = cache.fetch(cache_key, output_file, transfer, log_prefix=log_prefix)
+    else:
+        digest = engine.transfer(request, output_file)
+        downloaded = True
+
+    index.record(url, output_file, sha256=digest or cache_key,
+                 etag=metadata.get('etag', ""), remote_size=metadata.get('size', 0))
+    if downloaded:
+        get_engine_ranking().record_transfer(source_host(url), engine.name, *metrics.transfer_stats())
+
+    print(f"{log_prefix} ✓ Download complete: {output_file}")
+    metrics.finish("ok" if downloaded else "shared_cache", size=os.path.getsize(output_file))
+    return (output_file,)
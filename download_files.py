@@ -0,0 +1,66 @@
+"""
+Temp files, preallocation and atomic publish for every download engine
+Data is written to a fixed `<file>.part` name next to the destination (same
+filesystem, so resuming is deterministic), preallocated so large models are
+laid out contiguously, and moved into place with a single rename once it is
+complete and verified: the final name never shows a partial file.
+
+HF_DOWNLOADER_FILE_ALLOCATION picks the allocation method: falloc (default),
+prealloc, trunc or none (the last two leave a sparse file).
+"""
+
+import os
+import errno
+
+LOG_PREFIX = "[HF Downloader]"
+
+PART_SUFFIX = ".part"
+ALLOCATION_METHODS = ("falloc", "prealloc", "trunc", "none")
+
+
+def part_path(path):
+    return path + PART_SUFFIX
+
+
+def file_allocation():
+    """
+    Allocation method, using aria2c's --file-allocation names
+    """
+    method = os.environ.get("HF_DOWNLOADER_FILE_ALLOCATION", "falloc").strip().lower()
+    return method if method in ALLOCATION_METHODS else "falloc"
+
+
+def preallocate(f, size, method=None):
+    """
+    Size an open file to size bytes. falloc/prealloc reserve the blocks up
+    front (one contiguous extent where the filesystem allows, and an early
+    out-of-space error instead of one halfway through); trunc/none only set
+    the length. Falls back to a sparse file where fallocate is unsupported.
+    """
+    method = method or file_allocation()
+    if method in ("falloc", "prealloc") and size and hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            return
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise Exception(f"Not enough disk space to download {size / (1024**3):.2f} GB")
+            if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+                raise
+    f.truncate(size)
+
+
+def publish_file(source, destination):
+    """
+    Move a completed temp file into place in one atomic rename (replacing
+    any older version of the file)
+    """
+    os.replace(source, destination)
+
+
+def discard(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,240 @@
+"""
+Crash-safe journal of in-flight downloads
+Every single-file download is written to .state/download_journal.json
+(URL, destination, engine, expected size and SHA-256, and the node
+arguments needed to run it again) when it starts, and removed when it
+finishes. At ComfyUI startup, entries a crash or restart left behind are
+resumed in the background from their .part data, as are downloads that
+failed with a transient error (network, timeout, server error). Ones that
+failed for good (401/403/404, checksum mismatch) wait for the node to be
+queued again. Entries older than HF_DOWNLOADER_JOURNAL_MAX_AGE (seconds,
+default 7 days) are removed together with their partial files.
+
+The HF token override is never written; resumed downloads use HF_TOKEN.
+HF_DOWNLOADER_RESUME=0 turns resuming at startup off.
+"""
+
+import os
+import time
+import inspect
+import threading
+from .hf_common import is_permanent_error, downloader_nodes
+from .download_state import state_path, load_json, save_json_atomic
+from .download_files import part_path, discard
+from .parallel_download import SIDECAR_SUFFIX
+from .delta_update import delta_part_path
+from .download_manager import get_manager, download_key
+
+LOG_PREFIX = "[HF Downloader]"
+JOURNAL_FILE = "download_journal.json"
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60
+# Give up resuming automatically after this many attempts (the data is kept until it ages out)
+MAX_RESUME_ATTEMPTS = 3
+# Never written to disk
+SECRET_ARGUMENTS = ("hf_token_override",)
+# aria2c's resume state next to the .part file
+ARIA2_CONTROL_SUFFIX = ".aria2"
+
+
+def resume_enabled():
+    return os.environ.get("HF_DOWNLOADER_RESUME", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def max_age():
+    try:
+        return float(os.environ.get("HF_DOWNLOADER_JOURNAL_MAX_AGE", DEFAULT_MAX_AGE))
+    except ValueError:
+        return DEFAULT_MAX_AGE
+
+
+def partial_files(destination):
+    """
+    Files an unfinished download of destination may have left behind
+    """
+    temp_file = part_path(destination)
+    return [temp_file, destination + SIDECAR_SUFFIX, temp_file + ARIA2_CONTROL_SUFFIX, delta_part_path(destination)]
+
+
+class DownloadJournal:
+    """
+    In-flight downloads by destination, persisted on every change
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def _load_locked(self):
+        if self._entries is None:
+            self._entries = load_json(self.path, {}).get('downloads', {})
+        return self._entries
+
+    def _save_locked(self):
+        try:
+            save_json_atomic(self.path, {'downloads': self._entries})
+        except OSError as e:
+            print(f"{LOG_PREFIX} Warning: Could not save download journal: {e}")
+
+    def begin(self, key, entry):
+        """
+        Record that the download identified by key (see download_key) is starting
+        """
+        now = time.time()
+        with self._lock:
+            entries = self._load_locked()
+            previous = entries.get(key[1], {})
+            if previous.get('url') != key[0]:
+                previous = {}
+            entries[key[1]] = dict(entry, url=key[0], destination=key[1], state='running',
+                                   started=previous.get('started', now), updated=now,
+                                   attempts=previous.get('attempts', 0) + 1)
+            self._save_locked()
+
+    def update(self, key, **fields):
+        """
+        Add details learnt once the download runs (expected_sha256, size)
+        """
+        with self._lock:
+            entry = self._load_locked().get(key[1])
+            if entry is not None and entry.get('url') == key[0]:
+                entry.update(fields, updated=time.time())
+                self._save_locked()
+
+    def fail(self, key, error):
+        """
+        Record a failed attempt with its error and whether retrying can help
+        """
+        with self._lock:
+            entry = self._load_locked().get(key[1])
+            if entry is not None and entry.get('url') == key[0]:
+                entry.update(state='failed', error=str(error), updated=time.time(),
+                             error_kind="permanent" if is_permanent_error(error) else "transient")
+                self._save_locked()
+
+    def finish(self, key):
+        with self._lock:
+            entries = self._load_locked()
+            if entries.get(key[1], {}).get('url') == key[0]:
+                del entries[key[1]]
+                self._save_locked()
+
+    def forget(self, destination):
+        with self._lock:
+            if self._load_locked().pop(destination, None) is not None:
+                self._save_locked()
+
+    def entries(self):
+        with self._lock:
+            return [dict(entry) for entry in self._load_locked().values()]
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = DownloadJournal(state_path(JOURNAL_FILE))
+        return _journal
+
+
+def journaled(key, fn, *args, engine=""):
+    """
+    The download manager job (key, fn, *args), recorded in the journal
+    while it runs. fn is a node's bound _download_to; its arguments are
+    stored by name so the job can be rebuilt after a restart.
+    """
+    node = type(fn.__self__).__name__
+    arguments = inspect.signature(fn).bind(*args).arguments
+    entry = {
+        'node': node,
+        'engine': engine,
+        'arguments': {name: value for name, value in arguments.items() if name not in SECRET_ARGUMENTS},
+    }
+
+    def run(*call_args):
+        journal = get_journal()
+        journal.begin(key, entry)
+        try:
+            result = fn(*call_args)
+        except BaseException as e:
+            journal.fail(key, e)
+            raise
+        journal.finish(key)
+        return result
+
+    return (key, run) + args
+
+
+def _rebuild(entry, nodes):
+    """
+    The journaled job for an entry, or None when its node is unknown
+    """
+    node_class = nodes.get(entry.get('node'))
+    if node_class is None:
+        return None
+    fn = node_class()._download_to
+    arguments = dict(entry.get('arguments', {}), force_refresh=False)
+    for name in SECRET_ARGUMENTS:
+        if name in inspect.signature(fn).parameters:
+            arguments[name] = ""
+    bound = inspect.signature(fn).bind(**arguments)
+    return journaled(download_key(entry['url'], entry['destination']), fn, *bound.args, engine=entry.get('engine', ""))
+
+
+def resume_interrupted():
+    """
+    Resume (as background prefetches) or clean up downloads a previous run
+    left unfinished. Returns the number of downloads resumed.
+    """
+    journal = get_journal()
+    nodes = downloader_nodes()
+    resumed = 0
+    now = time.time()
+    for entry in journal.entries():
+        destination = entry.get('destination', "")
+        leftovers = [path for path in partial_files(destination) if os.path.exists(path)]
+        if now - entry.get('updated', 0) > max_age():
+            discard(*leftovers)
+            journal.forget(destination)
+            print(f"{LOG_PREFIX} Removed stale unfinished download: {destination}")
+            continue
+        if not leftovers and os.path.exists(destination):
+            # Finished, the process stopped before the journal was updated
+            journal.forget(destination)
+            continue
+        if entry.get('state') == 'failed' and entry.get('error_kind') == "permanent":
+            print(f"{LOG_PREFIX} Not resuming {destination}: {entry.get('error')}; queue the node again to retry")
+            continue
+        if entry.get('attempts', 0) >= MAX_RESUME_ATTEMPTS:
+            print(f"{LOG_PREFIX} Not resuming {destination} after {entry['attempts']} attempts "
+                  f"(last error: {entry.get('error', 'interrupted')}); queue the node again to retry")
+            continue
+        try:
+            job = _rebuild(entry, nodes)
+        except (TypeError, KeyError):
+            job = None
+        if job is None:
+            # e.g. written by another version of the node; its data ages out like any other
+            print(f"{LOG_PREFIX} Could not resume journaled download {destination}")
+            continue
+        print(f"{LOG_PREFIX} Resuming interrupted download in the background: {entry['url']} -> {destination}")
+        get_manager().prefetch(*job)
+        resumed += 1
+    return resumed
+
+
+def register():
+    """
+    Resume interrupted downloads when the node package is loaded
+    """
+    if not resume_enabled():
+        return 0
+    try:
+        return resume_interrupted()
+    except Exception as e:
+        print(f"{LOG_PREFIX} Warning: could not resume interrupted downloads: {e}")
+        return 0
@@ -0,0 +1,304 @@
+"""
+Process-wide background download manager
+Runs transfers off the prompt executor thread and merges duplicate requests
+for the same URL + destination into one in-flight job (single-flight).
+Queued jobs start in priority order (a job a node waits on before any
+prefetch, and it never waits for a free worker), and every job holds a
+bandwidth scheduler slot while it runs. A job drives ComfyUI's progress
+bar only while a node waits on it in run().
+"""
+
+import os
+import time
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from .bandwidth import get_scheduler, PRIORITY_BLOCKING, PRIORITY_NORMAL, PRIORITY_PREFETCH
+from .parallel_download import DownloadCancelled
+from .download_progress import ProgressTarget, bind_progress_target
+
+LOG_PREFIX = "[HF Downloader]"
+DEFAULT_MAX_WORKERS = 4
+# How long a finished prefetch nobody claimed is kept for its node, in seconds
+PREFETCH_KEEP = 30 * 60
+
+
+def download_key(url, destination):
+    """
+    Identity of a download: the same URL written to the same place
+    """
+    return (url.strip(), os.path.normcase(os.path.abspath(destination)))
+
+
+def _check_interrupted():
+    # Let ComfyUI's "Cancel" stop the waiting node (the shared transfer keeps going)
+    try:
+        import comfy.model_management
+    except ImportError:
+        return
+    comfy.model_management.throw_exception_if_processing_interrupted()
+
+
+def _executing_node_id():
+    # The node calling run(), whose progress bar the download should drive
+    try:
+        from comfy_execution.utils import get_executing_context
+    except ImportError:
+        get_executing_context = None
+    if get_executing_context is not None:
+        context = get_executing_context()
+        if context is not None:
+            return context.node_id
+    try:
+        from server import PromptServer
+        return PromptServer.instance.last_node_id
+    except (ImportError, AttributeError):
+        return None
+
+
+def _outputs_exist(result):
+    # Node results are tuples of output paths
+    return all(os.path.exists(value) for value in (result or ()) if isinstance(value, str))
+
+
+class DownloadManager:
+    """
+    Background executor for downloads with single-flight deduplication.
+    submit() returns the existing Future when the same key is already in flight.
+    Up to max_workers jobs run at once; blocking jobs start even when all
+    workers are busy, the rest wait in a priority queue (not FIFO), so a
+    job raised to a higher priority moves ahead of queued prefetches.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._lock = threading.RLock()
+        self._running = 0
+        # Heap of [priority, order, key, future, fn, args, kwargs]
+        self._queue = []
+        self._order = itertools.count()
+        self._in_flight = {}
+        # key -> ProgressTarget of the in-flight job
+        self._targets = {}
+        # Prefetch results kept until the node that asked for them runs:
+        # key -> [future, number of prefetch requests holding it, finished at]
+        self._prefetched = {}
+        # Keys a caller is blocked on in run() (never cancelled as orphaned prefetches)
+        self._waiting = {}
+
+    def submit(self, key, fn, *args, priority=PRIORITY_NORMAL, **kwargs):
+        """
+        Start fn in the background unless a job with this key is already
+        running, in which case the caller shares that job's Future (and
+        raises its priority if the caller is more urgent)
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            joined = future is not None
+            if joined:
+                self._promote_queued(key, priority)
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                self._targets[key] = ProgressTarget()
+                heapq.heappush(self._queue, [priority, next(self._order), key, future, fn, args, kwargs])
+                self._start_queued()
+        if joined:
+            print(f"{LOG_PREFIX} Joining in-flight download: {key[0]}")
+            # Outside the lock, see _promote
+            get_scheduler().promote(key, priority)
+            return future
+        future.add_done_callback(lambda f, key=key: self._finished(key, f))
+        return future
+
+    def _promote(self, key, priority):
+        # Both while queued here and once waiting for (or holding) a scheduler slot.
+        # The scheduler is called without the lock: its rate listeners may
+        # make RPC calls to aria2c, which must not hold up every other caller
+        with self._lock:
+            self._promote_queued(key, priority)
+        get_scheduler().promote(key, priority)
+
+    def _promote_queued(self, key, priority):
+        # Called with the lock held
+        for job in self._queue:
+            if job[2] == key and priority < job[0]:
+                job[0] = priority
+                heapq.heapify(self._queue)
+                self._start_queued()
+
+    def _start_queued(self):
+        # Called with the lock held
+        while self._queue and (self._running < self.max_workers or self._queue[0][0] <= PRIORITY_BLOCKING):
+            priority, _, key, future, fn, args, kwargs = heapq.heappop(self._queue)
+            if not future.set_running_or_notify_cancel():
+                continue
+            self._running += 1
+            threading.Thread(target=self._work, args=(key, priority, future, fn, args, kwargs),
+                             daemon=True, name="hf-download").start()
+
+    def _work(self, key, priority, future, fn, args, kwargs):
+        with self._lock:
+            bind_progress_target(self._targets.get(key))
+        try:
+            with get_scheduler().transfer(key, priority):
+                result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._start_queued()
+
+    def _finished(self, key, future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+                self._targets.pop(key, None)
+
+    def prefetch(self, key, fn, *args, **kwargs):
+        """
+        Start a download ahead of time without waiting for it
+        (lowest priority until something waits on it)
+        """
+        future = self.submit(key, fn, *args, priority=PRIORITY_PREFETCH, **kwargs)
+        with self._lock:
+            self._expire_prefetches()
+            entry = self._prefetched.get(key)
+            if entry is not None and entry[0] is future:
+                entry[1] += 1
+            else:
+                self._prefetched[key] = [future, 1, None]
+                future.add_done_callback(lambda f, key=key: self._prefetch_finished(key, f))
+        return future
+
+    def _prefetch_finished(self, key, future):
+        self._log_prefetch_failure(future)
+        with self._lock:
+            entry = self._prefetched.get(key)
+            if entry is None or entry[0] is not future:
+                return
+            if future.cancelled() or future.exception() is not None:
+                # Nothing to hand over; the node downloads again when it runs
+                del self._prefetched[key]
+            else:
+                entry[2] = time.monotonic()
+
+    def _expire_prefetches(self):
+        # Results no node came for (e.g. a resumed download whose workflow is gone)
+        now = time.monotonic()
+        for key in [key for key, entry in self._prefetched.items()
+                    if entry[2] is not None and now - entry[2] > PREFETCH_KEEP]:
+            del self._prefetched[key]
+
+    def release_prefetch(self, future):
+        """
+        Drop one hold on a prefetch nobody claimed (e.g. its prompt was
+        deleted from the queue). Once no hold is left and no node waits on
+        it, a job still queued is cancelled; returns its key when it is
+        already transferring so the caller can stop it, else None.
+        """
+        with self._lock:
+            key = next((k for k, entry in self._prefetched.items() if entry[0] is future), None)
+            if key is None:
+                return None
+            entry = self._prefetched[key]
+            entry[1] -= 1
+            if entry[1] > 0:
+                return None
+            del self._prefetched[key]
+            if future.done() or self._waiting.get(key):
+                return None
+            # Under the lock so no caller joins it in between; cancel()
+            # runs the done callbacks, which re-enter the lock
+            if future.cancel():
+                print(f"{LOG_PREFIX} Cancelled unneeded prefetch: {key[0]}")
+                return None
+        return key
+
+    def _claim_prefetch(self, key):
+        """
+        The prefetch started for key, unless there is none, it failed or
+        the files it produced are gone since
+        """
+        with self._lock:
+            self._expire_prefetches()
+            entry = self._prefetched.pop(key, None)
+        future = entry[0] if entry else None
+        if future is None or (future.done() and (future.cancelled() or future.exception() is not None)):
+            return None
+        if future.done() and not _outputs_exist(future.result()):
+            print(f"{LOG_PREFIX} Prefetched file is gone, downloading again: {key[0]}")
+            return None
+        return future
+
+    @staticmethod
+    def _log_prefetch_failure(future):
+        if future.cancelled() or isinstance(future.exception(), DownloadCancelled):
+            return
+        if future.exception() is not None:
+            print(f"{LOG_PREFIX} Prefetch failed (will retry when the node runs): {future.exception()}")
+
+    def wait(self, future, poll_interval=0.5):
+        """
+        Block until the job finishes, staying responsive to ComfyUI interrupts
+        """
+        while True:
+            try:
+                return future.result(timeout=poll_interval)
+            except FutureTimeoutError:
+                _check_interrupted()
+
+    def run(self, key, fn, *args, **kwargs):
+        """
+        Submit (or join) the job and wait for its result; the caller is
+        blocked on it, so it gets the highest priority. A prefetch of the
+        same key (even a finished one) is claimed instead of starting over.
+        """
+        with self._lock:
+            self._waiting[key] = self._waiting.get(key, 0) + 1
+        try:
+            future = self._claim_prefetch(key)
+            if future is None:
+                future = self.submit(key, fn, *args, priority=PRIORITY_BLOCKING, **kwargs)
+            elif not future.done():
+                print(f"{LOG_PREFIX} Waiting for prefetched download: {key[0]}")
+                self._promote(key, PRIORITY_BLOCKING)
+            node_id = _executing_node_id()
+            with self._lock:
+                target = self._targets.get(key)
+                if target is not None:
+                    target.node_id = node_id
+                    target.waiting = True
+            return self.wait(future)
+        finally:
+            with self._lock:
+                self._waiting[key] -= 1
+                if not self._waiting[key]:
+                    del self._waiting[key]
+                    target = self._targets.get(key)
+                    if target is not None:
+                        target.waiting = False
+
+    def in_flight(self):
+        with self._lock:
+            return list(self._in_flight)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            try:
+                max_workers = int(os.environ.get("HF_DOWNLOADER_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+            except ValueError:
+                max_workers = DEFAULT_MAX_WORKERS
+            _manager = DownloadManager(max_workers=max(1, max_workers))
+        return _manager
@@ -0,0 +1,284 @@
+"""
+Structured per-download metrics
+Every download emits one record (host, bytes, TTFB, mean/p95 throughput,
+per-connection throughput, retries, connections, resumed ratio,
+verification time) appended to
+metrics.jsonl, and cumulative totals are exported in Prometheus text format
+(hf_downloader.prom) for node_exporter's textfile collector.
+
+Files go to HF_DOWNLOADER_METRICS_DIR (default: the state folder).
+Set HF_DOWNLOADER_METRICS=0 to disable.
+"""
+
+import os
+import json
+import math
+import time
+import threading
+import urllib.parse
+from .download_state import state_dir, load_json, save_json_atomic
+
+LOG_PREFIX = "[HF Downloader]"
+
+RECORDS_FILE = "metrics.jsonl"
+PROMETHEUS_FILE = "hf_downloader.prom"
+TOTALS_FILE = "metrics_totals.json"
+# Throughput samples kept per download for the p95 (progress updates are ~1-2/s)
+MAX_SAMPLES = 4096
+
+
+def metrics_enabled():
+    return os.environ.get("HF_DOWNLOADER_METRICS", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def metrics_dir():
+    directory = os.environ.get("HF_DOWNLOADER_METRICS_DIR") or state_dir()
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a list of numbers (0 for an empty list)
+    """
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(fraction * len(ordered))))
+    return ordered[rank - 1]
+
+
+class DownloadMetrics:
+    """
+    Collects measurements for one download. Engines only touch it at
+    connection start, on retries and from the periodic progress callback,
+    never per chunk.
+    """
+
+    def __init__(self, url, engine):
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname or ""
+        self.file = os.path.basename(parsed.path)
+        self.engine = engine
+        self.started = time.monotonic()
+        self.first_byte_at = None
+        self.transfer_end = None
+        self.retries = 0
+        self.connections = 0
+        self.total_bytes = 0
+        self.resumed_bytes = 0
+        self.verify_seconds = 0.0
+        self._samples = []
+        self._connection_samples = []
+        self._lock = threading.Lock()
+
+    def first_byte(self):
+        """
+        Mark the first response of the transfer (only the first call counts)
+        """
+        if self.first_byte_at is None:
+            self.first_byte_at = time.monotonic()
+
+    def retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def observe(self, progress):
+        """
+        Progress callback (see ProgressReporter): speed samples and connection count
+        """
+        if progress.completed > self.resumed_bytes:
+            self.first_byte()
+        if progress.total:
+            self.total_bytes = progress.total
+        self.connections = max(self.connections, progress.connections)
+        if progress.speed and len(self._samples) < MAX_SAMPLES:
+            self._samples.append(progress.speed)
+
+    def connection_finished(self, transferred, seconds):
+        """
+        One connection (a range request of the Python engines) is done:
+        its own throughput, from its first response byte to its last
+        """
+        if transferred > 0 and seconds > 0:
+            with self._lock:
+                if len(self._connection_samples) < MAX_SAMPLES:
+                    self._connection_samples.append(transferred / seconds)
+
+    def transfer_finished(self):
+        """
+        Mark the end of the data transfer (before any post-download verification)
+        """
+        self.transfer_end = time.monotonic()
+
+    def add_verify_time(self, seconds):
+        self.verify_seconds += seconds
+
+    def transfer_stats(self, size=None):
+        """
+        (bytes transferred, seconds) of the data transfer itself, excluding
+        resumed data, the HEAD/probe and verification
+        """
+        size = self.total_bytes if size is None else size
+        transfer_start = self.first_byte_at or self.started
+        seconds = max(1e-6, (self.transfer_end or time.monotonic()) - transfer_start)
+        return max(0, size - self.resumed_bytes), seconds
+
+    def record(self, status, size=None, error=None):
+        """
+        Build the finished record
+        """
+        finished = time.monotonic()
+        size = self.total_bytes if size is None else size
+        transferred, transfer_seconds = self.transfer_stats(size)
+        if status != "ok":
+            transferred = 0
+        return {
+            "timestamp": round(time.time(), 3),
+            "engine": self.engine,
+            "host": self.host,
+            "file": self.file,
+            "status": status,
+            "bytes": size,
+            "transferred_bytes": transferred,
+            "resumed_ratio": round(self.resumed_bytes / size, 4) if size else 0.0,
+            "ttfb_seconds": round(self.first_byte_at - self.started, 4) if self.first_byte_at else None,
+            "duration_seconds": round(finished - self.started, 3),
+            "mean_throughput": int(transferred / transfer_seconds) if transferred else 0,
+            "p95_throughput": int(percentile(self._samples, 0.95)),
+            # Empty (0) for aria2c, which only reports the download's total speed
+            "connection_count": len(self._connection_samples),
+            "connection_min_throughput": int(min(self._connection_samples, default=0)),
+            "connection_median_throughput": int(percentile(self._connection_samples, 0.5)),
+            "connection_max_throughput": int(max(self._connection_samples, default=0)),
+            "retries": self.retries,
+            "connections": self.connections,
+            "verify_seconds": round(self.verify_seconds, 3),
+            "error": error,
+        }
+
+    def finish(self, status, size=None, error=None):
+        """
+        Record the outcome; never lets a metrics problem fail the download
+        """
+        if not metrics_enabled():
+            return None
+        try:
+            record = self.record(status, size=size, error=error)
+            get_exporter().export(record)
+            return record
+        except Exception as e:
+            print(f"{LOG_PREFIX} Warning: could not write download metrics: {e}")
+            return None
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + "}"
+
+
+# (name, help) of the exported series
+_COUNTERS = [
+    ("downloads_total", "Downloads finished, by outcome"),
+    ("bytes_total", "Bytes transferred (excluding resumed data)"),
+    ("retries_total", "Connection retries"),
+    ("download_seconds_total", "Wall time spent downloading"),
+    ("verify_seconds_total", "Time spent verifying SHA-256 after transfer"),
+]
+_GAUGES = [
+    ("last_ttfb_seconds", "Time to first byte of the last download"),
+    ("last_throughput_bytes", "Mean throughput of the last download, bytes/s"),
+    ("last_p95_throughput_bytes", "95th percentile throughput sample of the last download, bytes/s"),
+    ("last_connection_min_throughput_bytes", "Slowest connection of the last download, bytes/s"),
+    ("last_connection_median_throughput_bytes", "Median connection throughput of the last download, bytes/s"),
+    ("last_resumed_ratio", "Fraction of the last download that was resumed"),
+    ("last_connections", "Connections used by the last download"),
+    ("last_timestamp_seconds", "Unix time the last download finished"),
+]
+
+
+class MetricsExporter:
+    """
+    Appends records to the JSONL file and rewrites the Prometheus textfile.
+    Counters are persisted so they stay monotonic across restarts.
+    """
+
+    def __init__(self, directory):
+        self.records_file = os.path.join(directory, RECORDS_FILE)
+        self.prometheus_file = os.path.join(directory, PROMETHEUS_FILE)
+        self.totals_file = os.path.join(directory, TOTALS_FILE)
+        self._lock = threading.Lock()
+        self._totals = None
+
+    def export(self, record):
+        line = json.dumps(record, sort_keys=True)
+        with self._lock:
+            with open(self.records_file, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+            self._update_totals_locked(record)
+            save_json_atomic(self.totals_file, self._totals)
+            self._write_prometheus_locked()
+
+    def _update_totals_locked(self, record):
+        if self._totals is None:
+            self._totals = load_json(self.totals_file, {})
+            self._totals.setdefault('series', {})
+            self._totals.setdefault('last', {})
+        key = f"{record['engine']}|{record['host']}"
+        series = self._totals['series'].setdefault(key, {"outcomes": {}})
+        series["outcomes"][record['status']] = series["outcomes"].get(record['status'], 0) + 1
+        series["bytes_total"] = series.get("bytes_total", 0) + record['transferred_bytes']
+        series["retries_total"] = series.get("retries_total", 0) + record['retries']
+        series["download_seconds_total"] = series.get("download_seconds_total", 0.0) + record['duration_seconds']
+        series["verify_seconds_total"] = series.get("verify_seconds_total", 0.0) + record['verify_seconds']
+        if record['status'] == "ok":
+            self._totals['last'][key] = {
+                "last_ttfb_seconds": record['ttfb_seconds'] or 0,
+                "last_throughput_bytes": record['mean_throughput'],
+                "last_p95_throughput_bytes": record['p95_throughput'],
+                "last_connection_min_throughput_bytes": record['connection_min_throughput'],
+                "last_connection_median_throughput_bytes": record['connection_median_throughput'],
+                "last_resumed_ratio": record['resumed_ratio'],
+                "last_connections": record['connections'],
+                "last_timestamp_seconds": record['timestamp'],
+            }
+
+    def _write_prometheus_locked(self):
+        lines = []
+        for name, help_text in _COUNTERS:
+            lines.append(f"# HELP hf_downloader_{name} {help_text}")
+            lines.append(f"# TYPE hf_downloader_{name} counter")
+            for key, series in sorted(self._totals['series'].items()):
+                engine, host = key.split("|", 1)
+                if name == "downloads_total":
+                    for status, count in sorted(series["outcomes"].items()):
+                        lines.append(f"hf_downloader_{name}{_labels(engine=engine, host=host, status=status)} {count}")
+                else:
+                    lines.append(f"hf_downloader_{name}{_labels(engine=engine, host=host)} {series.get(name, 0)}")
+        for name, help_text in _GAUGES:
+            lines.append(f"# HELP hf_downloader_{name} {help_text}")
+            lines.append(f"# TYPE hf_downloader_{name} gauge")
+            for key, last in sorted(self._totals['last'].items()):
+                engine, host = key.split("|", 1)
+                lines.append(f"hf_downloader_{name}{_labels(engine=engine, host=host)} {last.get(name, 0)}")
+
+        # Same-directory temp file + rename, as the textfile collector requires
+        temp_file = f"{self.prometheus_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_file, self.prometheus_file)
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter():
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = MetricsExporter(metrics_dir())
+        return _exporter
@@ -0,0 +1,227 @@
+"""
+Multi-source downloads from HuggingFace mirrors
+Rewrites huggingface.co resolve URLs onto configured mirrors, probes every
+source with a small Range request and ranks them by latency and throughput.
+Rankings are cached per host and decay with age so a slow mirror gets
+another chance later.
+
+Mirrors come from the node's `mirrors` input, HF_DOWNLOADER_MIRRORS
+(comma-separated base URLs) and HF_ENDPOINT.
+"""
+
+import os
+import re
+import time
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from .download_state import state_path, load_json, save_json_atomic
+from .http_pool import open_url
+
+LOG_PREFIX = "[HF Downloader]"
+
+RANKING_FILE = "mirror_ranking.json"
+HF_HOSTS = ("huggingface.co", "hf.co")
+# Bytes fetched per probe: enough to estimate throughput, small enough to be cheap
+PROBE_BYTES = 256 * 1024
+PROBE_TIMEOUT = 10
+# Re-probe a host once its last measurement is older than this (HF_DOWNLOADER_MIRROR_TTL, seconds)
+DEFAULT_PROBE_TTL = 30 * 60
+# Old measurements and failures lose half their weight every HALF_LIFE seconds
+HALF_LIFE = 6 * 60 * 60
+# Weight of the previous estimate when a fresh probe comes in
+SMOOTHING = 0.5
+
+_RESOLVE_RE = re.compile(r'^/(?:(?:datasets|spaces)/)?[^/]+/[^/]+/resolve/')
+
+
+def configured_mirrors(extra=""):
+    """
+    Mirror base URLs from the node input, HF_DOWNLOADER_MIRRORS and HF_ENDPOINT
+    """
+    mirrors = []
+    candidates = re.split(r'[,\s]+', extra or "") + re.split(r'[,\s]+', os.environ.get("HF_DOWNLOADER_MIRRORS", ""))
+    endpoint = os.environ.get("HF_ENDPOINT", "")
+    if endpoint:
+        candidates.append(endpoint)
+    for candidate in candidates:
+        candidate = candidate.strip().rstrip('/')
+        if not candidate or urllib.parse.urlsplit(candidate).hostname in HF_HOSTS:
+            continue
+        if candidate not in mirrors:
+            mirrors.append(candidate)
+    return mirrors
+
+
+def mirror_urls(url, mirrors):
+    """
+    The URL itself followed by its equivalent on each mirror.
+    Only huggingface.co /resolve/ URLs are rewritten.
+    """
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.hostname not in HF_HOSTS or not _RESOLVE_RE.match(parsed.path):
+        return [url]
+    urls = [url]
+    for mirror in mirrors:
+        base = urllib.parse.urlsplit(mirror)
+        rewritten = urllib.parse.urlunsplit((base.scheme, base.netloc, base.path.rstrip('/') + parsed.path,
+                                             parsed.query, ""))
+        if rewritten not in urls:
+            urls.append(rewritten)
+    return urls
+
+
+def source_host(url):
+    return urllib.parse.urlsplit(url).netloc
+
+
+def probe_ttl():
+    try:
+        return float(os.environ.get("HF_DOWNLOADER_MIRROR_TTL", DEFAULT_PROBE_TTL))
+    except ValueError:
+        return DEFAULT_PROBE_TTL
+
+
+def _decay(age):
+    return 0.5 ** (max(0.0, age) / HALF_LIFE)
+
+
+def probe_source(url, headers, probe_bytes=PROBE_BYTES, timeout=PROBE_TIMEOUT):
+    """
+    Fetch the first probe_bytes of url. Returns (latency seconds,
+    throughput bytes/s, total size or 0) or raises on failure.
+    """
+    probe_headers = dict(headers)
+    probe_headers['Range'] = f'bytes=0-{probe_bytes - 1}'
+    started = time.monotonic()
+    with open_url(url, probe_headers, timeout=timeout) as response:
+        latency = time.monotonic() - started
+        total = 0
+        if response.status == 206:
+            total_text = response.headers.get('Content-Range', '').rpartition('/')[2]
+            total = int(total_text) if total_text.isdigit() else 0
+        received = 0
+        body_started = time.monotonic()
+        while received < probe_bytes:
+            chunk = response.read(min(64 * 1024, probe_bytes - received))
+            if not chunk:
+                break
+            received += len(chunk)
+        elapsed = max(1e-6, time.monotonic() - body_started)
+    return latency, received / elapsed, total
+
+
+class MirrorRanking:
+    """
+    Per-host latency/throughput estimates and failure counts, persisted in
+    the state folder. New probes are blended into the previous estimate and
+    both estimates and failures fade with age.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _hosts_locked(self):
+        if self._data is None:
+            self._data = load_json(self.path, {})
+            self._data.setdefault('hosts', {})
+        return self._data['hosts']
+
+    def _save_locked(self):
+        try:
+            save_json_atomic(self.path, self._data)
+        except OSError as e:
+            print(f"{LOG_PREFIX} Warning: could not save mirror ranking: {e}")
+
+    def record(self, host, latency, throughput):
+        now = time.time()
+        with self._lock:
+            hosts = self._hosts_locked()
+            entry = hosts.get(host)
+            if entry and entry.get('throughput') is not None:
+                weight = SMOOTHING * _decay(now - entry['probed'])
+                latency = entry['latency'] * weight + latency * (1 - weight)
+                throughput = entry['throughput'] * weight + throughput * (1 - weight)
+            entry = hosts.setdefault(host, {})
+            entry.update(latency=latency, throughput=throughput, probed=now)
+            self._save_locked()
+
+    def record_failure(self, host):
+        now = time.time()
+        with self._lock:
+            hosts = self._hosts_locked()
+            entry = hosts.setdefault(host, {'latency': None, 'throughput': None, 'probed': 0})
+            entry['failures'] = entry.get('failures', 0) * _decay(now - entry.get('failed', now)) + 1
+            entry['failed'] = now
+            self._save_locked()
+
+    def needs_probe(self, host):
+        with self._lock:
+            entry = self._hosts_locked().get(host)
+        return not entry or entry.get('throughput') is None or time.time() - entry['probed'] > probe_ttl()
+
+    def score(self, host):
+        """
+        Higher is better: throughput discounted by latency and recent failures.
+        None for hosts that were never measured.
+        """
+        with self._lock:
+            entry = self._hosts_locked().get(host)
+        if not entry or entry.get('throughput') is None:
+            return None
+        failures = entry.get('failures', 0) * _decay(time.time() - entry.get('failed', 0))
+        return entry['throughput'] / (1.0 + entry['latency']) * 0.5 ** failures
+
+
+_ranking = None
+_ranking_lock = threading.Lock()
+
+
+def get_ranking():
+    global _ranking
+    with _ranking_lock:
+        if _ranking is None:
+            _ranking = MirrorRanking(state_path(RANKING_FILE))
+        return _ranking
+
+
+def rank_sources(urls, headers, log_prefix=LOG_PREFIX):
+    """
+    Order equivalent URLs best-first, probing hosts whose ranking is stale.
+    Sources that fail the probe or report a different size are dropped
+    (unless nothing else is left).
+    """
+    if len(urls) < 2:
+        return list(urls)
+    ranking = get_ranking()
+    sizes = {}
+
+    def probe(url):
+        host = source_host(url)
+        try:
+            latency, throughput, total = probe_source(url, headers)
+        except Exception as e:
+            print(f"{log_prefix} Mirror probe failed for {host}: {e}")
+            ranking.record_failure(host)
+            return url, False
+        ranking.record(host, latency, throughput)
+        sizes[url] = total
+        return url, True
+
+    stale = [url for url in urls if ranking.needs_probe(source_host(url))]
+    failed = set()
+    if stale:
+        with ThreadPoolExecutor(max_workers=len(stale), thread_name_prefix="hf-mirror-probe") as pool:
+            failed = {url for url, ok in pool.map(probe, stale) if not ok}
+
+    # A mirror serving a different size is out of date, never mix its bytes in
+    reference = sizes.get(urls[0]) or next((size for size in sizes.values() if size), 0)
+    usable = [url for url in urls if url not in failed
+              and not (reference and sizes.get(url) and sizes[url] != reference)]
+    if not usable:
+        return list(urls)
+    ranked = sorted(usable, key=lambda url: ranking.score(source_host(url)) or 0.0, reverse=True)
+    print(f"{log_prefix} Sources by speed: {', '.join(source_host(url) for url in ranked)}")
+    return ranked
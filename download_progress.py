@@ -0,0 +1,225 @@
+"""
+Live download progress: parses aria2c's console readout into structured
+progress and reports it to ComfyUI's progress bar and the console log
+"""
+
+import re
+import time
+import threading
+from collections import namedtuple
+
+Progress = namedtuple("Progress", ["completed", "total", "speed", "connections", "eta"])
+
+# [#2089b0 400.0KiB/33.2MiB(1%) CN:1 DL:115.7KiB ETA:4m51s]
+_READOUT_RE = re.compile(
+    r'\[#\w+\s+(?P<done>[\d.]+)(?P<done_unit>[KMGT]?i?B)'
+    r'(?:/(?P<total>[\d.]+)(?P<total_unit>[KMGT]?i?B))?'
+    r'(?:\(\d+%\))?'
+    r'(?:\s+CN:(?P<cn>\d+))?'
+    r'(?:\s+(?:SD:\d+\s+)?DL:(?P<speed>[\d.]+)(?P<speed_unit>[KMGT]?i?B))?'
+    r'(?:\s+ETA:(?P<eta>[\dhms]+))?'
+)
+# One [#gid ...] block of a readout
+_BLOCK_RE = re.compile(r'\[#(\w+)\s[^\]]*\]')
+# Notices aria2c prints when a connection is retried
+_RETRY_RE = re.compile(r'Restarting the download|Retrying')
+_UNITS = {"B": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3, "TiB": 1024 ** 4}
+
+
+def _to_bytes(value, unit):
+    if value is None:
+        return 0
+    return int(float(value) * _UNITS.get(unit, 1))
+
+
+def _eta_seconds(eta):
+    if not eta:
+        return None
+    seconds = 0
+    for amount, unit in re.findall(r'(\d+)([hms])', eta):
+        seconds += int(amount) * {"h": 3600, "m": 60, "s": 1}[unit]
+    return seconds
+
+
+def parse_readout(line):
+    """
+    Parse one aria2c console readout line. Returns Progress or None.
+    """
+    match = _READOUT_RE.search(line)
+    if not match:
+        return None
+    return Progress(
+        completed=_to_bytes(match.group('done'), match.group('done_unit')),
+        total=_to_bytes(match.group('total'), match.group('total_unit')),
+        speed=_to_bytes(match.group('speed'), match.group('speed_unit')),
+        connections=int(match.group('cn') or 0),
+        eta=_eta_seconds(match.group('eta')),
+    )
+
+
+def parse_readouts(line):
+    """
+    {GID: Progress} for every download in an aria2c readout or summary line
+    (batch downloads show one [#gid ...] block per active file)
+    """
+    readouts = {}
+    for match in _BLOCK_RE.finditer(line):
+        progress = parse_readout(match.group(0))
+        if progress:
+            readouts[match.group(1)] = progress
+    return readouts
+
+
+def is_retry_line(line):
+    """
+    True for aria2c log lines announcing a retried connection
+    """
+    return bool(_RETRY_RE.search(line))
+
+
+def progress_from_rpc_status(status):
+    """
+    Progress from an aria2.tellStatus result
+    """
+    completed = int(status.get('completedLength', 0) or 0)
+    total = int(status.get('totalLength', 0) or 0)
+    speed = int(status.get('downloadSpeed', 0) or 0)
+    eta = (total - completed) // speed if speed and total else None
+    return Progress(completed, total, speed, int(status.get('connections', 0) or 0), eta)
+
+
+def iter_lines(stream, chunk_size=4096):
+    """
+    Yield text lines from a binary stream, splitting on \\r as well as \\n
+    (aria2c redraws its readout with carriage returns). Holds at most one
+    partial line in memory.
+    """
+    pending = b""
+    while True:
+        chunk = stream.read1(chunk_size) if hasattr(stream, 'read1') else stream.read(chunk_size)
+        if not chunk:
+            break
+        pending += chunk
+        parts = re.split(rb'[\r\n]', pending)
+        pending = parts.pop()
+        for part in parts:
+            if part.strip():
+                yield part.decode('utf-8', errors='replace')
+    if pending.strip():
+        yield pending.decode('utf-8', errors='replace')
+
+
+class ProgressTarget:
+    """
+    The node waiting on a download manager job, if any. A job's progress
+    bar is only driven while a node waits on it: a bar made for a
+    prefetch or a resumed download would report against whichever node
+    ComfyUI happens to be executing.
+    """
+
+    def __init__(self):
+        self.waiting = False
+        self.node_id = None
+
+
+_thread_target = threading.local()
+
+
+def bind_progress_target(target):
+    """
+    Make target the ProgressTarget of reporters created on this thread
+    """
+    _thread_target.value = target
+
+
+def current_progress_target():
+    return getattr(_thread_target, 'value', None)
+
+
+def _progress_bar(total, node_id):
+    import comfy.utils
+    if node_id is None:
+        return comfy.utils.ProgressBar(total)
+    try:
+        return comfy.utils.ProgressBar(total, node_id=node_id)
+    except TypeError:
+        # ComfyUI before per-node progress bars
+        return comfy.utils.ProgressBar(total)
+
+
+def _format_size(value):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TiB"
+
+
+def _format_eta(seconds):
+    if seconds is None:
+        return "?"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class ProgressReporter:
+    """
+    Forwards progress to ComfyUI's progress bar (while a node waits on the
+    download, see ProgressTarget) and prints a log line at a fixed interval,
+    plus a warning when the transfer stalls. Updates are also fed to an
+    optional DownloadMetrics collector.
+    """
+
+    def __init__(self, log_prefix, log_interval=5.0, stall_after=30.0, metrics=None):
+        self.log_prefix = log_prefix
+        self.metrics = metrics
+        self.log_interval = log_interval
+        self.stall_after = stall_after
+        self.last = None
+        self._last_log = 0.0
+        self._last_advance = time.monotonic()
+        self._stall_warned = False
+        self._bar = None
+        self._bar_key = None
+        self.target = current_progress_target()
+
+    def _update_bar(self, progress):
+        target = self.target
+        # Outside the download manager, or nobody waiting yet: console only
+        if not progress.total or target is None or not target.waiting:
+            return
+        try:
+            if self._bar is None or self._bar_key != (progress.total, target.node_id):
+                self._bar = _progress_bar(progress.total, target.node_id)
+                self._bar_key = (progress.total, target.node_id)
+            self._bar.update_absolute(progress.completed, progress.total)
+        except Exception:
+            # Outside ComfyUI (or no node executing) the console log is enough
+            self._bar = None
+
+    def update(self, progress):
+        now = time.monotonic()
+        if self.last is None or progress.completed > self.last.completed:
+            self._last_advance = now
+            self._stall_warned = False
+        self.last = progress
+        self._update_bar(progress)
+        if self.metrics:
+            self.metrics.observe(progress)
+
+        stalled_for = now - self._last_advance
+        if stalled_for >= self.stall_after and not self._stall_warned:
+            self._stall_warned = True
+            print(f"{self.log_prefix} ⚠ No progress for {int(stalled_for)}s "
+                  f"({_format_size(progress.completed)} done, {progress.connections} connections)")
+
+        if now - self._last_log >= self.log_interval:
+            self._last_log = now
+            self.log(progress)
+
+    def log(self, progress):
+        percent = f"{progress.completed / progress.total * 100:.1f}%" if progress.total else "?%"
+        total = _format_size(progress.total) if progress.total else "?"
+        print(f"{self.log_prefix} Progress: {percent} ({_format_size(progress.completed)} / {total}) "
+              f"{_format_size(progress.speed)}/s, CN:{progress.connections}, ETA {_format_eta(progress.eta)}")
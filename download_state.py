@@ -0,0 +1,41 @@
+"""
+Location and helpers for small persistent state files (indexes, caches, journals)
+Defaults to a .state folder inside this node; override with HF_DOWNLOADER_STATE_DIR
+"""
+
+import os
+import json
+import threading
+
+
+def state_dir():
+    directory = os.environ.get("HF_DOWNLOADER_STATE_DIR") or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), ".state"
+    )
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def state_path(name):
+    return os.path.join(state_dir(), name)
+
+
+def load_json(path, default):
+    """
+    Read a JSON state file, returning default when it is missing or corrupt
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json_atomic(path, data):
+    """
+    Write a JSON state file via a temp file + rename so readers never see a torn file
+    """
+    temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(temp_file, path)
@@ -0,0 +1,168 @@
+"""
+SHA-256 verification helpers for HuggingFace downloads
+Expected digests come from HF's LFS metadata (X-Linked-ETag on the resolve redirect)
+"""
+
+import os
+import re
+import hashlib
+import threading
+import http.client
+import urllib.error
+from .http_pool import open_url
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+# (path, size, mtime_ns) -> sha256 hex, so a file is only ever hashed once per process
+_digest_cache = {}
+_digest_cache_lock = threading.Lock()
+
+
+class ChecksumMismatch(Exception):
+    """
+    Raised when a downloaded file does not match its expected SHA-256
+    """
+    # Not resumed automatically after a restart (see download_journal.py)
+    permanent = True
+
+
+def _normalize_etag(value):
+    value = (value or '').strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    return value.strip('"').lower()
+
+
+def expected_sha256_from_headers(headers):
+    """
+    Return the LFS SHA-256 advertised in HF response headers, or None.
+    Regular git files carry a SHA-1 ETag, which is ignored.
+    """
+    for name in ('X-Linked-ETag', 'ETag'):
+        value = _normalize_etag(headers.get(name))
+        if SHA256_RE.match(value):
+            return value
+    return None
+
+
+def _metadata_from_headers(headers, redirected):
+    size = headers.get('X-Linked-Size')
+    if not size and not redirected:
+        size = headers.get('Content-Length')
+    return {
+        'sha256': expected_sha256_from_headers(headers),
+        'etag': _normalize_etag(headers.get('X-Linked-ETag') or headers.get('ETag')),
+        'size': int(size) if size and size.isdigit() else 0,
+    }
+
+
+def fetch_remote_metadata(url, headers, timeout=30):
+    """
+    HEAD the resolve URL without following the CDN redirect, since HF only
+    sends X-Linked-ETag / X-Linked-Size on the redirect response itself.
+    Returns a dict with sha256 (or None), etag and size (0 when unknown),
+    or None when the request fails.
+    """
+    try:
+        with open_url(url, headers, method='HEAD', timeout=timeout, follow_redirects=False) as response:
+            return _metadata_from_headers(response.headers, redirected=300 <= response.status < 400)
+    except urllib.error.HTTPError:
+        return None
+    except (urllib.error.URLError, OSError, http.client.HTTPException, ValueError):
+        return None
+
+
+def fetch_expected_sha256(url, headers, timeout=30):
+    """
+    Expected SHA-256 of an HF file, or None when the server does not
+    advertise one
+    """
+    metadata = fetch_remote_metadata(url, headers, timeout=timeout)
+    return metadata['sha256'] if metadata else None
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def remember_digest(path, digest):
+    """
+    Record the digest of a file that was hashed while it was being written
+    """
+    with _digest_cache_lock:
+        _digest_cache[_file_key(path)] = digest
+
+
+def cached_digest(path):
+    with _digest_cache_lock:
+        return _digest_cache.get(_file_key(path))
+
+
+def sha256_file(path):
+    """
+    SHA-256 of a file, reusing an earlier result when the file is unchanged
+    """
+    digest = cached_digest(path)
+    if digest:
+        return digest
+
+    hasher = PrefixHasher(path)
+    hasher.advance(os.path.getsize(path))
+    digest = hasher.hexdigest()
+    remember_digest(path, digest)
+    return digest
+
+
+class PrefixHasher:
+    """
+    Incrementally hashes the contiguous prefix of a file that is being
+    written out of order. Each byte is read back once, straight after it was
+    written, while it is still in the page cache - there is no second pass
+    over the finished file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self._sha = hashlib.sha256()
+        self._buffer = None
+
+    def update(self, data):
+        """
+        Hash bytes that are written sequentially (single stream downloads)
+        """
+        self._sha.update(data)
+        self.offset += len(data)
+
+    def advance(self, end):
+        """
+        Hash the file from the current offset up to (not including) end
+        """
+        if end <= self.offset:
+            return
+        if self._buffer is None:
+            self._buffer = bytearray(HASH_BLOCK_SIZE)
+        view = memoryview(self._buffer)
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            while self.offset < end:
+                n = f.readinto(view[:min(HASH_BLOCK_SIZE, end - self.offset)])
+                if not n:
+                    raise OSError(f"Unexpected end of file while hashing {self.path}")
+                self._sha.update(view[:n])
+                self.offset += n
+
+    def hexdigest(self):
+        return self._sha.hexdigest()
+
+
+def check_digest(path, actual, expected):
+    """
+    Raise ChecksumMismatch if actual differs from expected (when known)
+    """
+    if expected and actual != expected:
+        raise ChecksumMismatch(
+            f"SHA-256 mismatch for {os.path.basename(path)}: expected {expected}, got {actual}"
+        )
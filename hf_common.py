@@ -0,0 +1,133 @@
+"""
+Helpers shared by the downloader nodes: token lookup, output path and
+filename resolution, URL checks and user-facing error messages
+"""
+
+import os
+import re
+import urllib.error
+
+# HTTP statuses a retry won't fix
+PERMANENT_HTTP_CODES = (401, 403, 404, 410)
+# Single-file downloader nodes: prefetched with a queued prompt, resumed from the journal
+DOWNLOADER_NODES = ("Aria2cHuggingFaceDownloader", "HuggingFaceDownloaderFallback", "HuggingFaceDownloaderAuto")
+
+SAVE_PATHS = ["models/checkpoints", "models/loras", "models/vae", "models/upscale_models", "models/clip",
+              "models/controlnet", "custom"]
+
+
+def get_hf_token(hf_token_override=""):
+    """
+    HuggingFace token: the node's override, else HF_TOKEN / HUGGING_FACE_HUB_TOKEN
+    """
+    if hf_token_override and hf_token_override.strip():
+        return hf_token_override.strip()
+    return os.environ.get("HF_TOKEN") or os.environ.get("HUGGING_FACE_HUB_TOKEN")
+
+
+def auth_headers(token):
+    return {'Authorization': f'Bearer {token}'} if token else {}
+
+
+def check_url(url, log_prefix):
+    """
+    Stripped URL; raises on an empty one and warns about non-HuggingFace hosts
+    """
+    if not url or not url.strip():
+        raise ValueError("URL cannot be empty")
+    url = url.strip()
+    if not ('huggingface.co' in url or 'hf.co' in url):
+        print(f"{log_prefix} Warning: URL doesn't appear to be from HuggingFace: {url}")
+    return url
+
+
+def parse_filename_from_url(url):
+    """
+    Extract filename from HuggingFace URL
+    """
+    # HF URLs typically end with the filename after /resolve/main/ or /blob/main/
+    match = re.search(r'/(?:resolve|blob)/[^/]+/(.+?)(?:\?|$)', url)
+    if match:
+        return match.group(1).split('/')[-1]
+
+    # Fallback to last part of URL
+    return url.split('/')[-1].split('?')[0]
+
+
+def resolve_save_dir(save_path, custom_path):
+    """
+    Absolute folder for a node's save_path / custom_path inputs (created if missing)
+    """
+    if save_path == "custom":
+        if not custom_path or not custom_path.strip():
+            raise ValueError("Custom path must be specified when save_path is 'custom'")
+        directory = os.path.abspath(custom_path.strip())
+    else:
+        # Imported here so custom paths (and the checks in benchmarks/) work outside ComfyUI
+        import folder_paths
+        directory = os.path.abspath(os.path.join(folder_paths.base_path, save_path))
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def resolve_output_path(save_path, custom_path, filename, url):
+    """
+    Full save path for a downloaded file with path traversal protection
+    """
+    directory = resolve_save_dir(save_path, custom_path)
+    if not filename or not filename.strip():
+        filename = parse_filename_from_url(url)
+
+    # Security: Strip any path components from filename to prevent directory traversal
+    filename = os.path.basename(filename.strip())
+    if not filename or filename in ['.', '..']:
+        raise ValueError(f"Invalid filename: {filename}")
+    return os.path.join(directory, filename)
+
+
+def error_message(error):
+    """
+    What to tell the user about a failed download
+    """
+    if isinstance(error, urllib.error.HTTPError):
+        if error.code == 401:
+            return "401 Unauthorized - Model may be private or gated. Enable 'use_hf_token' and provide a valid HuggingFace token."
+        if error.code == 403:
+            return "403 Forbidden - Model may be gated. Enable 'use_hf_token' and provide a valid HuggingFace token."
+        if error.code == 404:
+            return "404 Not Found - Check the URL is correct."
+        return f"HTTP Error {error.code}: {error.reason}"
+    return f"Download failed: {error}"
+
+
+def is_permanent_error(error):
+    """
+    True when retrying the download can't help (authorization, missing file,
+    checksum mismatch); network errors, timeouts and server errors are
+    transient. Follows wrapped exceptions.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        permanent = getattr(error, 'permanent', None)
+        if permanent is not None:
+            return bool(permanent)
+        if isinstance(error, urllib.error.HTTPError):
+            return error.code in PERMANENT_HTTP_CODES
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def downloader_nodes():
+    """
+    {class_type: node class} of the single-file downloader nodes (DOWNLOADER_NODES)
+    """
+    # Imported here: the node modules import this one
+    from .aria2c_hf_downloader import Aria2cHuggingFaceDownloader
+    from .hf_downloader_fallback import HuggingFaceDownloaderFallback
+    from .hf_downloader_auto import HuggingFaceDownloaderAuto
+    return {
+        "Aria2cHuggingFaceDownloader": Aria2cHuggingFaceDownloader,
+        "HuggingFaceDownloaderFallback": HuggingFaceDownloaderFallback,
+        "HuggingFaceDownloaderAuto": HuggingFaceDownloaderAuto,
+    }
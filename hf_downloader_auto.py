@@ -0,0 +1,143 @@
+"""
+Auto-selecting HuggingFace Downloader for ComfyUI
+Uses the fastest download engine available in this environment: aria2c
+when it is installed, the pure Python engine otherwise, then whichever
+has measured faster for the host (see download_engines.py)
+"""
+
+from .hf_common import SAVE_PATHS, check_url, resolve_output_path
+from .download_manager import get_manager, download_key
+from .download_journal import journaled
+from .download_engines import ENGINES, select_engine, run_download
+
+class HuggingFaceDownloaderAuto:
+    """
+    Downloads files from HuggingFace with the engine that works best here.
+    Falls back to pure Python when aria2c is missing, so it also runs on ComfyUI-Desktop.
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "url": ("STRING", {
+                    "multiline": False,
+                    "default": "https://huggingface.co/username/repo/resolve/main/model.safetensors",
+                    "placeholder": "Enter HuggingFace file URL"
+                }),
+                "save_path": (SAVE_PATHS, {
+                    "default": "models/checkpoints"
+                }),
+                "custom_path": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Custom path (if save_path is 'custom')"
+                }),
+                "filename": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Leave empty to use original filename"
+                }),
+                "use_hf_token": ("BOOLEAN", {
+                    "default": True
+                }),
+            },
+            "optional": {
+                "engine": (["auto"] + list(ENGINES), {
+                    "default": "auto"
+                }),
+                "hf_token_override": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Override token from settings"
+                }),
+                "connections": ("INT", {
+                    "default": 8,
+                    "min": 1,
+                    "max": 16,
+                    "step": 1,
+                    "display": "number"
+                }),
+                "verify_sha256": ("BOOLEAN", {
+                    "default": True
+                }),
+                "force_refresh": ("BOOLEAN", {
+                    "default": False
+                }),
+                "mirrors": ("STRING", {
+                    "multiline": True,
+                    "default": "",
+                    "placeholder": "Mirror base URLs, one per line (optional, also HF_DOWNLOADER_MIRRORS)"
+                }),
+                "shared_cache_dir": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Shared model cache folder (optional, also HF_DOWNLOADER_SHARED_CACHE)"
+                }),
+                "auto_connections": ("BOOLEAN", {
+                    "default": False
+                }),
+                "delta_update": ("BOOLEAN", {
+                    "default": False
+                }),
+                "delta_manifest_url": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Chunk manifest URL (optional, default: <url>.cdc.json)"
+                }),
+            }
+        }
+
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("file_path",)
+    FUNCTION = "download"
+    CATEGORY = "loaders"
+    OUTPUT_NODE = True
+
+    def download(self, url, save_path, custom_path, filename, use_hf_token, engine="auto", hf_token_override="", connections=8, verify_sha256=True, force_refresh=False, mirrors="", shared_cache_dir="", auto_connections=False, delta_update=False, delta_manifest_url=""):
+        """
+        Download file from HuggingFace with the chosen (or fastest available) engine
+        """
+        # Run in the background download manager; identical requests from
+        # other nodes or prompts share this transfer instead of racing on the file
+        return get_manager().run(*self._plan(
+            url, save_path, custom_path, filename, use_hf_token, engine, hf_token_override, connections,
+            verify_sha256, force_refresh, mirrors, shared_cache_dir, auto_connections, delta_update,
+            delta_manifest_url
+        ))
+
+    def prefetch(self, **inputs):
+        """
+        Start this node's download in the background with the node's inputs
+        (called when a prompt is queued, see prompt_prefetch.py)
+        """
+        return get_manager().prefetch(*self._plan(**inputs))
+
+    def _plan(self, url, save_path, custom_path, filename, use_hf_token, engine="auto", hf_token_override="", connections=8, verify_sha256=True, force_refresh=False, mirrors="", shared_cache_dir="", auto_connections=False, delta_update=False, delta_manifest_url=""):
+        """
+        Validate the inputs and return the download manager job: (key, function, *args)
+        """
+        url = check_url(url, "[HF Downloader]")
+        output_file = resolve_output_path(save_path, custom_path, filename, url)
+
+        # Journaled so a restart mid-download resumes it (see download_journal.py)
+        return journaled(download_key(url, output_file), self._download_to, url, output_file, engine,
+                         use_hf_token, hf_token_override, connections, verify_sha256, force_refresh, mirrors,
+                         shared_cache_dir, auto_connections, delta_update, delta_manifest_url, engine=engine)
+
+    def _download_to(self, url, output_file, engine, use_hf_token, hf_token_override, connections, verify_sha256, force_refresh, mirrors="", shared_cache_dir="", auto_connections=False, delta_update=False, delta_manifest_url=""):
+        """
+        Pick the engine and download url to output_file (runs on a download manager thread)
+        """
+        # Chosen when the transfer starts, so it uses the latest measurements
+        return run_download(select_engine(url, engine), url, output_file, connections, use_hf_token,
+                            hf_token_override, verify_sha256, force_refresh, mirrors, shared_cache_dir,
+                            auto_connections, delta_update, delta_manifest_url)
+
+NODE_CLASS_MAPPINGS = {
+    "HuggingFaceDownloaderAuto": HuggingFaceDownloaderAuto
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "HuggingFaceDownloaderAuto": "HF Downloader (Auto)"
+}
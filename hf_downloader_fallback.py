@@ -3,11 +3,10 @@ Fallback HuggingFace Downloader for ComfyUI-Desktop (No aria2c required)
 Pure Python implementation that doesn't require subprocess calls
 """
 
-import os
-import urllib.request
-import urllib.error
-import folder_paths
-from tqdm import tqdm
+from .hf_common import SAVE_PATHS, check_url, resolve_output_path
+from .download_manager import get_manager, download_key
+from .download_journal import journaled
+from .download_engines import PythonEngine, run_download
 
 class HuggingFaceDownloaderFallback:
     """
@@ -24,7 +23,7 @@ class HuggingFaceDownloaderFallback:
                     "default": "https://huggingface.co/username/repo/resolve/main/model.safetensors",
                     "placeholder": "Enter HuggingFace file URL"
                 }),
-                "save_path": (["models/checkpoints", "models/loras", "models/vae", "models/upscale_models", "models/clip", "models/controlnet", "custom"], {
+                "save_path": (SAVE_PATHS, {
                     "default": "models/checkpoints"
                 }),
                 "custom_path": ("STRING", {
@@ -47,6 +46,40 @@ class HuggingFaceDownloaderFallback:
                     "default": "",
                     "placeholder": "Override token from settings"
                 }),
+                "connections": ("INT", {
+                    "default": 8,
+                    "min": 1,
+                    "max": 16,
+                    "step": 1,
+                    "display": "number"
+                }),
+                "verify_sha256": ("BOOLEAN", {
+                    "default": True
+                }),
+                "force_refresh": ("BOOLEAN", {
+                    "default": False
+                }),
+                "mirrors": ("STRING", {
+                    "multiline": True,
+                    "default": "",
+                    "placeholder": "Mirror base URLs, one per line (optional, also HF_DOWNLOADER_MIRRORS)"
+                }),
+                "shared_cache_dir": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Shared model cache folder (optional, also HF_DOWNLOADER_SHARED_CACHE)"
+                }),
+                "auto_connections": ("BOOLEAN", {
+                    "default": False
+                }),
+                "delta_update": ("BOOLEAN", {
+                    "default": False
+                }),
+                "delta_manifest_url": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Chunk manifest URL (optional, default: <url>.cdc.json)"
+                }),
             }
         }
     
@@ -56,100 +89,47 @@ class HuggingFaceDownloaderFallback:
     CATEGORY = "loaders"
     OUTPUT_NODE = True
     
-    def download(self, url, save_path, custom_path, filename, use_hf_token, hf_token_override=""):
+    def download(self, url, save_path, custom_path, filename, use_hf_token, hf_token_override="", connections=8, verify_sha256=True, force_refresh=False, mirrors="", shared_cache_dir="", auto_connections=False, delta_update=False, delta_manifest_url=""):
         """
-        Download file from HuggingFace using pure Python urllib
+        Download file from HuggingFace using pure Python urllib.
+        Uses parallel Range requests when the server supports them and
+        verifies the SHA-256 against HF's LFS metadata while downloading.
         """
-        try:
-            # Determine save directory
-            if save_path == "custom":
-                if not custom_path:
-                    raise ValueError("Custom path is required when save_path is 'custom'")
-                save_dir = custom_path
-            else:
-                # Get ComfyUI base directory
-                base_dir = folder_paths.base_path
-                save_dir = os.path.join(base_dir, save_path)
-            
-            # Create directory if it doesn't exist
-            os.makedirs(save_dir, exist_ok=True)
-            
-            # Determine filename
-            if not filename:
-                # Extract filename from URL
-                filename = url.split('/')[-1].split('?')[0]
-                if not filename:
-                    filename = "downloaded_file"
-            
-            # Full output path
-            output_file = os.path.join(save_dir, filename)
-            
-            print(f"[HF Downloader] Downloading: {url}")
-            print(f"[HF Downloader] Saving to: {output_file}")
-            
-            # Prepare headers
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            
-            # Add HuggingFace token if needed
-            if use_hf_token:
-                token = hf_token_override if hf_token_override else os.environ.get("HF_TOKEN", "")
-                if token:
-                    headers['Authorization'] = f'Bearer {token}'
-                    print("[HF Downloader] Using HuggingFace token")
-                else:
-                    print("[HF Downloader] Warning: HF token requested but not found")
-            
-            # Create request
-            req = urllib.request.Request(url, headers=headers)
-            
-            # Download with progress
-            with urllib.request.urlopen(req) as response:
-                total_size = int(response.headers.get('content-length', 0))
-                
-                with open(output_file, 'wb') as f:
-                    if total_size:
-                        # Download with progress bar
-                        downloaded = 0
-                        chunk_size = 8192
-                        
-                        print(f"[HF Downloader] File size: {total_size / (1024*1024):.2f} MB")
-                        
-                        while True:
-                            chunk = response.read(chunk_size)
-                            if not chunk:
-                                break
-                            
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            
-                            # Print progress every 10MB
-                            if downloaded % (10 * 1024 * 1024) < chunk_size:
-                                progress = (downloaded / total_size) * 100
-                                print(f"[HF Downloader] Progress: {progress:.1f}% ({downloaded / (1024*1024):.1f} MB / {total_size / (1024*1024):.1f} MB)")
-                    else:
-                        # Download without progress
-                        f.write(response.read())
-            
-            print(f"[HF Downloader] ✓ Download complete: {output_file}")
-            return (output_file,)
-            
-        except urllib.error.HTTPError as e:
-            if e.code == 403:
-                error_msg = "403 Forbidden - Model may be gated. Enable 'use_hf_token' and provide a valid HuggingFace token."
-            elif e.code == 404:
-                error_msg = "404 Not Found - Check the URL is correct."
-            else:
-                error_msg = f"HTTP Error {e.code}: {e.reason}"
-            
-            print(f"[HF Downloader] ✗ Error: {error_msg}")
-            raise Exception(error_msg)
-            
-        except Exception as e:
-            error_msg = f"Download failed: {str(e)}"
-            print(f"[HF Downloader] ✗ {error_msg}")
-            raise Exception(error_msg)
+        # Run in the background download manager; identical requests from
+        # other nodes or prompts share this transfer instead of racing on the file.
+        # Waiting happens outside the error handling so ComfyUI interrupts pass through
+        return get_manager().run(*self._plan(
+            url, save_path, custom_path, filename, use_hf_token, hf_token_override, connections,
+            verify_sha256, force_refresh, mirrors, shared_cache_dir, auto_connections, delta_update,
+            delta_manifest_url
+        ))
+    
+    def prefetch(self, **inputs):
+        """
+        Start this node's download in the background with the node's inputs
+        (called when a prompt is queued, see prompt_prefetch.py)
+        """
+        return get_manager().prefetch(*self._plan(**inputs))
+    
+    def _plan(self, url, save_path, custom_path, filename, use_hf_token, hf_token_override="", connections=8, verify_sha256=True, force_refresh=False, mirrors="", shared_cache_dir="", auto_connections=False, delta_update=False, delta_manifest_url=""):
+        """
+        Validate the inputs and return the download manager job: (key, function, *args)
+        """
+        url = check_url(url, "[HF Downloader]")
+        output_file = resolve_output_path(save_path, custom_path, filename, url)
+        
+        # Journaled so a restart mid-download resumes it (see download_journal.py)
+        return journaled(download_key(url, output_file), self._download_to, url, output_file,
+                         use_hf_token, hf_token_override, connections, verify_sha256, force_refresh, mirrors,
+                         shared_cache_dir, auto_connections, delta_update, delta_manifest_url, engine="python")
+    
+    def _download_to(self, url, output_file, use_hf_token, hf_token_override, connections, verify_sha256, force_refresh, mirrors="", shared_cache_dir="", auto_connections=False, delta_update=False, delta_manifest_url=""):
+        """
+        Download url to output_file (runs on a download manager thread)
+        """
+        return run_download(PythonEngine(), url, output_file, connections, use_hf_token, hf_token_override,
+                            verify_sha256, force_refresh, mirrors, shared_cache_dir, auto_connections, delta_update,
+                            delta_manifest_url)
 
 NODE_CLASS_MAPPINGS = {
     "HuggingFaceDownloaderFallback": HuggingFaceDownloaderFallback
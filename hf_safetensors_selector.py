@@ -0,0 +1,523 @@
+"""
+Selective safetensors download for ComfyUI
+Reads only the safetensors header of a remote file with a Range request,
+then fetches just the tensors whose names match a filter (adjacent tensors
+are merged into few requests) and writes them as a smaller, valid
+safetensors file. The inspect node returns the header without downloading.
+"""
+
+import os
+import json
+import math
+import time
+import fnmatch
+import struct
+import threading
+import http.client
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from .hf_common import get_hf_token, auth_headers, resolve_save_dir
+from .download_manager import get_manager, download_key
+from .download_cache import get_index
+from .download_metrics import DownloadMetrics
+from .download_progress import Progress, ProgressReporter
+from .download_files import part_path, preallocate, publish_file, discard
+from .bandwidth import current_slot
+from .http_pool import open_url
+from .hf_snapshot_downloader import _split_patterns
+
+LOG_PREFIX = "[HF Safetensors]"
+
+# First request: most headers fit, so inspecting usually takes one round trip
+HEADER_PROBE_BYTES = 256 * 1024
+# The safetensors format caps the header at 100 MB
+MAX_HEADER_BYTES = 100 * 1000 * 1000
+# Unselected bytes between two wanted tensors smaller than this are fetched
+# and dropped rather than paying for another request
+MERGE_GAP = 1024 * 1024
+# Merged ranges are cut into pieces of this size range so connections share the work
+MIN_PIECE_SIZE = 1024 * 1024
+MAX_PIECE_SIZE = 64 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+MAX_TRIES = 5
+RETRY_WAIT = 3
+
+DTYPE_SIZES = {
+    "BOOL": 1, "U8": 1, "I8": 1, "F8_E4M3": 1, "F8_E5M2": 1,
+    "U16": 2, "I16": 2, "F16": 2, "BF16": 2,
+    "U32": 4, "I32": 4, "F32": 4,
+    "U64": 8, "I64": 8, "F64": 8,
+}
+
+
+class RemoteHeader:
+    """
+    Parsed header of a remote safetensors file. Tensor offsets are absolute
+    positions in the remote file.
+    """
+
+    def __init__(self, url, size, header_length, header):
+        self.url = url
+        self.size = size
+        self.data_start = 8 + header_length
+        self.metadata = header.get("__metadata__") or {}
+        self.tensors = {}
+        for name, info in header.items():
+            if name == "__metadata__":
+                continue
+            begin, end = info["data_offsets"]
+            if not 0 <= begin <= end or self.data_start + end > size:
+                raise Exception(f"Invalid safetensors header: {name} lies outside the file")
+            item_size = DTYPE_SIZES.get(info["dtype"])
+            if item_size and math.prod(info["shape"]) * item_size != end - begin:
+                raise Exception(f"Invalid safetensors header: {name} has the wrong byte length for its shape")
+            self.tensors[name] = dict(info, start=self.data_start + begin, end=self.data_start + end)
+
+    def select(self, include="*", exclude=""):
+        """
+        Names of tensors matching any include glob and no exclude glob, in file order
+        """
+        include_patterns = _split_patterns(include) or ["*"]
+        exclude_patterns = _split_patterns(exclude)
+        names = [
+            name for name in self.tensors
+            if any(fnmatch.fnmatch(name, p) for p in include_patterns)
+            and not any(fnmatch.fnmatch(name, p) for p in exclude_patterns)
+        ]
+        return sorted(names, key=lambda name: self.tensors[name]["start"])
+
+    def summary(self, names=None):
+        names = list(self.tensors) if names is None else names
+        return {
+            "url": self.url,
+            "size": self.size,
+            "metadata": self.metadata,
+            "tensor_count": len(names),
+            "tensor_bytes": sum(self.tensors[n]["end"] - self.tensors[n]["start"] for n in names),
+            "tensors": {
+                n: {"dtype": self.tensors[n]["dtype"], "shape": self.tensors[n]["shape"]} for n in names
+            },
+        }
+
+
+def _range_request(url, headers, start, end, timeout=60):
+    """
+    Open a Range request for bytes start..end (inclusive). Returns (response, total size).
+    """
+    range_headers = dict(headers)
+    range_headers['Range'] = f'bytes={start}-{end}'
+    response = open_url(url, range_headers, timeout=timeout)
+    if response.status != 206:
+        response.close()
+        raise Exception("Server ignored the Range request; selective download needs Range support")
+    total_text = response.headers.get('Content-Range', '').rpartition('/')[2]
+    return response, int(total_text) if total_text.isdigit() else 0
+
+
+def _read_range(url, headers, start, end, timeout=60):
+    """
+    Bytes start..end (inclusive) and the total file size, retried on dropped connections
+    """
+    for attempt in range(1, MAX_TRIES + 1):
+        try:
+            response, size = _range_request(url, headers, start, end, timeout)
+            with response:
+                return response.read(), size
+        except urllib.error.HTTPError:
+            raise
+        except (urllib.error.URLError, OSError, http.client.HTTPException) as e:
+            if attempt == MAX_TRIES:
+                raise
+            print(f"{LOG_PREFIX} Retrying header read ({attempt}/{MAX_TRIES}): {e}")
+            time.sleep(RETRY_WAIT)
+
+
+def fetch_header(url, headers, timeout=60):
+    """
+    Read and parse the safetensors header of a remote file (one or two Range requests)
+    """
+    data, size = _read_range(url, headers, 0, HEADER_PROBE_BYTES - 1, timeout)
+    if len(data) < 8:
+        raise Exception("Not a safetensors file: response too short")
+    (header_length,) = struct.unpack('<Q', data[:8])
+    if header_length > MAX_HEADER_BYTES:
+        raise Exception(f"Not a safetensors file: header length {header_length} is too large")
+    if len(data) < 8 + header_length:
+        data += _read_range(url, headers, len(data), 8 + header_length - 1, timeout)[0]
+    try:
+        header = json.loads(data[8:8 + header_length].decode('utf-8'))
+    except ValueError as e:
+        raise Exception(f"Not a safetensors file: invalid header ({e})")
+    return RemoteHeader(url, size or len(data), header_length, header)
+
+
+def build_header(remote, names):
+    """
+    Header bytes (length prefix included) for a file holding only names, and
+    the copy plan: (remote start, remote end, local offset) per tensor
+    """
+    header = {"__metadata__": remote.metadata} if remote.metadata else {}
+    copies = []
+    offset = 0
+    for name in names:
+        info = remote.tensors[name]
+        length = info["end"] - info["start"]
+        header[name] = {"dtype": info["dtype"], "shape": info["shape"], "data_offsets": [offset, offset + length]}
+        copies.append((info["start"], info["end"], offset))
+        offset += length
+    encoded = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    # Pad with spaces so tensor data starts 8-byte aligned, like the reference writer
+    encoded += b' ' * (-len(encoded) % 8)
+    prefix = struct.pack('<Q', len(encoded)) + encoded
+    return prefix, [(start, end, len(prefix) + local) for start, end, local in copies], len(prefix) + offset
+
+
+def plan_fetches(copies, connections):
+    """
+    Group tensor copies into Range requests: neighbours closer than
+    MERGE_GAP share a request, long runs are cut into pieces so every
+    connection has work. Returns [(start, end, [(copy start, copy end, local offset)])].
+    """
+    groups = []
+    for copy in sorted(copies):
+        if groups and copy[0] - groups[-1][1] <= MERGE_GAP:
+            groups[-1][1] = max(groups[-1][1], copy[1])
+            groups[-1][2].append(copy)
+        else:
+            groups.append([copy[0], copy[1], [copy]])
+
+    total = sum(end - start for start, end, _ in groups)
+    piece = max(MIN_PIECE_SIZE, min(MAX_PIECE_SIZE, total // max(1, connections * 4)))
+    fetches = []
+    for start, end, group in groups:
+        for piece_start in range(start, end, piece):
+            piece_end = min(end, piece_start + piece)
+            clipped = [
+                (max(s, piece_start), min(e, piece_end), local + max(0, piece_start - s))
+                for s, e, local in group if s < piece_end and e > piece_start
+            ]
+            clipped = [c for c in clipped if c[1] > c[0]]
+            if clipped:
+                fetches.append((clipped[0][0], clipped[-1][1], clipped))
+    return fetches
+
+
+class _SelectiveDownload:
+    """
+    Fetch planned pieces of one remote file into a local file on a thread pool
+    """
+
+    def __init__(self, remote, headers, connections, metrics, slot):
+        self.remote = remote
+        self.headers = headers
+        self.connections = connections
+        self.metrics = metrics
+        self.slot = slot
+        self._lock = threading.Lock()
+        self._downloaded = 0
+        self._total = 0
+        self._reporter = ProgressReporter(LOG_PREFIX, metrics=metrics)
+        self._last_emit = (time.monotonic(), 0)
+
+    def run(self, temp_file, fetches):
+        self._total = sum(end - start for start, end, _ in fetches)
+        workers = max(1, min(self.connections, len(fetches)))
+        self.metrics.connections = workers
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hf-safetensors") as pool:
+            for future in [pool.submit(self._fetch_with_retry, temp_file, fetch) for fetch in fetches]:
+                future.result()
+        self._emit(workers, force=True)
+
+    def _fetch_with_retry(self, temp_file, fetch):
+        for attempt in range(1, MAX_TRIES + 1):
+            counted = [0]
+            try:
+                self._fetch(temp_file, fetch, counted)
+                return
+            except urllib.error.HTTPError:
+                raise
+            except (urllib.error.URLError, OSError, http.client.HTTPException) as e:
+                if attempt == MAX_TRIES:
+                    raise
+                # Writes go to fixed offsets, so the piece is simply fetched again
+                self._add(-counted[0])
+                self.metrics.retry()
+                print(f"{LOG_PREFIX} Retrying bytes {fetch[0]}-{fetch[1] - 1} ({attempt}/{MAX_TRIES}): {e}")
+                time.sleep(RETRY_WAIT)
+
+    def _fetch(self, temp_file, fetch, counted):
+        start, end, copies = fetch
+        response, total = _range_request(self.remote.url, self.headers, start, end - 1)
+        opened = time.monotonic()
+        with response, open(temp_file, 'r+b') as f:
+            self.metrics.first_byte()
+            if total and total != self.remote.size:
+                raise Exception(f"Remote file changed size ({total} != {self.remote.size} bytes)")
+            position = start
+            try:
+                for copy_start, copy_end, local in copies:
+                    # Bytes of unselected tensors between two wanted ones
+                    position += self._read_into(response, copy_start - position, None, counted)
+                    f.seek(local)
+                    position += self._read_into(response, copy_end - copy_start, f, counted)
+            finally:
+                self.metrics.connection_finished(max(position - start, counted[0]), time.monotonic() - opened)
+
+    def _read_into(self, response, length, f, counted):
+        remaining = length
+        while remaining > 0:
+            chunk = response.read(min(READ_SIZE, remaining))
+            if not chunk:
+                raise OSError(f"Connection closed with {remaining} bytes of the range left")
+            if f is not None:
+                f.write(chunk)
+            if self.slot:
+                self.slot.throttle(len(chunk))
+            remaining -= len(chunk)
+            if f is not None:
+                counted[0] += len(chunk)
+                self._add(len(chunk))
+        return length
+
+    def _add(self, amount):
+        with self._lock:
+            self._downloaded += amount
+        self._emit(self.connections)
+
+    def _emit(self, connections, force=False):
+        now = time.monotonic()
+        last_time, last_bytes = self._last_emit
+        if not force and now - last_time < 0.5:
+            return
+        with self._lock:
+            downloaded = self._downloaded
+            self._last_emit = (now, downloaded)
+        speed = int((downloaded - last_bytes) / max(1e-6, now - last_time))
+        eta = (self._total - downloaded) / speed if speed > 0 and self._total else None
+        self._reporter.update(Progress(downloaded, self._total, max(0, speed), connections, eta))
+
+
+def _hf_headers(use_hf_token, hf_token_override):
+    return auth_headers(get_hf_token(hf_token_override) if use_hf_token else None)
+
+
+def _read_local_prefix(path, length):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(length)
+    except OSError:
+        return None
+
+
+class HuggingFaceSafetensorsInspector:
+    """
+    Reads the header of a remote safetensors file (a few hundred KB at
+    most) and reports its metadata and tensors without downloading it.
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "url": ("STRING", {
+                    "multiline": False,
+                    "default": "https://huggingface.co/username/repo/resolve/main/model.safetensors",
+                    "placeholder": "Enter HuggingFace .safetensors URL"
+                }),
+                "use_hf_token": ("BOOLEAN", {
+                    "default": True
+                }),
+            },
+            "optional": {
+                "hf_token_override": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Override token from settings"
+                }),
+                "include": ("STRING", {
+                    "multiline": False,
+                    "default": "*",
+                    "placeholder": "Tensor name globs to list, e.g. model.diffusion_model.*"
+                }),
+                "exclude": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Tensor name globs to leave out"
+                }),
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "STRING", "INT", "INT")
+    RETURN_NAMES = ("metadata_json", "tensors_json", "tensor_count", "tensor_bytes")
+    FUNCTION = "inspect"
+    CATEGORY = "loaders"
+    OUTPUT_NODE = True
+
+    def inspect(self, url, use_hf_token, hf_token_override="", include="*", exclude=""):
+        """
+        Fetch and summarize the header of a remote safetensors file
+        """
+        remote = fetch_header(url, _hf_headers(use_hf_token, hf_token_override))
+        summary = remote.summary(remote.select(include, exclude))
+        print(f"{LOG_PREFIX} {os.path.basename(url.split('?')[0])}: {summary['tensor_count']} of "
+              f"{len(remote.tensors)} tensors match, {summary['tensor_bytes'] / (1024*1024):.1f} MB "
+              f"of {remote.size / (1024*1024):.1f} MB")
+        return (json.dumps(remote.metadata, indent=1), json.dumps(summary["tensors"], indent=1),
+                summary["tensor_count"], summary["tensor_bytes"])
+
+
+class HuggingFaceSafetensorsSelectiveDownloader:
+    """
+    Downloads only the tensors of a remote safetensors file whose names
+    match a filter (e.g. the UNet of a checkpoint) and saves them as a
+    smaller, valid safetensors file.
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "url": ("STRING", {
+                    "multiline": False,
+                    "default": "https://huggingface.co/username/repo/resolve/main/model.safetensors",
+                    "placeholder": "Enter HuggingFace .safetensors URL"
+                }),
+                "include": ("STRING", {
+                    "multiline": False,
+                    "default": "*",
+                    "placeholder": "Comma-separated tensor name globs, e.g. model.diffusion_model.*"
+                }),
+                "exclude": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Comma-separated tensor name globs to skip"
+                }),
+                "save_path": (["models/checkpoints", "models/diffusion_models", "models/unet", "models/loras", "models/vae", "models/clip", "models/text_encoders", "custom"], {
+                    "default": "models/checkpoints"
+                }),
+                "custom_path": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Custom path (if save_path is 'custom')"
+                }),
+                "filename": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Leave empty for <original name>.subset.safetensors"
+                }),
+                "use_hf_token": ("BOOLEAN", {
+                    "default": True
+                }),
+            },
+            "optional": {
+                "hf_token_override": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Override token from settings"
+                }),
+                "connections": ("INT", {
+                    "default": 8,
+                    "min": 1,
+                    "max": 16,
+                    "step": 1,
+                    "display": "number"
+                }),
+                "force_refresh": ("BOOLEAN", {
+                    "default": False
+                }),
+            }
+        }
+
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("file_path",)
+    FUNCTION = "download"
+    CATEGORY = "loaders"
+    OUTPUT_NODE = True
+
+    def download(self, url, include, exclude, save_path, custom_path, filename, use_hf_token,
+                 hf_token_override="", connections=8, force_refresh=False):
+        """
+        Download the matching tensors of a remote safetensors file
+        """
+        save_dir = resolve_save_dir(save_path, custom_path)
+
+        if not filename:
+            original = url.split('/')[-1].split('?')[0] or "model.safetensors"
+            filename = f"{os.path.splitext(original)[0]}.subset.safetensors"
+        output_file = os.path.join(save_dir, os.path.basename(filename))
+
+        return get_manager().run(
+            download_key(url, output_file), self._download_to, url, output_file, include, exclude,
+            use_hf_token, hf_token_override, connections, force_refresh
+        )
+
+    def _download_to(self, url, output_file, include, exclude, use_hf_token, hf_token_override,
+                     connections, force_refresh):
+        """
+        Download the selected tensors to output_file (runs on a download manager thread)
+        """
+        headers = _hf_headers(use_hf_token, hf_token_override)
+        metrics = DownloadMetrics(url, engine="safetensors")
+        try:
+            remote = fetch_header(url, headers)
+            names = remote.select(include, exclude)
+            if not names:
+                raise Exception(f"No tensors match include='{include}' exclude='{exclude}' "
+                                f"({len(remote.tensors)} tensors in the file)")
+            prefix, copies, size = build_header(remote, names)
+            print(f"{LOG_PREFIX} Selected {len(names)} of {len(remote.tensors)} tensors: "
+                  f"{size / (1024*1024):.1f} MB of {remote.size / (1024*1024):.1f} MB")
+
+            # The header encodes every selected name, shape and offset, so an
+            # identical header and size means the file already holds this selection.
+            # Same-shaped weights can still change upstream: when the server has
+            # an ETag, the file must also have been indexed from that version.
+            index = get_index()
+            variant = f"subset:{os.path.abspath(output_file)}"
+            remote_metadata = index.remote_metadata(url, headers, force=force_refresh)
+            etag = remote_metadata.get('etag', "") if remote_metadata else ""
+            if not force_refresh and os.path.isfile(output_file) and os.path.getsize(output_file) == size \
+                    and _read_local_prefix(output_file, len(prefix)) == prefix:
+                entry = index.find_local(url, output_file, variant=variant)
+                if not etag or (entry and entry.get('etag') == etag):
+                    print(f"{LOG_PREFIX} ✓ Already up to date, skipping download: {output_file}")
+                    metrics.finish("up_to_date", size=size)
+                    return (output_file,)
+                print(f"{LOG_PREFIX} Local file was not cut from the current remote version (ETag {etag[:16]}), downloading again")
+
+            fetches = plan_fetches(copies, connections)
+            print(f"{LOG_PREFIX} Fetching {len(fetches)} byte ranges with up to {connections} connections")
+            metrics.total_bytes = size
+
+            temp_file = part_path(output_file)
+            discard(temp_file)
+            with open(temp_file, 'wb') as f:
+                preallocate(f, size)
+                f.write(prefix)
+            _SelectiveDownload(remote, headers, connections, metrics, current_slot()).run(temp_file, fetches)
+            metrics.transfer_finished()
+            publish_file(temp_file, output_file)
+            index.record(url, output_file, etag=etag, remote_size=remote.size, variant=variant)
+        except urllib.error.HTTPError as e:
+            metrics.finish("error", error=f"HTTP {e.code}")
+            if e.code in (401, 403):
+                raise Exception(f"{e.code} - Repo may be private or gated. Enable 'use_hf_token' and provide a valid HuggingFace token.")
+            raise Exception(f"HTTP Error {e.code}: {e.reason}")
+        except Exception as e:
+            metrics.finish("error", error=str(e))
+            raise
+
+        print(f"{LOG_PREFIX} ✓ Saved {len(names)} tensors to: {output_file}")
+        metrics.finish("ok", size=size)
+        return (output_file,)
+
+
+NODE_CLASS_MAPPINGS = {
+    "HuggingFaceSafetensorsInspector": HuggingFaceSafetensorsInspector,
+    "HuggingFaceSafetensorsSelectiveDownloader": HuggingFaceSafetensorsSelectiveDownloader
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "HuggingFaceSafetensorsInspector": "HF Safetensors Inspect",
+    "HuggingFaceSafetensorsSelectiveDownloader": "HF Safetensors Selective Download"
+}
@@ -0,0 +1,483 @@
+"""
+HuggingFace Snapshot Downloader Node for ComfyUI
+Downloads every file of a repo (filtered by include/exclude globs) in one
+concurrent batch, keeping the repo's directory structure
+"""
+
+import os
+import json
+import fnmatch
+import hashlib
+import tempfile
+import threading
+import subprocess
+import urllib.parse
+import urllib.error
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .hf_common import get_hf_token, auth_headers, resolve_save_dir
+from .parallel_download import ParallelRangeDownloader, DownloadCancelled
+from .download_cache import get_index
+from .download_verify import sha256_file
+from .download_manager import get_manager, download_key
+from .download_progress import Progress, ProgressReporter, parse_readouts, iter_lines
+from .download_progress import bind_progress_target, current_progress_target
+from .aria2c_locator import get_aria2c_path
+from .bandwidth import current_slot
+from .http_pool import open_url
+from .download_files import part_path, file_allocation, publish_file, discard
+
+LOG_PREFIX = "[HF Snapshot Downloader]"
+
+
+def hf_endpoint():
+    """
+    HF hub endpoint, overridable like huggingface_hub (HF_ENDPOINT) for mirrors and local test servers
+    """
+    return os.environ.get("HF_ENDPOINT", "https://huggingface.co").rstrip('/')
+
+
+def _repo_prefix(repo_type):
+    return {"model": "", "dataset": "datasets/", "space": "spaces/"}[repo_type]
+
+
+def _next_link(link_header):
+    # Link: <https://huggingface.co/api/...&cursor=...>; rel="next"
+    for part in (link_header or "").split(','):
+        if 'rel="next"' in part:
+            return part.split(';')[0].strip().strip('<>')
+    return None
+
+
+def list_repo_files(repo_id, revision="main", repo_type="model", headers=None, timeout=30):
+    """
+    List every file in a repo revision through the HF tree API (follows pagination).
+    Returns dicts with 'path', 'size', 'sha256' (None for non-LFS files) and
+    'oid' (the git blob id, which changes with every edit of a non-LFS file).
+    """
+    url = (f"{hf_endpoint()}/api/{repo_type}s/{repo_id}/tree/"
+           f"{urllib.parse.quote(revision, safe='')}?recursive=true")
+    files = []
+    while url:
+        with open_url(url, headers, timeout=timeout) as response:
+            entries = json.loads(response.read().decode('utf-8'))
+            url = _next_link(response.headers.get('Link'))
+        for entry in entries:
+            if entry.get('type') != 'file':
+                continue
+            lfs = entry.get('lfs') or {}
+            files.append({
+                'path': entry['path'],
+                'size': lfs.get('size', entry.get('size', 0)),
+                'sha256': lfs.get('oid') or lfs.get('sha256'),
+                'oid': entry.get('oid'),
+            })
+    return files
+
+
+def _split_patterns(patterns):
+    return [p.strip() for p in patterns.replace('\n', ',').split(',') if p.strip()]
+
+
+def filter_files(files, include="*", exclude=""):
+    """
+    Keep files matching any include glob and no exclude glob
+    """
+    include_patterns = _split_patterns(include) or ["*"]
+    exclude_patterns = _split_patterns(exclude)
+    return [
+        f for f in files
+        if any(fnmatch.fnmatch(f['path'], p) for p in include_patterns)
+        and not any(fnmatch.fnmatch(f['path'], p) for p in exclude_patterns)
+    ]
+
+
+def resolve_url(repo_id, revision, path, repo_type="model"):
+    return (f"{hf_endpoint()}/{_repo_prefix(repo_type)}{repo_id}/resolve/"
+            f"{urllib.parse.quote(revision, safe='')}/{urllib.parse.quote(path)}")
+
+
+def git_blob_oid(path):
+    """
+    Git blob id (SHA-1 of "blob <size>\\0" + content) of a local file, as the tree API reports it
+    """
+    sha = hashlib.sha1(f"blob {os.path.getsize(path)}\0".encode('ascii'))
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def safe_join(root, repo_path):
+    """
+    Join a repo-relative path onto root, refusing anything that escapes root
+    """
+    target = os.path.abspath(os.path.join(root, *repo_path.split('/')))
+    if os.path.commonpath([root, target]) != root:
+        raise ValueError(f"Refusing unsafe path from repo listing: {repo_path}")
+    return target
+
+
+def _on_cancel(cancel, finished, action):
+    """
+    Call action() from a watcher thread once cancel is set, unless finished is set first
+    """
+    def watch():
+        while not finished.is_set():
+            if cancel.wait(0.5):
+                action()
+                return
+
+    threading.Thread(target=watch, daemon=True, name="hf-snapshot-cancel").start()
+
+
+class HuggingFaceSnapshotDownloader:
+    """
+    Downloads a whole HuggingFace repo (or a filtered subset) as one
+    concurrent batch using aria2c --input-file, or the pure Python engine.
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "repo_id": ("STRING", {
+                    "multiline": False,
+                    "default": "username/repo",
+                    "placeholder": "HuggingFace repo id (owner/name)"
+                }),
+                "revision": ("STRING", {
+                    "multiline": False,
+                    "default": "main",
+                    "placeholder": "Branch, tag or commit"
+                }),
+                "include": ("STRING", {
+                    "multiline": False,
+                    "default": "*",
+                    "placeholder": "Comma-separated globs, e.g. *.json,unet/*.safetensors"
+                }),
+                "exclude": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Comma-separated globs to skip"
+                }),
+                "save_path": (["models/diffusers", "models/checkpoints", "models/loras", "models/vae", "models/clip", "models/controlnet", "custom"], {
+                    "default": "models/diffusers"
+                }),
+                "custom_path": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Custom path (if save_path is 'custom')"
+                }),
+                "folder_name": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Leave empty to use the repo name"
+                }),
+                "engine": (["aria2c", "python"], {
+                    "default": "aria2c"
+                }),
+                "max_parallel_files": ("INT", {
+                    "default": 4,
+                    "min": 1,
+                    "max": 16,
+                    "step": 1,
+                    "display": "number"
+                }),
+                "connections": ("INT", {
+                    "default": 8,
+                    "min": 1,
+                    "max": 16,
+                    "step": 1,
+                    "display": "number"
+                }),
+                "use_hf_token": ("BOOLEAN", {
+                    "default": True
+                }),
+            },
+            "optional": {
+                "hf_token_override": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "placeholder": "Override token from settings"
+                }),
+                "repo_type": (["model", "dataset", "space"], {
+                    "default": "model"
+                }),
+            }
+        }
+
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("folder_path",)
+    FUNCTION = "download"
+    CATEGORY = "loaders"
+    OUTPUT_NODE = True
+
+    def download(self, repo_id, revision, include, exclude, save_path, custom_path, folder_name,
+                 engine, max_parallel_files, connections, use_hf_token, hf_token_override="", repo_type="model"):
+        """
+        List the repo tree, filter it and download all matching files at once
+        """
+        repo_id = repo_id.strip().strip('/')
+        revision = revision.strip() or "main"
+        if repo_id.count('/') != 1:
+            raise ValueError(f"Invalid repo id: {repo_id} (expected owner/name)")
+
+        # Determine root directory
+        base_dir = resolve_save_dir(save_path, custom_path)
+        folder_name = os.path.basename(folder_name.strip()) or repo_id.split('/')[-1]
+        root = os.path.join(base_dir, folder_name)
+        os.makedirs(root, exist_ok=True)
+
+        # Get HuggingFace token
+        token = get_hf_token(hf_token_override) if use_hf_token else None
+
+        # Runs in the background download manager like the single-file nodes.
+        # Unlike them, an interrupt (ComfyUI's Cancel) stops the whole batch.
+        cancel = threading.Event()
+        try:
+            return get_manager().run(download_key(f"{repo_type}:{repo_id}@{revision}", root), self._download_to,
+                                     repo_id, revision, include, exclude, root, engine, max_parallel_files,
+                                     connections, token, repo_type, cancel)
+        except BaseException:
+            cancel.set()
+            raise
+
+    def _download_to(self, repo_id, revision, include, exclude, root, engine, max_parallel_files, connections,
+                     token, repo_type, cancel):
+        """
+        List, filter and download the snapshot into root (runs on a download manager thread)
+        """
+        headers = auth_headers(token)
+        try:
+            files = filter_files(list_repo_files(repo_id, revision, repo_type, headers), include, exclude)
+        except urllib.error.HTTPError as e:
+            if e.code in (401, 403):
+                raise Exception(f"{e.code} - Repo may be private or gated. Enable 'use_hf_token' and provide a valid HuggingFace token.")
+            if e.code == 404:
+                raise Exception(f"404 Not Found - Check the repo id '{repo_id}' and revision '{revision}'.")
+            raise Exception(f"HTTP Error {e.code} while listing repo: {e.reason}")
+
+        if not files:
+            raise Exception(f"No files in {repo_id}@{revision} match include='{include}' exclude='{exclude}'")
+
+        jobs = []
+        skipped = 0
+        for f in files:
+            job = dict(f, url=resolve_url(repo_id, revision, f['path'], repo_type), target=safe_join(root, f['path']))
+            if self._is_current(job):
+                skipped += 1
+            else:
+                jobs.append(job)
+
+        total_bytes = sum(job['size'] or 0 for job in jobs)
+        print(f"{LOG_PREFIX} {repo_id}@{revision}: {len(files)} files matched, {skipped} already present, "
+              f"{len(jobs)} to download ({total_bytes / (1024*1024):.1f} MB)")
+
+        if jobs:
+            # The whole batch shares the manager's bandwidth scheduler slot
+            if engine == "aria2c":
+                self._download_aria2c(jobs, max_parallel_files, connections, token, cancel)
+            else:
+                self._download_python(jobs, max_parallel_files, connections, headers, cancel)
+
+            index = get_index()
+            for job in jobs:
+                # The git blob id goes in the etag field: it is what the Hub sends as ETag for non-LFS files
+                index.record(job['url'], job['target'], sha256=job['sha256'], etag=job['oid'] or "",
+                             remote_size=job['size'])
+
+        print(f"{LOG_PREFIX} ✓ Snapshot ready: {root}")
+        return (root,)
+
+    def _is_current(self, job):
+        """
+        True when the target already holds this exact file: same LFS SHA-256,
+        or for non-LFS files (configs, model_index.json) the same git blob id
+        """
+        target = job['target']
+        if not os.path.isfile(target) or (job['size'] and os.path.getsize(target) != job['size']):
+            return False
+        entry = get_index().find_local(job['url'], target)
+        if entry:
+            if job['sha256']:
+                return entry.get('sha256') == job['sha256']
+            # Small files can change without changing size, so the size check says nothing
+            return bool(job['oid']) and entry.get('etag') == job['oid']
+        if job['sha256']:
+            current = sha256_file(target) == job['sha256']
+        else:
+            current = bool(job['oid']) and git_blob_oid(target) == job['oid']
+        if current:
+            get_index().record(job['url'], target, sha256=job['sha256'], etag=job['oid'] or "",
+                               remote_size=job['size'])
+        return current
+
+    def _download_aria2c(self, jobs, max_parallel_files, connections, token, cancel):
+        """
+        Hand the whole batch to a single aria2c process via --input-file
+        """
+        aria2c_path = get_aria2c_path()
+        if not aria2c_path:
+            raise Exception("aria2c is not installed or not found. Set engine to 'python' to download without aria2c.")
+
+        lines = []
+        for job in jobs:
+            # Written to <file>.part and renamed once complete; a .part without
+            # an aria2c control file can't be resumed and is started over
+            temp_file = part_path(job['target'])
+            if not os.path.exists(f"{temp_file}.aria2"):
+                discard(temp_file)
+            lines.append(job['url'])
+            lines.append(f"  dir={os.path.dirname(job['target'])}")
+            lines.append(f"  out={os.path.basename(temp_file)}")
+            if job['sha256']:
+                # aria2c verifies the LFS hash itself once the file completes
+                lines.append(f"  checksum=sha-256={job['sha256']}")
+            os.makedirs(os.path.dirname(job['target']), exist_ok=True)
+
+        fd, input_file = tempfile.mkstemp(prefix="hf_snapshot_", suffix=".txt")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+
+            cmd = [
+                aria2c_path,
+                f"--input-file={input_file}",
+                f"--max-concurrent-downloads={max_parallel_files}",
+                f"--max-connection-per-server={connections}",
+                f"--split={connections}",
+                "--continue=true",
+                "--min-split-size=1M",
+                f"--file-allocation={file_allocation()}",
+                "--console-log-level=warn",
+                "--summary-interval=5",
+                "--retry-wait=3",
+                "--max-tries=5",
+                "--allow-overwrite=true",
+                "--auto-file-renaming=false",
+            ]
+            slot = current_slot()
+            if slot and slot.rate:
+                cmd.append(f"--max-overall-download-limit={slot.rate}")
+            if token:
+                # Don't log the command, it carries the token
+                cmd.append(f"--header=Authorization: Bearer {token}")
+
+            print(f"{LOG_PREFIX} Starting aria2c batch: {len(jobs)} files, {max_parallel_files} at a time")
+            returncode, tail = self._run_aria2c(cmd, sum(job['size'] or 0 for job in jobs), cancel)
+        finally:
+            os.remove(input_file)
+
+        if cancel.is_set():
+            # aria2c saved its control files, so the .part data resumes next time
+            raise DownloadCancelled("Snapshot download cancelled")
+        if returncode != 0:
+            error_msg = "\n".join(tail)
+            print(f"{LOG_PREFIX} ✗ Download failed!")
+            print(f"{LOG_PREFIX} Error: {error_msg}")
+            raise Exception(f"aria2c batch download failed with code {returncode}. Check console for details.")
+
+        for job in jobs:
+            temp_file = part_path(job['target'])
+            discard(f"{temp_file}.aria2")
+            publish_file(temp_file, job['target'])
+
+    def _run_aria2c(self, cmd, total_bytes, cancel):
+        """
+        Run the batch process, streaming its readout as progress for the
+        whole snapshot. Returns (exit code, last output lines).
+        """
+        # Stream the output rather than buffering it until exit
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        finished = threading.Event()
+        _on_cancel(cancel, finished, process.terminate)
+        reporter = ProgressReporter(LOG_PREFIX)
+        files = {}
+        tail = deque(maxlen=50)
+        try:
+            for line in iter_lines(process.stdout):
+                readouts = parse_readouts(line)
+                if not readouts:
+                    tail.append(line)
+                    continue
+                # Files that dropped out of the readout keep their last value
+                files.update(readouts)
+                completed = sum(p.completed for p in files.values())
+                total = max(total_bytes, sum(p.total for p in files.values()))
+                speed = sum(p.speed for p in readouts.values())
+                reporter.update(Progress(completed, total, speed, sum(p.connections for p in readouts.values()),
+                                         (total - completed) // speed if speed else None))
+            returncode = process.wait()
+        finally:
+            finished.set()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+        if reporter.last:
+            reporter.log(reporter.last)
+        return returncode, tail
+
+    def _download_python(self, jobs, max_parallel_files, connections, headers, cancel):
+        """
+        Download the batch on a thread pool using the pure Python range engine
+        """
+        slot = current_slot()
+        target = current_progress_target()
+        running = set()
+        lock = threading.Lock()
+
+        def cancel_running():
+            with lock:
+                for downloader in running:
+                    downloader.cancel()
+
+        def fetch(job):
+            if cancel.is_set():
+                raise DownloadCancelled("Snapshot download cancelled")
+            # Pool threads report to the manager job's progress target too
+            bind_progress_target(target)
+            os.makedirs(os.path.dirname(job['target']), exist_ok=True)
+            downloader = ParallelRangeDownloader(job['url'], headers, connections=connections,
+                                                 expected_sha256=job['sha256'] or "", slot=slot)
+            with lock:
+                running.add(downloader)
+            if cancel.is_set():
+                downloader.cancel()
+            try:
+                downloader.download(job['target'])
+            finally:
+                with lock:
+                    running.discard(downloader)
+            job['sha256'] = downloader.sha256 or job['sha256']
+            print(f"{LOG_PREFIX} ✓ {job['path']}")
+
+        finished = threading.Event()
+        _on_cancel(cancel, finished, cancel_running)
+        # Largest files first so the long transfers start early
+        ordered = sorted(jobs, key=lambda job: job['size'] or 0, reverse=True)
+        pool = ThreadPoolExecutor(max_workers=max_parallel_files, thread_name_prefix="hf-snapshot")
+        try:
+            futures = [pool.submit(fetch, job) for job in ordered]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except BaseException:
+                # Fail fast: drop the files not started yet and stop the
+                # running ones the way a cancel does, then report the first error
+                pool.shutdown(wait=False, cancel_futures=True)
+                cancel.set()
+                raise
+        finally:
+            pool.shutdown(wait=True)
+            finished.set()
+
+
+NODE_CLASS_MAPPINGS = {
+    "HuggingFaceSnapshotDownloader": HuggingFaceSnapshotDownloader
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "HuggingFaceSnapshotDownloader": "HF Snapshot Downloader"
+}
@@ -0,0 +1,402 @@
+"""
+Keep-alive connection pool and resolved-redirect cache for the Python engines
+HF resolve URLs answer with a redirect to a signed CDN URL. urlopen opens a
+new connection for every request and follows that redirect every time, so
+each range request, retry and repeated download paid connection setup
+(DNS, TCP, TLS) and the extra hop. open_url() keeps idle HTTP/1.1
+connections per host for the whole process and remembers where a URL
+redirected to until the signed URL expires, so range requests go straight
+to the CDN over an already open connection.
+
+Requests through a configured proxy use urllib unchanged.
+HF_DOWNLOADER_KEEP_ALIVE=0 turns pooling and the redirect cache off.
+"""
+
+import io
+import os
+import re
+import ssl
+import time
+import calendar
+import threading
+import http.client
+import urllib.request
+import urllib.error
+import urllib.parse
+
+# Idle connections kept per host (one per parallel range connection)
+MAX_IDLE_PER_HOST = 32
+# Drop idle connections before typical server keep-alive timeouts close them
+IDLE_TIMEOUT = 50
+MAX_REDIRECTS = 10
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+# A cached signed URL is only used while it has at least this long left
+EXPIRY_MARGIN = 60
+# Redirects with no expiry in their URL or Cache-Control
+DEFAULT_REDIRECT_TTL = 300
+MAX_CACHED_REDIRECTS = 1024
+# Unread bodies up to this size are drained so the connection can be reused
+MAX_DRAIN = 64 * 1024
+USER_AGENT = f"Python-urllib/{urllib.request.__version__}"
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)', re.IGNORECASE)
+
+
+def keep_alive_enabled():
+    return os.environ.get("HF_DOWNLOADER_KEEP_ALIVE", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def url_expiry(url):
+    """
+    Expiry (epoch seconds) of a signed URL, or None when it carries none.
+    Understands CloudFront-style Expires=<epoch> and S3/GCS V4 presigned
+    X-Amz-Date + X-Amz-Expires.
+    """
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+
+    def first(*names):
+        for name in names:
+            if query.get(name):
+                return query[name][0]
+        return None
+
+    expires = first('Expires', 'expires')
+    if expires and expires.isdigit():
+        return int(expires)
+    signed_at = first('X-Amz-Date', 'X-Goog-Date')
+    lifetime = first('X-Amz-Expires', 'X-Goog-Expires')
+    if signed_at and lifetime and lifetime.isdigit():
+        try:
+            return calendar.timegm(time.strptime(signed_at, "%Y%m%dT%H%M%SZ")) + int(lifetime)
+        except ValueError:
+            return None
+    return None
+
+
+def _redirect_expiry(hops, now):
+    """
+    When a followed chain of redirects [(location, response headers)]
+    stops being valid, or None when it must not be cached
+    """
+    expiries = []
+    for location, headers in hops:
+        expiry = url_expiry(location)
+        if expiry is None:
+            cache_control = headers.get('Cache-Control', '')
+            if 'no-store' in cache_control.lower():
+                return None
+            max_age = _MAX_AGE_RE.search(cache_control)
+            expiry = now + (int(max_age.group(1)) if max_age else DEFAULT_REDIRECT_TTL)
+        expiries.append(expiry)
+    return min(expiries) if expiries else None
+
+
+class RedirectCache:
+    """
+    Where a URL (fetched with a given Authorization) ended up after its
+    redirects, kept until the target expires
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_REDIRECTS):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            target, expiry = entry
+            if expiry - EXPIRY_MARGIN <= time.time():
+                del self._entries[key]
+                return None
+            self.hits += 1
+            return target
+
+    def remember(self, key, target, hops):
+        now = time.time()
+        expiry = _redirect_expiry(hops, now)
+        if expiry is None or expiry - EXPIRY_MARGIN <= now:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                for stale in [k for k, (_, e) in self._entries.items() if e - EXPIRY_MARGIN <= now]:
+                    del self._entries[stale]
+            while len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (target, expiry)
+
+    def forget(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class PooledResponse:
+    """
+    Response from a pooled connection (the subset of urllib's response the
+    engines use). Closing it hands the connection back to the pool when
+    the body was read to the end, and closes it otherwise.
+    """
+
+    def __init__(self, pool, key, connection, response, url):
+        self._pool = pool
+        self._key = key
+        self._connection = connection
+        self._response = response
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+
+    def read(self, amt=None):
+        return self._response.read(amt)
+
+    def readinto(self, buffer):
+        return self._response.readinto(buffer)
+
+    def getcode(self):
+        return self.status
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        response = self._response
+        if not response.isclosed() and not response.will_close and response.length is not None \
+                and response.length <= MAX_DRAIN:
+            try:
+                response.read()
+            except (http.client.HTTPException, OSError):
+                pass
+        if response.isclosed() and not response.will_close:
+            self._pool.release(self._key, connection)
+        else:
+            response.close()
+            connection.close()
+
+    def error(self):
+        """
+        HTTPError for this (error status) response, like urlopen raises
+        """
+        body = b""
+        if self._response.length is not None and self._response.length <= MAX_DRAIN:
+            try:
+                body = self._response.read()
+            except (http.client.HTTPException, OSError):
+                pass
+        self.close()
+        return urllib.error.HTTPError(self.url, self.status, self.reason, self.headers, io.BytesIO(body))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Idle keep-alive connections per (scheme, host, port), shared by every
+    download in the process
+    """
+
+    def __init__(self, max_idle_per_host=MAX_IDLE_PER_HOST, idle_timeout=IDLE_TIMEOUT):
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._ssl_context = None
+        self.opened = 0
+        self.reused = 0
+
+    def _connect(self, key, timeout):
+        scheme, host, port = key
+        if scheme == 'https':
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            return http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl_context)
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def acquire(self, key, timeout):
+        """
+        An idle connection to key (or a new one) and whether it was reused
+        """
+        expired = []
+        connection = None
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate, since = idle.pop()
+                if now - since < self.idle_timeout:
+                    connection = candidate
+                    break
+                expired.append(candidate)
+            if connection is not None:
+                self.reused += 1
+            else:
+                self.opened += 1
+        for stale in expired:
+            stale.close()
+        if connection is None:
+            return self._connect(key, timeout), False
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection, True
+
+    def release(self, key, connection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append((connection, time.monotonic()))
+                return
+        connection.close()
+
+    def request(self, url, headers, method="GET", timeout=60):
+        """
+        Send one request (no redirect handling) and return a PooledResponse
+        """
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise urllib.error.URLError(f"unsupported URL: {url}")
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        target = urllib.parse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+        while True:
+            connection, reused = self.acquire(key, timeout)
+            try:
+                try:
+                    connection.request(method, target, headers=headers)
+                except OSError as e:
+                    raise urllib.error.URLError(e)
+                response = connection.getresponse()
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                # The server closed a kept-alive connection while it sat idle: use a fresh one
+                reason = getattr(e, 'reason', e)
+                if reused and not isinstance(reason, TimeoutError):
+                    continue
+                raise
+            return PooledResponse(self, key, connection, response, url)
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection, _ in connections:
+                connection.close()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def _proxied(url):
+    parts = urllib.parse.urlsplit(url)
+    return bool(urllib.request.getproxies().get(parts.scheme)) and not urllib.request.proxy_bypass(parts.hostname or "")
+
+
+def _urllib_open(url, headers, method, timeout, follow_redirects):
+    req = urllib.request.Request(url, headers=headers, method=method)
+    if follow_redirects:
+        return urllib.request.urlopen(req, timeout=timeout)
+    try:
+        return urllib.request.build_opener(_NoRedirect).open(req, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        # Unfollowed redirects surface as HTTPError; hand them back as the response
+        if 300 <= e.code < 400:
+            return e
+        raise
+
+
+def _follow(url, headers, method, timeout, follow_redirects, cache_key):
+    pool = get_pool()
+    hops = []
+    current = url
+    for _ in range(MAX_REDIRECTS + 1):
+        response = pool.request(current, headers, method, timeout)
+        location = response.headers.get('Location')
+        if response.status not in REDIRECT_CODES or not location:
+            if response.status >= 400:
+                raise response.error()
+            if hops and cache_key:
+                get_redirect_cache().remember(cache_key, current, hops)
+            return response
+        location = urllib.parse.urljoin(current, location)
+        if not follow_redirects:
+            # e.g. the metadata HEAD: the next GET of this URL can skip the hop
+            if cache_key:
+                get_redirect_cache().remember(cache_key, location, [(location, response.headers)])
+            return response
+        response.close()
+        hops.append((location, response.headers))
+        if response.status == 303 and method != 'HEAD':
+            method = 'GET'
+        current = location
+    raise urllib.error.HTTPError(url, response.status, "Too many redirects", response.headers, None)
+
+
+def open_url(url, headers=None, method="GET", timeout=60, follow_redirects=True):
+    """
+    Like urllib.request.urlopen(Request(url, headers, method), timeout),
+    over pooled keep-alive connections and through the redirect cache.
+    With follow_redirects=False a redirect is returned as the response.
+    Raises urllib.error.HTTPError for error statuses, like urlopen.
+    """
+    headers = dict(headers or {})
+    if not any(name.lower() == 'user-agent' for name in headers):
+        headers['User-Agent'] = USER_AGENT
+    if not keep_alive_enabled() or _proxied(url):
+        return _urllib_open(url, headers, method, timeout, follow_redirects)
+
+    cache = get_redirect_cache()
+    cache_key = (url, headers.get('Authorization', ''))
+    target = cache.get(cache_key) if follow_redirects else None
+    if target:
+        try:
+            return _follow(target, headers, method, timeout, True, None)
+        except urllib.error.HTTPError as e:
+            cache.forget(cache_key)
+            # A signed URL revoked or expired early: resolve the original URL again
+            if not 400 <= e.code < 500:
+                raise
+        except Exception:
+            cache.forget(cache_key)
+            raise
+    return _follow(url, headers, method, timeout, follow_redirects, cache_key)
+
+
+def stats():
+    """
+    Counters for benchmarks: connections opened and reused, redirect cache hits
+    """
+    pool = get_pool()
+    return {"opened": pool.opened, "reused": pool.reused, "redirect_hits": get_redirect_cache().hits}
+
+
+_pool = None
+_redirects = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def get_redirect_cache():
+    global _redirects
+    with _pool_lock:
+        if _redirects is None:
+            _redirects = RedirectCache()
+        return _redirects
@@ -0,0 +1,661 @@
+"""
+Parallel HTTP Range download engine for the fallback HuggingFace downloader
+Pure Python (threads + urllib), no subprocess calls - safe for ComfyUI-Desktop
+"""
+
+import os
+import json
+import time
+import threading
+import urllib.error
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .download_verify import PrefixHasher, fetch_expected_sha256, remember_digest, check_digest, ChecksumMismatch
+from .download_progress import Progress, ProgressReporter
+from .download_mirrors import get_ranking, source_host
+from .bandwidth import current_slot
+from .connection_tuning import get_profiles, size_cap, ConnectionRamp
+from .download_files import PART_SUFFIX, preallocate, publish_file, discard
+from .http_pool import open_url
+
+LOG_PREFIX = "[HF Downloader]"
+
+# Smallest byte range handed to a single connection (mirrors aria2c's --min-split-size)
+MIN_SPLIT_SIZE = 1024 * 1024
+# Upper bound on a single range so work stays balanced across connections
+MAX_SPLIT_SIZE = 64 * 1024 * 1024
+# Reads start small and grow with measured throughput (see _ChunkSizer)
+MIN_READ_SIZE = 64 * 1024
+MAX_READ_SIZE = 4 * 1024 * 1024
+# Aim for roughly this much transfer time per read call
+READ_TARGET_SECONDS = 0.02
+# How often workers publish progress and the chunk size is re-evaluated
+MEASURE_INTERVAL = 0.25
+PROGRESS_INTERVAL = 0.5
+MAX_TRIES = 5
+RETRY_WAIT = 3
+# How often a running range records its progress in the sidecar, so a
+# crash or restart loses at most this much transfer time per connection
+CHECKPOINT_INTERVAL = 5
+# Errors on the active source before switching to the next mirror
+FAILOVER_AFTER = 2
+
+SIDECAR_SUFFIX = ".part.json"
+
+RemoteFile = namedtuple("RemoteFile", ["size", "supports_ranges", "etag", "last_modified"])
+
+
+class RangeNotSupported(Exception):
+    """
+    Raised when the server ignores a Range request mid-download
+    """
+
+
+class DownloadCancelled(Exception):
+    """
+    Raised when a download is stopped with cancel(); its .part data is kept for resume
+    """
+
+
+def probe(url, headers, timeout=30):
+    """
+    Ask the server for the first byte of the file.
+    Returns a RemoteFile. size is 0 when unknown.
+    """
+    probe_headers = dict(headers)
+    probe_headers['Range'] = 'bytes=0-0'
+    with open_url(url, probe_headers, timeout=timeout) as response:
+        etag = response.headers.get('ETag', '')
+        last_modified = response.headers.get('Last-Modified', '')
+        accept_ranges = response.headers.get('Accept-Ranges', '').lower()
+        if response.status == 206:
+            # Content-Range: bytes 0-0/12345
+            content_range = response.headers.get('Content-Range', '')
+            total = content_range.rpartition('/')[2]
+            if total.isdigit():
+                return RemoteFile(int(total), True, etag, last_modified)
+            return RemoteFile(0, False, etag, last_modified)
+        total_size = int(response.headers.get('content-length', 0) or 0)
+        # Server answered the probe with the whole body but still advertises ranges
+        return RemoteFile(total_size, accept_ranges == 'bytes' and total_size > 0, etag, last_modified)
+
+
+def merge_intervals(intervals):
+    """
+    Merge overlapping or touching inclusive (start, end) intervals
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def missing_intervals(done, total_size):
+    """
+    Return the inclusive intervals of [0, total_size) not covered by done
+    """
+    missing = []
+    cursor = 0
+    for start, end in merge_intervals(done):
+        if start > cursor:
+            missing.append((cursor, start - 1))
+        cursor = max(cursor, end + 1)
+    if cursor < total_size:
+        missing.append((cursor, total_size - 1))
+    return missing
+
+
+def split_ranges(total_size, connections, intervals=None):
+    """
+    Split the given intervals (default: all of [0, total_size)) into inclusive
+    (start, end) byte ranges. Uses a few ranges per connection so fast
+    connections pick up extra work.
+    """
+    if intervals is None:
+        intervals = [(0, total_size - 1)] if total_size else []
+    remaining = sum(end - start + 1 for start, end in intervals)
+    split = remaining // max(1, connections * 4)
+    split = max(MIN_SPLIT_SIZE, min(MAX_SPLIT_SIZE, split))
+    ranges = []
+    for start, last in intervals:
+        while start <= last:
+            end = min(start + split - 1, last)
+            ranges.append((start, end))
+            start = end + 1
+    return ranges
+
+
+class PartialDownload:
+    """
+    Tracks which byte ranges of a .part file are complete.
+    State is kept in a small JSON sidecar next to the .part file so an
+    interrupted download can be resumed (like aria2c's .aria2 control file).
+    """
+
+    def __init__(self, output_file, url, remote):
+        self.part_file = output_file + PART_SUFFIX
+        self.sidecar_file = output_file + SIDECAR_SUFFIX
+        self.url = url
+        self.remote = remote
+        self.done = []
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Load completed ranges from the sidecar. Returns the number of bytes
+        already downloaded, or 0 when there is nothing valid to resume.
+        """
+        if not (os.path.exists(self.part_file) and os.path.exists(self.sidecar_file)):
+            return 0
+        try:
+            with open(self.sidecar_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+
+        # Only resume when the remote file is unchanged
+        if state.get('size') != self.remote.size or os.path.getsize(self.part_file) != self.remote.size:
+            return 0
+        if self.remote.etag and state.get('etag') and state.get('etag') != self.remote.etag:
+            return 0
+
+        self.done = merge_intervals(tuple(interval) for interval in state.get('done', []))
+        return self.completed_bytes()
+
+    def completed_bytes(self):
+        with self._lock:
+            return sum(end - start + 1 for start, end in self.done)
+
+    def missing(self):
+        with self._lock:
+            return missing_intervals(self.done, self.remote.size)
+
+    def contiguous_end(self):
+        """
+        End (exclusive) of the completed prefix starting at byte 0
+        """
+        with self._lock:
+            if self.done and self.done[0][0] == 0:
+                return self.done[0][1] + 1
+            return 0
+
+    def first_missing(self, start, end):
+        """
+        First byte in [start, end] that is not yet downloaded, or None
+        """
+        with self._lock:
+            for done_start, done_end in self.done:
+                if done_start <= start <= done_end:
+                    start = done_end + 1
+        return start if start <= end else None
+
+    def mark_done(self, start, end):
+        with self._lock:
+            self.done = merge_intervals(self.done + [(start, end)])
+            self._save_locked()
+
+    def _save_locked(self):
+        state = {
+            'url': self.url,
+            'size': self.remote.size,
+            'etag': self.remote.etag,
+            'last_modified': self.remote.last_modified,
+            'done': self.done,
+        }
+        temp_file = self.sidecar_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_file, self.sidecar_file)
+
+    def save(self):
+        with self._lock:
+            self._save_locked()
+
+    def discard(self):
+        discard(self.part_file, self.sidecar_file)
+
+    def publish(self, output_file):
+        """
+        Atomically move the completed .part file into place
+        """
+        publish_file(self.part_file, output_file)
+        discard(self.sidecar_file)
+
+
+class _ChunkSizer:
+    """
+    Grows the read size while throughput is high, so fast links need far
+    fewer Python-level iterations per gigabyte
+    """
+
+    def __init__(self):
+        self.size = MIN_READ_SIZE
+        self._bytes = 0
+        self._start = time.monotonic()
+
+    def record(self, n):
+        """
+        Account for n bytes read. Returns True once per measurement window.
+        """
+        self._bytes += n
+        now = time.monotonic()
+        elapsed = now - self._start
+        if elapsed < MEASURE_INTERVAL:
+            return False
+        target = (self._bytes / elapsed) * READ_TARGET_SECONDS
+        while self.size < MAX_READ_SIZE and self.size * 2 <= target:
+            self.size *= 2
+        self._bytes = 0
+        self._start = now
+        return True
+
+
+class ParallelRangeDownloader:
+    """
+    Downloads a single file over several concurrent HTTP connections using
+    Range requests, writing each range at its offset in a preallocated file.
+    Data lands in a .part file that is resumed on the next attempt and only
+    renamed into place once complete. Falls back to one stream when the
+    server does not support ranges.
+    sources lists equivalent URLs (mirrors) best-first; data comes from the
+    first one and moves to the next when it keeps failing. url is still
+    used for the HF metadata lookup.
+    Reads are paced by the bandwidth scheduler slot (default: the one held
+    by the creating thread). With auto_tune, connections is an upper bound:
+    the download starts from the host's learned profile and adds
+    connections while throughput keeps growing.
+    cancel() may be called from any thread to stop the download.
+    """
+
+    def __init__(self, url, headers, connections=8, timeout=60, verify=True, expected_sha256=None, metrics=None,
+                 sources=None, slot=None, auto_tune=False, reporter=None):
+        self.url = url
+        self.sources = list(sources) if sources else [url]
+        self._source = 0
+        self._source_errors = {}
+        self.headers = dict(headers)
+        self.connections = max(1, int(connections))
+        self.timeout = timeout
+        self.verify = verify
+        self.expected_sha256 = expected_sha256
+        self.sha256 = None
+        self.metrics = metrics
+        self.slot = slot or current_slot()
+        self.auto_tune = auto_tune
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._downloaded = 0
+        self._total = 0
+        self._abort = threading.Event()
+        self._cancelled = threading.Event()
+        self._reporter = reporter or ProgressReporter(LOG_PREFIX, metrics=metrics)
+        self._last_emit = (0.0, 0)
+
+    def download(self, output_file):
+        """
+        Download the URL into output_file. Returns the number of bytes written.
+        When verify is enabled the SHA-256 is computed while the data is
+        written and checked against HF's LFS metadata.
+        """
+        # None means "look it up"; an empty string means the file has no LFS digest
+        if self.verify and self.expected_sha256 is None:
+            self.expected_sha256 = fetch_expected_sha256(self.url, self.headers, timeout=self.timeout)
+            if self.expected_sha256:
+                print(f"{LOG_PREFIX} Expected SHA-256: {self.expected_sha256}")
+
+        remote = self._probe_sources()
+
+        if remote.supports_ranges and remote.size > 0:
+            print(f"{LOG_PREFIX} File size: {remote.size / (1024*1024):.2f} MB")
+            try:
+                return self._download_ranges(output_file, remote)
+            except RangeNotSupported:
+                print(f"{LOG_PREFIX} Server ignored Range request, falling back to a single stream")
+        elif self.connections > 1:
+            print(f"{LOG_PREFIX} Server does not support Range requests, using a single stream")
+
+        return self._download_single(output_file)
+
+    def cancel(self):
+        """
+        Stop the download; running ranges end at their next read and keep what they wrote
+        """
+        self._cancelled.set()
+        self._abort.set()
+
+    def _check_cancelled(self):
+        if self._cancelled.is_set():
+            raise DownloadCancelled("Download cancelled")
+
+    def _current_source(self):
+        return self.sources[self._source]
+
+    def _probe_sources(self):
+        while True:
+            source = self._current_source()
+            try:
+                return probe(source, self.headers, timeout=self.timeout)
+            except (urllib.error.URLError, OSError) as e:
+                if not self._fail_over(source, e, immediate=True):
+                    raise
+
+    def _fail_over(self, source, error, immediate=False):
+        """
+        Count an error against source and switch to the next mirror once it
+        has failed FAILOVER_AFTER times (or right away when immediate).
+        Returns True when requests should go to a different source.
+        """
+        with self._lock:
+            if self._current_source() != source:
+                # Another connection already moved on
+                return True
+            self._source_errors[source] = self._source_errors.get(source, 0) + 1
+            if self._source + 1 >= len(self.sources):
+                return False
+            if not immediate and self._source_errors[source] < FAILOVER_AFTER:
+                return False
+            self._source += 1
+            next_source = self._current_source()
+        print(f"{LOG_PREFIX} Source {source_host(source)} failing ({error}), switching to {source_host(next_source)}")
+        get_ranking().record_failure(source_host(source))
+        return True
+
+    def _buffer(self):
+        """
+        Per-thread reusable read buffer, so the hot loop allocates nothing
+        """
+        view = getattr(self._local, 'view', None)
+        if view is None:
+            view = self._local.view = memoryview(bytearray(MAX_READ_SIZE))
+        return view
+
+    def _add_progress(self, amount):
+        with self._lock:
+            self._downloaded += amount
+
+    def _start_progress(self, total, downloaded):
+        self._total = total
+        self._downloaded = downloaded
+        self._last_emit = (time.monotonic(), downloaded)
+
+    def _emit_progress(self, connections):
+        """
+        Time-based progress: called periodically, never per chunk
+        """
+        now = time.monotonic()
+        last_time, last_bytes = self._last_emit
+        if now - last_time < PROGRESS_INTERVAL:
+            return
+        with self._lock:
+            downloaded = self._downloaded
+        speed = int((downloaded - last_bytes) / (now - last_time))
+        eta = (self._total - downloaded) / speed if speed and self._total else None
+        self._last_emit = (now, downloaded)
+        self._reporter.update(Progress(downloaded, self._total, speed, connections, eta))
+
+    def _download_ranges(self, output_file, remote):
+        state = PartialDownload(output_file, self.url, remote)
+        resumed = state.load()
+        if resumed:
+            print(f"{LOG_PREFIX} Resuming: {resumed / (1024*1024):.1f} MB already downloaded")
+        else:
+            state.discard()
+            state.done = []
+            # Preallocate so every worker can write at its own offset and
+            # the file ends up contiguous instead of fragmented by the workers
+            with open(state.part_file, 'wb') as f:
+                preallocate(f, remote.size)
+            state.save()
+
+        ranges = split_ranges(remote.size, self.connections, state.missing())
+        workers = max(1, min(self.connections, len(ranges)))
+        host = source_host(self._current_source())
+        profiles = get_profiles()
+
+        # Active connections are limited by a gate the ramp can open further
+        ramp = None
+        active = workers
+        if self.auto_tune:
+            start = profiles.plan(host, remote.size, workers)
+            ramp = ConnectionRamp(start, size_cap(remote.size, workers))
+            active = ramp.level
+        gate = threading.Semaphore(active)
+
+        self._start_progress(remote.size, resumed)
+        if self.metrics:
+            self.metrics.total_bytes = remote.size
+            self.metrics.resumed_bytes = resumed
+            self.metrics.connections = active
+        self._abort.clear()
+        self._check_cancelled()
+
+        if ranges:
+            limit = f", auto-tuning up to {ramp.maximum}" if ramp else ""
+            print(f"{LOG_PREFIX} Downloading with {active} connections ({len(ranges)} ranges{limit})")
+
+        hasher = PrefixHasher(state.part_file) if self.verify else None
+        transfer_start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hf-range") as pool:
+            futures = [pool.submit(self._fetch_range_with_retry, state, start, end, gate) for start, end in ranges]
+            pending = set(futures)
+            try:
+                while pending:
+                    finished, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        future.result()
+                    self._emit_progress(min(active, len(pending)))
+                    if ramp:
+                        with self._lock:
+                            downloaded = self._downloaded
+                        level = ramp.update(downloaded, saturated=len(pending) >= ramp.level)
+                        if level:
+                            for _ in range(level - active):
+                                gate.release()
+                            active = level
+                            if self.metrics:
+                                self.metrics.connections = active
+                            print(f"{LOG_PREFIX} Throughput still growing, using {active} connections")
+                    # Hash ranges as soon as they join the completed prefix
+                    if hasher:
+                        self._timed_advance(hasher, state.contiguous_end())
+            except BaseException:
+                self._abort.set()
+                for future in futures:
+                    future.cancel()
+                raise
+
+        if state.missing():
+            self._check_cancelled()
+            raise Exception("Download incomplete, run again to resume")
+        if self.metrics:
+            self.metrics.transfer_finished()
+
+        # Teach the host profile what this connection count achieved
+        if ramp:
+            for level, throughput in ramp.samples:
+                profiles.record(host, level, throughput)
+        else:
+            profiles.record_transfer(host, active, remote.size - resumed, time.monotonic() - transfer_start)
+
+        if hasher:
+            self._timed_advance(hasher, remote.size)
+            self.sha256 = hasher.hexdigest()
+            try:
+                check_digest(output_file, self.sha256, self.expected_sha256)
+            except ChecksumMismatch:
+                # Only a whole-file hash is published, so the bad bytes can't
+                # be located: the data is deleted and the next attempt starts over
+                state.discard()
+                raise
+
+        state.publish(output_file)
+        if self.sha256:
+            remember_digest(output_file, self.sha256)
+        return remote.size
+
+    def _timed_advance(self, hasher, end):
+        started = time.perf_counter()
+        hasher.advance(end)
+        if self.metrics:
+            self.metrics.add_verify_time(time.perf_counter() - started)
+
+    def _fetch_range_with_retry(self, state, start, end, gate=None):
+        if gate is None:
+            return self._fetch_range_attempts(state, start, end)
+        # Wait for a free connection, staying responsive to aborts
+        while not gate.acquire(timeout=0.5):
+            if self._abort.is_set():
+                return
+        try:
+            return self._fetch_range_attempts(state, start, end)
+        finally:
+            gate.release()
+
+    def _fetch_range_attempts(self, state, start, end):
+        for attempt in range(1, MAX_TRIES + 1):
+            if self._abort.is_set():
+                return
+            # Only request what previous attempts did not already write
+            start = state.first_missing(start, end)
+            if start is None:
+                return
+            source = self._current_source()
+            try:
+                self._fetch_range(state, start, end, source)
+                return
+            except RangeNotSupported:
+                raise
+            except urllib.error.HTTPError as e:
+                # Client errors (auth, not found) will not fix themselves on the same source
+                client_error = 400 <= e.code < 500 and e.code not in (408, 429)
+                switched = self._fail_over(source, e, immediate=client_error)
+                if client_error and not switched:
+                    raise
+                if attempt == MAX_TRIES:
+                    raise
+            except (urllib.error.URLError, OSError) as e:
+                switched = self._fail_over(source, e)
+                if attempt == MAX_TRIES:
+                    raise
+            print(f"{LOG_PREFIX} Retrying bytes {start}-{end} (attempt {attempt + 1}/{MAX_TRIES})")
+            if self.metrics:
+                self.metrics.retry()
+            if not switched:
+                time.sleep(RETRY_WAIT)
+
+    def _fetch_range(self, state, start, end, source):
+        headers = dict(self.headers)
+        headers['Range'] = f'bytes={start}-{end}'
+        written = 0
+        unreported = 0
+        view = self._buffer()
+        sizer = _ChunkSizer()
+        throttle = self.slot.throttle if self.slot else None
+        checkpoint = time.monotonic()
+        opened = None
+        try:
+            with open_url(source, headers, timeout=self.timeout) as response:
+                if response.status != 206:
+                    raise RangeNotSupported()
+                # Never mix in bytes from a mirror holding a different version
+                total = response.headers.get('Content-Range', '').rpartition('/')[2]
+                if total.isdigit() and int(total) != state.remote.size:
+                    raise OSError(f"{source_host(source)} serves a different file size ({total} bytes)")
+                if self.metrics:
+                    self.metrics.first_byte()
+                opened = time.monotonic()
+                with open(state.part_file, 'r+b') as f:
+                    f.seek(start)
+                    remaining = end - start + 1
+                    while remaining > 0:
+                        if self._abort.is_set():
+                            return
+                        n = response.readinto(view[:min(sizer.size, remaining)])
+                        if not n:
+                            raise OSError(f"Connection closed early for bytes {start}-{end}")
+                        f.write(view[:n])
+                        remaining -= n
+                        written += n
+                        unreported += n
+                        if throttle:
+                            throttle(n)
+                        if sizer.record(n):
+                            self._add_progress(unreported)
+                            unreported = 0
+                            if time.monotonic() - checkpoint >= CHECKPOINT_INTERVAL:
+                                f.flush()
+                                state.mark_done(start, start + written - 1)
+                                checkpoint = time.monotonic()
+        finally:
+            self._add_progress(unreported)
+            # The written prefix is flushed (file closed) and kept for resume
+            if written:
+                state.mark_done(start, start + written - 1)
+            if self.metrics and opened is not None:
+                self.metrics.connection_finished(written, time.monotonic() - opened)
+
+    def _download_single(self, output_file):
+        part_file = output_file + PART_SUFFIX
+        with open_url(self._current_source(), self.headers, timeout=self.timeout) as response:
+            total_size = int(response.headers.get('content-length', 0))
+            self._start_progress(total_size, 0)
+            opened = time.monotonic()
+            if self.metrics:
+                self.metrics.first_byte()
+                self.metrics.connections = 1
+                self.metrics.total_bytes = total_size
+
+            if total_size:
+                print(f"{LOG_PREFIX} File size: {total_size / (1024*1024):.2f} MB")
+
+            hasher = PrefixHasher(part_file) if self.verify else None
+
+            # Without range support there is nothing to resume, start the .part over
+            view = self._buffer()
+            sizer = _ChunkSizer()
+            throttle = self.slot.throttle if self.slot else None
+            unreported = 0
+            with open(part_file, 'wb') as f:
+                while True:
+                    self._check_cancelled()
+                    n = response.readinto(view[:sizer.size])
+                    if not n:
+                        break
+                    f.write(view[:n])
+                    if hasher:
+                        hasher.update(view[:n])
+                    if throttle:
+                        throttle(n)
+                    unreported += n
+                    if sizer.record(n):
+                        self._add_progress(unreported)
+                        unreported = 0
+                        self._emit_progress(1)
+            self._add_progress(unreported)
+
+        written = os.path.getsize(part_file)
+        if self.metrics:
+            self.metrics.connection_finished(written, time.monotonic() - opened)
+            self.metrics.transfer_finished()
+        if total_size and written != total_size:
+            raise Exception(f"Download incomplete: got {written} of {total_size} bytes")
+
+        if hasher:
+            self.sha256 = hasher.hexdigest()
+            try:
+                check_digest(output_file, self.sha256, self.expected_sha256)
+            except ChecksumMismatch:
+                # Can't tell which bytes are wrong; the next attempt starts over
+                discard(part_file)
+                raise
+
+        publish_file(part_file, output_file)
+        if self.sha256:
+            remember_digest(output_file, self.sha256)
+        discard(output_file + SIDECAR_SUFFIX)
+        return written
@@ -0,0 +1,191 @@
+"""
+Workflow-level prefetch
+When a prompt is queued, every downloader node in it whose inputs are all
+constants (not linked to another node's output) starts its transfer right
+away in the background download manager. When the graph reaches a node it
+only waits for its own file, which is usually already done or in progress.
+
+The on_prompt hook runs before ComfyUI validates the prompt, so it only
+hands the prompt to a background thread. That thread starts the downloads
+once the prompt shows up in the queue (it passed validation) and, when the
+prompt leaves the queue, drops the prefetches no node claimed, stopping
+the ones still running (e.g. the prompt was deleted or interrupted).
+
+Set HF_DOWNLOADER_PREFETCH=0 to turn it off.
+"""
+
+import os
+import time
+import uuid
+import inspect
+import threading
+from .hf_common import DOWNLOADER_NODES, downloader_nodes
+
+LOG_PREFIX = "[HF Downloader]"
+# A prompt not in the queue by then failed validation (or already ran)
+VALIDATION_TIMEOUT = 60.0
+POLL_INTERVAL = 0.5
+
+
+def prefetch_enabled():
+    return os.environ.get("HF_DOWNLOADER_PREFETCH", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def _constant_inputs(node_class, inputs):
+    """
+    The node's inputs as download() keyword arguments, or None when any
+    of them comes from a link (only known once the graph runs)
+    """
+    if any(isinstance(value, list) for value in inputs.values()):
+        return None
+    accepted = inspect.signature(node_class.download).parameters
+    return {name: value for name, value in inputs.items() if name in accepted}
+
+
+def prefetch_prompt(prompt):
+    """
+    Start the downloads of every constant-input downloader node in an API-format prompt.
+    Returns the download manager futures of the downloads started or joined.
+    """
+    nodes = downloader_nodes()
+    started = []
+    for node_id, node in (prompt or {}).items():
+        node_class = nodes.get(node.get("class_type")) if isinstance(node, dict) else None
+        if node_class is None:
+            continue
+        inputs = _constant_inputs(node_class, node.get("inputs") or {})
+        if inputs is None:
+            continue
+        try:
+            started.append(node_class().prefetch(**inputs))
+        except Exception as e:
+            # The node reports the problem properly when it runs
+            print(f"{LOG_PREFIX} Not prefetching node {node_id}: {e}")
+    return started
+
+
+def _queue_state(prompt_id, prompt):
+    """
+    "running", "queued" or None for a prompt in ComfyUI's queue
+    """
+    from server import PromptServer
+    running, pending = PromptServer.instance.prompt_queue.get_current_queue()
+    for state, items in (("running", running), ("queued", pending)):
+        for item in items:
+            # Versions that ignore a requested prompt_id still queue the same prompt dict
+            if item[1] == prompt_id or item[2] is prompt:
+                return state
+    return None
+
+
+class PromptPrefetcher:
+    """
+    Follows queued prompts on one background thread: prefetches a prompt's
+    downloads once it is in the queue and releases the unclaimed ones when
+    it leaves (see the module docstring)
+    """
+
+    def __init__(self, queue_state=_queue_state, poll_interval=POLL_INTERVAL):
+        self._queue_state = queue_state
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._prompts = {}
+        self._thread = None
+
+    def add(self, prompt_id, prompt):
+        with self._lock:
+            self._prompts[prompt_id] = {'prompt': prompt, 'since': time.monotonic(), 'futures': None}
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="hf-prompt-prefetch")
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._prompts:
+                    self._thread = None
+                    return
+                prompts = list(self._prompts.items())
+            for prompt_id, entry in prompts:
+                try:
+                    done = self._step(prompt_id, entry)
+                except Exception as e:
+                    print(f"{LOG_PREFIX} Warning: prompt prefetch failed: {e}")
+                    done = True
+                if done:
+                    with self._lock:
+                        self._prompts.pop(prompt_id, None)
+            time.sleep(self.poll_interval)
+
+    def _step(self, prompt_id, entry):
+        """
+        Advance one prompt; True once there is nothing left to follow
+        """
+        state = self._queue_state(prompt_id, entry['prompt'])
+        if entry['futures'] is None:
+            if state is None:
+                return time.monotonic() - entry['since'] > VALIDATION_TIMEOUT
+            entry['futures'] = prefetch_prompt(entry['prompt'])
+            if entry['futures']:
+                print(f"{LOG_PREFIX} Prefetching {len(entry['futures'])} download(s) for the queued prompt")
+            return not entry['futures']
+        if state is not None:
+            return False
+        release_prefetches(entry['futures'])
+        return True
+
+
+def release_prefetches(futures):
+    """
+    Give up prefetches nothing claimed, stopping the transfers nobody else needs
+    """
+    from .download_manager import get_manager
+    from .download_engines import cancel_download
+    for future in futures:
+        key = get_manager().release_prefetch(future)
+        if key and cancel_download(*key):
+            print(f"{LOG_PREFIX} Stopped unneeded prefetch (partial data kept): {key[0]}")
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher():
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = PromptPrefetcher()
+        return _prefetcher
+
+
+def on_prompt(json_data):
+    """
+    PromptServer on_prompt handler; must return the request. Adds a
+    prompt_id when the client sent none, to find the prompt in the queue.
+    """
+    if not prefetch_enabled():
+        return json_data
+    try:
+        prompt = json_data.get("prompt")
+        if any(isinstance(node, dict) and node.get("class_type") in DOWNLOADER_NODES
+               for node in (prompt or {}).values()):
+            prompt_id = json_data.setdefault("prompt_id", str(uuid.uuid4()))
+            get_prefetcher().add(str(prompt_id), prompt)
+    except Exception as e:
+        print(f"{LOG_PREFIX} Warning: prompt prefetch failed: {e}")
+    return json_data
+
+
+def register():
+    """
+    Hook into ComfyUI's prompt queue (no-op outside a ComfyUI server)
+    """
+    try:
+        from server import PromptServer
+    except ImportError:
+        return False
+    if getattr(PromptServer, "instance", None) is None:
+        return False
+    PromptServer.instance.add_on_prompt_handler(on_prompt)
+    return True
@@ -0,0 +1,231 @@
+"""
+Shared content-addressed model cache for several ComfyUI instances
+Files are stored once under <cache>/blobs/<sha256[:2]>/<sha256>, downloaded
+under a cross-process lock (works on local disks and NFS), and published
+into each instance's models folder by hardlink, reflink or symlink.
+
+Enable with a node's `shared_cache_dir` input or HF_DOWNLOADER_SHARED_CACHE.
+HF_DOWNLOADER_CACHE_LINK picks the publish method: auto (default),
+hardlink, reflink, symlink or copy.
+"""
+
+import os
+import time
+import shutil
+import threading
+from .download_verify import SHA256_RE
+
+LOG_PREFIX = "[HF Downloader]"
+
+LINK_METHODS = ("hardlink", "reflink", "symlink", "copy")
+# Linux FICLONE ioctl (_IOW(0x94, 9, int)): share extents on btrfs/XFS/bcachefs
+FICLONE = 0x40049409
+LOCK_POLL_INTERVAL = 1.0
+
+if os.name == "nt":
+    import msvcrt
+
+    def _try_lock(fd):
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    # POSIX record locks (lockf) are honoured across NFS clients, unlike BSD flock
+    def _try_lock(fd):
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(fd):
+        fcntl.lockf(fd, fcntl.LOCK_UN)
+
+
+class FileLock:
+    """
+    Exclusive cross-process lock on a lock file. The OS releases it if the
+    holder dies, so a crashed instance never leaves a stale lock behind.
+    OS record locks are per process, so threads also take an in-process lock.
+    """
+    _thread_locks = {}
+    _thread_locks_guard = threading.Lock()
+
+    def __init__(self, path, description="", log_prefix=LOG_PREFIX):
+        self.path = path
+        self.description = description
+        self.log_prefix = log_prefix
+        self._fd = None
+        with self._thread_locks_guard:
+            self._thread_lock = self._thread_locks.setdefault(path, threading.Lock())
+
+    def __enter__(self):
+        if not self._thread_lock.acquire(blocking=False):
+            self._report_wait()
+            self._thread_lock.acquire()
+        try:
+            self._acquire_file()
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        return self
+
+    def _acquire_file(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        if not _try_lock(fd):
+            self._report_wait()
+            while not _try_lock(fd):
+                time.sleep(LOCK_POLL_INTERVAL)
+        self._fd = fd
+
+    def _report_wait(self):
+        print(f"{self.log_prefix} Waiting for another download of {self.description} to finish")
+
+    def __exit__(self, *exc):
+        try:
+            _unlock(self._fd)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self._thread_lock.release()
+
+
+def _hardlink(source, target):
+    os.link(source, target)
+
+
+def _reflink(source, target):
+    if os.name == "nt" or not hasattr(fcntl, "ioctl"):
+        raise OSError("reflink is not supported on this platform")
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def _symlink(source, target):
+    os.symlink(source, target)
+
+
+def _copy(source, target):
+    shutil.copyfile(source, target)
+
+
+_LINKERS = {"hardlink": _hardlink, "reflink": _reflink, "symlink": _symlink, "copy": _copy}
+
+
+def link_mode():
+    mode = os.environ.get("HF_DOWNLOADER_CACHE_LINK", "auto").strip().lower()
+    return mode if mode in LINK_METHODS else "auto"
+
+
+def publish(source, destination, mode="auto"):
+    """
+    Make destination refer to source without copying when possible.
+    Tries hardlink, reflink, symlink, then copy (for mode "auto") and
+    swaps the result into place atomically. Returns the method used.
+    """
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        return "existing"
+    temp_file = f"{destination}.link.{os.getpid()}.{threading.get_ident()}"
+    methods = LINK_METHODS if mode == "auto" else (mode,)
+    error = None
+    for method in methods:
+        try:
+            _LINKERS[method](source, temp_file)
+        except OSError as e:
+            error = e
+            try:
+                os.remove(temp_file)
+            except FileNotFoundError:
+                pass
+            continue
+        os.replace(temp_file, destination)
+        return method
+    raise Exception(f"Could not publish {destination} from the shared cache: {error}")
+
+
+class SharedCache:
+    """
+    Content-addressed blob store keyed by SHA-256
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def key_for(self, metadata):
+        """
+        Cache key for a remote file: its LFS SHA-256, or None when unknown
+        """
+        sha256 = (metadata or {}).get('sha256') or ""
+        return sha256.lower() if SHA256_RE.match(sha256) else None
+
+    def blob_path(self, key):
+        return os.path.join(self.root, "blobs", key[:2], key)
+
+    def partial_path(self, key):
+        # Fixed per key so an interrupted download resumes from any instance
+        return os.path.join(self.root, "partial", key)
+
+    def lock_path(self, key):
+        return os.path.join(self.root, "locks", f"{key}.lock")
+
+    def fetch(self, key, destination, download, log_prefix=LOG_PREFIX):
+        """
+        Publish blob key at destination, calling download(target_path) under
+        the lock first if no instance has stored it yet. download returns
+        the path of the verified file it wrote.
+        Returns True when this call downloaded the file.
+        """
+        blob = self.blob_path(key)
+        downloaded = False
+        if os.path.isfile(blob):
+            print(f"{log_prefix} Found in shared cache: {blob}")
+        else:
+            with FileLock(self.lock_path(key), os.path.basename(destination), log_prefix):
+                # Another instance may have finished while we waited
+                if os.path.isfile(blob):
+                    print(f"{log_prefix} Downloaded by another instance: {blob}")
+                else:
+                    target = self.partial_path(key)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    written = download(target)
+                    # Read-only so a hardlinked copy can't be modified in place
+                    try:
+                        os.chmod(written, 0o444)
+                    except OSError:
+                        pass
+                    os.replace(written, blob)
+                    downloaded = True
+                    print(f"{log_prefix} Stored in shared cache: {blob}")
+
+        method = publish(blob, destination, link_mode())
+        print(f"{log_prefix} Published from shared cache ({method}): {destination}")
+        return downloaded
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_shared_cache(directory=""):
+    """
+    SharedCache for the node input or HF_DOWNLOADER_SHARED_CACHE, or None when disabled
+    """
+    directory = (directory or "").strip() or os.environ.get("HF_DOWNLOADER_SHARED_CACHE", "").strip()
+    if not directory:
+        return None
+    root = os.path.abspath(os.path.expanduser(directory))
+    with _caches_lock:
+        if root not in _caches:
+            os.makedirs(root, exist_ok=True)
+            _caches[root] = SharedCache(root)
+        return _caches[root]